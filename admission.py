@@ -0,0 +1,173 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+from transmission_rpc.error import TransmissionAuthError, TransmissionConnectError
+
+from db import (user_usage, count_downloading, queue_add, count_queued_adds, is_add_queued, queued_add_heads,
+                delete_queued_add, reschedule_queued_add)
+
+logger = logging.getLogger("transmissionbot")
+
+# Per-user limits for non-admins (0 = unlimited): active torrents, torrents still
+# downloading, and total bytes of all their torrents
+USER_MAX_ACTIVE_TORRENTS = int(os.environ.get("USER_MAX_ACTIVE_TORRENTS", "0"))
+USER_MAX_DOWNLOADS = int(os.environ.get("USER_MAX_DOWNLOADS", "0"))
+USER_MAX_BYTES = int(os.environ.get("USER_MAX_BYTES", "0"))
+# Downloads running at once across all users (0 = unlimited)
+MAX_ACTIVE_DOWNLOADS = int(os.environ.get("MAX_ACTIVE_DOWNLOADS", "0"))
+# Most queued adds started per scheduler cycle
+ADMISSION_BATCH = 20
+# A queued add that hit an unreachable Transmission is retried after this many
+# seconds, doubling per attempt up to the cap
+ADMISSION_RETRY_BASE = 60
+ADMISSION_RETRY_MAX = 3600
+
+def is_transient(error: Exception) -> bool:
+    # Transmission unreachable, slow or refusing our login: not the torrent's fault, try again later
+    return isinstance(error, (TransmissionConnectError, TransmissionAuthError, asyncio.TimeoutError, ConnectionError))
+
+class AdmissionController:
+    """Per-user quotas for /add, with a persistent queue for adds over the limit.
+
+    Usage comes from the torrents table through one covering-index lookup per user,
+    plus adds that were admitted but are not in the table yet. Queued adds are
+    started by ``run_queue``: each round takes the oldest entry of every waiting
+    user and serves users with the fewest running downloads first, so one user's
+    backlog cannot hold everybody else up. An entry is only dropped when it failed
+    for good, and its owner is told; if Transmission is unreachable it stays
+    queued, is retried with backoff, and the round stops.
+    """
+
+    def __init__(self, start: Callable[[dict], Awaitable[None]],
+                 notify: Optional[Callable[[dict, Exception], Awaitable[None]]] = None,
+                 max_active: int = USER_MAX_ACTIVE_TORRENTS, max_downloads: int = USER_MAX_DOWNLOADS,
+                 max_bytes: int = USER_MAX_BYTES, max_total_downloads: int = MAX_ACTIVE_DOWNLOADS):
+        # start: async def start(entry) adding a queued entry to Transmission
+        # notify: async def notify(entry, error) telling the owner it was dropped
+        self.start = start
+        self.notify = notify
+        self.max_active = max_active
+        self.max_downloads = max_downloads
+        self.max_bytes = max_bytes
+        self.max_total_downloads = max_total_downloads
+        self.queued = 0
+        self.started = 0
+        self.failed = 0
+        # user_id -> [adds, bytes] admitted but not yet written to the torrents table
+        self.reserved: Dict[int, list] = {}
+        self._lock = asyncio.Lock()
+        self._run_lock = asyncio.Lock()
+
+    async def load(self):
+        self.queued = await count_queued_adds()
+
+    async def check(self, user_id: int, size: int = 0, exempt: bool = False) -> Optional[str]:
+        # Why an add of ``size`` bytes for this user has to wait, or None if it may start now
+        reserved_adds, reserved_bytes = self.reserved.get(user_id, (0, 0))
+        reserved_total = sum(adds for adds, _ in self.reserved.values())
+        if self.max_total_downloads and await count_downloading() + reserved_total >= self.max_total_downloads:
+            return "all download slots are in use"
+        if exempt:
+            return None
+        if not (self.max_active or self.max_downloads or self.max_bytes):
+            return None
+        usage = await user_usage(user_id)
+        if self.max_active and usage["active"] + reserved_adds >= self.max_active:
+            return f"you have {self.max_active} active torrents"
+        if self.max_downloads and usage["downloading"] + reserved_adds >= self.max_downloads:
+            return f"you have {self.max_downloads} downloads running"
+        if self.max_bytes and usage["bytes"] + reserved_bytes + size > self.max_bytes:
+            return "this would exceed your storage quota"
+        return None
+
+    async def admit(self, user_id: int, size: int = 0, exempt: bool = False) -> Optional[str]:
+        """Check and, if allowed, reserve a slot; call ``release`` once the add is done."""
+        async with self._lock:
+            reason = await self.check(user_id, size, exempt)
+            if reason is None:
+                reserved = self.reserved.setdefault(user_id, [0, 0])
+                reserved[0] += 1
+                reserved[1] += size
+            return reason
+
+    def release(self, user_id: int, size: int = 0):
+        reserved = self.reserved.get(user_id)
+        if reserved is None:
+            return
+        reserved[0] -= 1
+        reserved[1] -= size
+        if reserved[0] <= 0:
+            del self.reserved[user_id]
+
+    async def enqueue(self, user_id: int, hash: Optional[str], name: str, size: int, download_dir: str,
+                      magnet: Optional[str] = None, data: Optional[bytes] = None, exempt: bool = False) -> int:
+        """Queue an add and return its position in the user's queue."""
+        await queue_add(user_id, hash, name, size, download_dir, magnet=magnet, data=data, exempt=exempt)
+        self.queued += 1
+        return await count_queued_adds(user_id)
+
+    async def is_queued(self, hash: str) -> bool:
+        return bool(self.queued) and await is_add_queued(hash)
+
+    async def _usage_key(self, entry: dict):
+        usage = await user_usage(entry["user_id"])
+        return (usage["downloading"], entry["id"])
+
+    async def run_queue(self) -> int:
+        """Start queued adds whose owners are under their limits. Returns how many started.
+
+        Entries that failed for good are dropped but not counted as started.
+        """
+        if not self.queued:
+            return 0
+        started = 0
+        handled = 0
+        async with self._run_lock:
+            while handled < ADMISSION_BATCH:
+                heads = await queued_add_heads(int(time.time()))
+                if not heads:
+                    break
+                # Fair share: users with the fewest running downloads go first
+                keys = await asyncio.gather(*(self._usage_key(entry) for entry in heads))
+                heads = [entry for _, entry in sorted(zip(keys, heads), key=lambda pair: pair[0])]
+                progress = False
+                unreachable = False
+                for entry in heads:
+                    if handled >= ADMISSION_BATCH:
+                        break
+                    if await self.admit(entry["user_id"], entry["total_size"], entry["exempt"]) is not None:
+                        continue
+                    error = None
+                    try:
+                        await self.start(entry)
+                    except Exception as e:
+                        if is_transient(e):
+                            delay = min(ADMISSION_RETRY_MAX, ADMISSION_RETRY_BASE * 2 ** entry["attempts"])
+                            logger.warning(f"Transmission unavailable for queued add {entry['id']}, retrying in {delay}s: {e}")
+                            await reschedule_queued_add(entry["id"], int(time.time() + delay))
+                            unreachable = True
+                            break
+                        logger.error(f"Error starting queued add {entry['id']} for user {entry['user_id']}: {e}")
+                        error = e
+                    finally:
+                        self.release(entry["user_id"], entry["total_size"])
+                    await delete_queued_add(entry["id"])
+                    self.queued = max(0, self.queued - 1)
+                    handled += 1
+                    progress = True
+                    if error is None:
+                        started += 1
+                        continue
+                    self.failed += 1
+                    if self.notify is not None:
+                        try:
+                            await self.notify(entry, error)
+                        except Exception as e:
+                            logger.error(f"Could not tell user {entry['user_id']} about failed add {entry['id']}: {e}")
+                if unreachable or not progress:
+                    break
+        self.started += started
+        return started
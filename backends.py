@@ -0,0 +1,236 @@
+import asyncio
+import itertools
+import logging
+import os
+from typing import Dict, Optional
+from urllib.parse import unquote, urlsplit
+
+import transmission_rpc
+
+from tsclient import AsyncTransmission
+
+logger = logging.getLogger("transmissionbot")
+
+# How /add picks a backend: 'round_robin', 'free_space' or 'active' (fewest active torrents)
+ADD_POLICY = os.environ.get("TRANSMISSION_ADD_POLICY", "round_robin").lower()
+ADD_POLICIES = ("round_robin", "free_space", "active")
+DEFAULT_BACKEND = "default"
+
+def parse_backends(spec: str) -> Dict[str, dict]:
+    """Parse TRANSMISSION_BACKENDS: comma-separated ``name=user:password@host:port`` entries.
+
+    User and password may be percent-encoded. Raises ValueError on a malformed entry.
+    """
+    configs = {}
+    for entry in spec.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        name, sep, address = entry.partition("=")
+        if not sep or not name.strip():
+            raise ValueError(f"Invalid TRANSMISSION_BACKENDS entry '{entry}', expected name=user:password@host:port")
+        url = urlsplit(f"//{address.strip()}")
+        if not url.hostname:
+            raise ValueError(f"Invalid TRANSMISSION_BACKENDS entry '{entry}': missing host")
+        configs[name.strip()] = {
+            "host": url.hostname,
+            "port": url.port or 9091,
+            "user": unquote(url.username) if url.username else None,
+            "password": unquote(url.password) if url.password else None,
+        }
+    return configs
+
+def connect_backends(configs: Dict[str, dict]) -> Dict[str, AsyncTransmission]:
+    return {
+        name: AsyncTransmission(transmission_rpc.Client(
+            host=config["host"],
+            port=config["port"],
+            username=config["user"],
+            password=config["password"],
+        ))
+        for name, config in configs.items()
+    }
+
+class TransmissionPool:
+    """Several Transmission daemons behind the AsyncTransmission interface.
+
+    Calls are routed by torrent hash to the backend that owns it; hashes with no
+    known owner go to every backend, which is harmless because Transmission ignores
+    ids it does not have. Each backend keeps its own thread pool and concurrency
+    limit, so a poll over all backends takes as long as the largest one.
+
+    Every returned torrent gets a ``backend`` attribute naming its daemon, and
+    recently-removed ids come back as (backend, id) pairs since ids are only
+    unique within one daemon.
+    """
+
+    def __init__(self, backends: Dict[str, AsyncTransmission], policy: str = ADD_POLICY):
+        if not backends:
+            raise ValueError("At least one Transmission backend is required")
+        if policy not in ADD_POLICIES:
+            logger.warning(f"Unknown TRANSMISSION_ADD_POLICY '{policy}', using round_robin")
+            policy = "round_robin"
+        self.backends = backends
+        self.policy = policy
+        # hash -> backend name
+        self.owners: Dict[str, str] = {}
+        # Optional SessionMonitor; when set, add policies rank backends from its cache
+        self.session_stats = None
+        self._round_robin = itertools.cycle(list(backends))
+
+    @property
+    def rpc_count(self) -> int:
+        return sum(backend.rpc_count for backend in self.backends.values())
+
+    @property
+    def rpc_deduplicated(self) -> int:
+        return sum(backend.flights.deduplicated for backend in self.backends.values())
+
+    def load_owners(self, owners: Dict[str, Optional[str]]):
+        # owners: {hash: backend name}, e.g. from the torrents table; unknown names are ignored
+        for hash, name in owners.items():
+            if name in self.backends:
+                self.owners[hash] = name
+
+    def forget(self, hash: str):
+        self.owners.pop(hash, None)
+
+    def _tag(self, name: str, torrents):
+        for tor in torrents:
+            tor.backend = name
+            self.owners[tor.hashString] = name
+        return torrents
+
+    def _route(self, ids) -> Dict[str, list]:
+        # Group hashes by owning backend; unowned hashes go to every backend
+        if isinstance(ids, str):
+            ids = [ids]
+        groups: Dict[str, list] = {}
+        unowned = []
+        for hash in ids:
+            name = self.owners.get(hash)
+            if name is None:
+                unowned.append(hash)
+            else:
+                groups.setdefault(name, []).append(hash)
+        if unowned:
+            for name in self.backends:
+                groups.setdefault(name, []).extend(unowned)
+        return groups
+
+    async def get_torrent(self, torrent_id, arguments=None, **kwargs):
+        name = self.owners.get(torrent_id)
+        if name is not None:
+            return self._tag(name, [await self.backends[name].get_torrent(torrent_id, arguments=arguments, **kwargs)])[0]
+        torrents = await self.get_torrents(ids=[torrent_id], arguments=arguments, **kwargs)
+        if not torrents:
+            raise KeyError(f"Torrent {torrent_id} not found on any Transmission backend")
+        return torrents[0]
+
+    async def get_torrents(self, ids=None, arguments=None, **kwargs):
+        if ids is None:
+            groups = {name: None for name in self.backends}
+        else:
+            groups = self._route(ids)
+        names = list(groups)
+        results = await asyncio.gather(
+            *(self.backends[name].get_torrents(ids=groups[name], arguments=arguments, **kwargs) for name in names)
+        )
+        torrents = []
+        for name, found in zip(names, results):
+            torrents.extend(self._tag(name, found))
+        return torrents
+
+    async def get_recently_active_torrents(self, arguments=None, **kwargs):
+        names = list(self.backends)
+        results = await asyncio.gather(
+            *(self.backends[name].get_recently_active_torrents(arguments=arguments, **kwargs) for name in names)
+        )
+        active = []
+        removed = []
+        for name, (torrents, removed_ids) in zip(names, results):
+            active.extend(self._tag(name, torrents))
+            removed.extend((name, id) for id in removed_ids)
+        return active, removed
+
+    async def _each(self, method: str, ids, *args, **kwargs):
+        groups = self._route(ids)
+        await asyncio.gather(*(getattr(self.backends[name], method)(hashes, *args, **kwargs) for name, hashes in groups.items()))
+
+    async def start_torrent(self, ids, **kwargs):
+        await self._each("start_torrent", ids, **kwargs)
+
+    async def stop_torrent(self, ids, **kwargs):
+        await self._each("stop_torrent", ids, **kwargs)
+
+    async def change_torrent(self, ids, **kwargs):
+        await self._each("change_torrent", ids, **kwargs)
+
+    async def remove_torrent(self, ids, delete_data: bool = False, **kwargs):
+        await self._each("remove_torrent", ids, delete_data=delete_data, **kwargs)
+        for hash in [ids] if isinstance(ids, str) else ids:
+            self.forget(hash)
+
+    async def pick_backend(self, download_dir: Optional[str] = None, size: int = 0) -> str:
+        """Backend name for a new torrent of ``size`` bytes according to the add policy.
+
+        If the cached free space shows the policy's choice cannot fit the torrent, the
+        backend with the most room that can fit it is used instead.
+        """
+        return self._with_room(await self._pick_by_policy(download_dir), download_dir, size)
+
+    async def _pick_by_policy(self, download_dir: Optional[str]) -> str:
+        if len(self.backends) == 1 or self.policy == "round_robin":
+            return next(self._round_robin)
+        names = list(self.backends)
+        cached = self._cached_scores(names, download_dir)
+        if cached:
+            pick = max if self.policy == "free_space" else min
+            return pick(cached, key=cached.get)
+        if self.policy == "free_space":
+            results = await asyncio.gather(*(self._free_space(name) for name in names), return_exceptions=True)
+            scores = {n: r for n, r in zip(names, results) if isinstance(r, int)}
+            if scores:
+                return max(scores, key=scores.get)
+        else:
+            results = await asyncio.gather(*(self.backends[n].call("session_stats") for n in names), return_exceptions=True)
+            scores = {n: r.active_torrent_count for n, r in zip(names, results) if not isinstance(r, BaseException)}
+            if scores:
+                return min(scores, key=scores.get)
+        logger.warning(f"Could not rank backends by {self.policy}, falling back to round robin")
+        return next(self._round_robin)
+
+    def _with_room(self, name: str, download_dir: Optional[str], size: int) -> str:
+        if not size or download_dir is None or self.session_stats is None:
+            return name
+        free = self.session_stats.free_space(name, download_dir)
+        if free is None or free >= size:
+            return name
+        room = {n: self.session_stats.free_space(n, download_dir) for n in self.backends}
+        room = {n: f for n, f in room.items() if f is not None and f >= size}
+        return max(room, key=room.get) if room else name
+
+    def _cached_scores(self, names, download_dir: Optional[str]) -> Dict[str, int]:
+        # Scores from the session-stats cache, or {} unless every backend has a fresh one
+        if self.session_stats is None:
+            return {}
+        if self.policy == "free_space":
+            if download_dir is None:
+                return {}
+            scores = {name: self.session_stats.free_space(name, download_dir) for name in names}
+        else:
+            scores = {name: self.session_stats.active_count(name) for name in names}
+        return scores if None not in scores.values() else {}
+
+    async def _free_space(self, name: str) -> int:
+        backend = self.backends[name]
+        session = await backend.call("get_session")
+        return await backend.call("free_space", session.download_dir)
+
+    async def add_torrent(self, torrent, backend: str = None, **kwargs):
+        name = backend or await self.pick_backend(kwargs.get("download_dir"))
+        return self._tag(name, [await self.backends[name].add_torrent(torrent, **kwargs)])[0]
+
+    def close(self):
+        for backend in self.backends.values():
+            backend.close()
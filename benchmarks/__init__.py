@@ -0,0 +1,7 @@
+"""Offline benchmarks: the real bot handlers and scheduler jobs against mock Transmission daemons.
+
+    python -m benchmarks                    # p50/p99, RPCs and DB writes at 100, 1k and 10k torrents
+    python -m benchmarks.scenario --help    # one configuration, JSON output
+
+Nothing here talks to Discord or a real Transmission.
+"""
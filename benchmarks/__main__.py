@@ -0,0 +1,56 @@
+"""Run the benchmark scenario at several library sizes and print one table per size.
+
+    python -m benchmarks --sizes 100,1000,10000 --latency 0.002
+
+Every size runs in its own subprocess (see benchmarks.harness).
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from benchmarks.harness import REPO_ROOT
+from benchmarks.report import format_table
+
+HEADERS = ["operation", "p50 ms", "p99 ms", "RPC/op", "DB commits/op", "DB rows/op"]
+
+def run_scenario(torrents: int, args) -> dict:
+    command = [
+        sys.executable, "-m", "benchmarks.scenario", "--torrents", str(torrents), "--backends", str(args.backends),
+        "--latency", str(args.latency), "--rounds", str(args.rounds), "--users", str(args.users),
+    ]
+    if args.only:
+        command += ["--only", *args.only]
+    output = subprocess.run(command, cwd=REPO_ROOT, check=True, stdout=subprocess.PIPE,
+                            stderr=None if args.verbose else subprocess.DEVNULL, text=True).stdout
+    return json.loads(output)
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument("--sizes", default="100,1000,10000", help="comma-separated torrent counts")
+    p.add_argument("--backends", type=int, default=1)
+    p.add_argument("--latency", type=float, default=0.002, help="seconds added to every RPC by the mock")
+    p.add_argument("--rounds", type=int, default=20)
+    p.add_argument("--users", type=int, default=10)
+    p.add_argument("--only", nargs="*", help="only operations whose name contains one of these")
+    p.add_argument("--json", help="also write the raw results to this file")
+    p.add_argument("--verbose", action="store_true", help="show the scenarios' log output")
+    args = p.parse_args(argv)
+
+    reports = []
+    for size in (int(s) for s in args.sizes.split(",")):
+        report = run_scenario(size, args)
+        reports.append(report)
+        print(f"\n{size} torrents, {args.backends} backend(s), {report['latency_ms']:.1f} ms RPC latency")
+        print(format_table(HEADERS, [
+            [name, r["p50_ms"], r["p99_ms"], r["rpc"], r["db_commits"], r["db_rows"]]
+            for name, r in report["results"].items()
+        ]))
+        sys.stdout.flush()
+    if args.json:
+        with open(os.path.abspath(args.json), "w") as f:
+            json.dump(reports, f, indent=2)
+
+if __name__ == "__main__":
+    main()
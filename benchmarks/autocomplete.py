@@ -0,0 +1,96 @@
+"""Autocomplete latency per keystroke: search.NameIndex vs the original linear scan.
+
+    python -m benchmarks.autocomplete --torrents 10000
+
+Queries are what Discord sends while someone types: a real name's words one
+character at a time, plus misspellings and misses that end in the bounded fuzzy
+pass. The original scan cleaned and scanned every row on each keystroke; its DB
+read is left out here, so it looks better than it was.
+"""
+import argparse
+import os
+import random
+import time
+from typing import Dict, List
+
+from benchmarks import baseline
+from benchmarks.mock_transmission import torrent_hash, torrent_name
+from benchmarks.report import format_table, summarize
+from names import NameCleaner
+from search import NameIndex
+
+USERS = 50
+REMOVE = "CODEX,PLAZA,SKIDROW"
+MISSES = ["zzqx", "stelar odysey", "qqq", "dragn empre", "xyzzy", "kngdm"]
+
+def library(torrents: int, users: int = USERS, seed: int = 0) -> List[dict]:
+    rng = random.Random(seed)
+    return [
+        {"hash": torrent_hash("ac", i), "name": torrent_name(rng), "user_id": 1000 + i % users}
+        for i in range(torrents)
+    ]
+
+def keystrokes(rows: List[dict], names: int = 40, seed: int = 1) -> List[str]:
+    # Every prefix of the first two words of some names, as typed, then a few misses
+    rng = random.Random(seed)
+    queries = []
+    for row in rng.sample(rows, min(names, len(rows))):
+        typed = " ".join(row["name"].lower().split(".")[:2])
+        queries += [typed[:n] for n in range(1, len(typed) + 1)]
+    return queries + MISSES
+
+def build_index(rows: List[dict], cleaner: NameCleaner) -> NameIndex:
+    index = NameIndex(cleaner.clean)
+    for row in rows:
+        index.add(row["hash"], row["name"], row["user_id"])
+    return index
+
+def time_queries(search, queries: List[str]) -> List[float]:
+    seconds = []
+    for query in queries:
+        start = time.perf_counter()
+        search(query)
+        seconds.append(time.perf_counter() - start)
+    return seconds
+
+def run(torrents: int, users: int = USERS) -> Dict[str, dict]:
+    os.environ["NAME_CLEANUP_REMOVE"] = REMOVE
+    rows = library(torrents, users)
+    queries = keystrokes(rows)
+    cleaner = NameCleaner(remove=REMOVE)
+    start = time.perf_counter()
+    index = build_index(rows, cleaner)
+    build = time.perf_counter() - start
+    user_id = rows[0]["user_id"]
+    own_rows = [r for r in rows if r["user_id"] == user_id]
+    results = {
+        "index, user": summarize(time_queries(lambda q: index.search(q, user_id=user_id), queries)),
+        "index, admin": summarize(time_queries(lambda q: index.search(q), queries)),
+        "linear scan, user": summarize(time_queries(lambda q: baseline.autocomplete(own_rows, q), queries)),
+        "linear scan, admin": summarize(time_queries(lambda q: baseline.autocomplete(rows, q), queries)),
+    }
+    # Incremental upkeep when a torrent is added or removed
+    extra = library(200, users, seed=2)
+    start = time.perf_counter()
+    for row in extra:
+        index.add(row["hash"] + "x", row["name"], row["user_id"])
+    for row in extra:
+        index.remove(row["hash"] + "x")
+    results["index add+remove"] = summarize([(time.perf_counter() - start) / len(extra)])
+    results["index build"] = summarize([build])
+    return results
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument("--torrents", type=int, default=10000)
+    p.add_argument("--users", type=int, default=USERS)
+    args = p.parse_args(argv)
+    results = run(args.torrents, args.users)
+    print(f"Autocomplete, {args.torrents} torrents over {args.users} users, "
+          f"{results['index, user']['n']} keystrokes")
+    print(format_table(["", "p50 ms", "p99 ms", "max ms"], [
+        [name, r["p50_ms"], r["p99_ms"], r["max_ms"]] for name, r in results.items()
+    ]))
+
+if __name__ == "__main__":
+    main()
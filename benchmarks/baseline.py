@@ -0,0 +1,30 @@
+"""The original implementations the benchmarks compare against, copied from the first bot.py."""
+import os
+import re
+
+def clean_torrent_name(name):
+    replace = os.environ.get("NAME_CLEANUP_REPLACE", "+: ,%20: ")
+    remove = os.environ.get("NAME_CLEANUP_REMOVE", "")
+    # Apply replacements
+    for pair in replace.split(","):
+        if ":" in pair:
+            k, v = pair.split(":", 1)
+            name = name.replace(k, v)
+    # Remove substrings
+    for word in remove.split(","):
+        if word.strip():
+            name = re.sub(re.escape(word.strip()), "", name, flags=re.IGNORECASE)
+    # Collapse double spaces
+    name = re.sub(r"\s+", " ", name).strip()
+    return name
+
+def autocomplete(torrents, current):
+    # torrent_name_autocomplete's filter over the rows it had just read from the DB
+    options = []
+    for t in torrents:
+        name = clean_torrent_name(t['name'])
+        if current.lower() in name.lower():
+            options.append((t['hash'], name))
+        if len(options) >= 25:
+            break
+    return options
@@ -0,0 +1,115 @@
+"""Stand-ins for the discord.py objects the bot's handlers touch.
+
+A FakeInteraction is passed straight to a command's callback, e.g.
+``await bot.list_cmd.callback(FakeInteraction(user))``. It records every reply and
+when the first one (send_message or defer) happened, which is what Discord's 3
+second deadline applies to.
+"""
+import time
+from typing import List, Optional
+
+class FakeRole:
+    def __init__(self, name: str):
+        self.name = name
+
+class FakeUser:
+    def __init__(self, id: int, roles: List[str] = ()):
+        self.id = id
+        self.roles = [FakeRole(name) for name in roles]
+        self.mention = f"<@{id}>"
+        self.display_name = f"user{id}"
+
+    def __str__(self):
+        return self.display_name
+
+class FakeGuild:
+    def __init__(self, id: int = 1):
+        self.id = id
+
+class FakeResponse:
+    def __init__(self, interaction: "FakeInteraction"):
+        self.interaction = interaction
+        self._done = False
+
+    def is_done(self) -> bool:
+        return self._done
+
+    def _respond(self, kind: str, **kwargs):
+        if self._done:
+            raise RuntimeError("This interaction has already been responded to before")
+        self._done = True
+        self.interaction.record(kind, **kwargs)
+
+    async def defer(self, ephemeral: bool = False, thinking: bool = False):
+        self._respond("defer", ephemeral=ephemeral)
+
+    async def send_message(self, content: str = None, **kwargs):
+        self._respond("send_message", content=content, **kwargs)
+
+    async def edit_message(self, content: str = None, **kwargs):
+        self._respond("edit_message", content=content, **kwargs)
+
+class FakeFollowup:
+    def __init__(self, interaction: "FakeInteraction"):
+        self.interaction = interaction
+
+    async def send(self, content: str = None, **kwargs):
+        self.interaction.record("followup", content=content, **kwargs)
+
+class FakeInteraction:
+    def __init__(self, user: FakeUser, guild: Optional[FakeGuild] = FakeGuild()):
+        self.user = user
+        self.guild = guild
+        self.guild_id = guild.id if guild else None
+        self.command = None
+        self.extras = {}
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(self)
+        self.created = time.perf_counter()
+        self.first_response_at: Optional[float] = None
+        # (kind, kwargs) for every reply, in order
+        self.replies = []
+
+    def record(self, kind: str, **kwargs):
+        if self.first_response_at is None and kind in ("defer", "send_message", "edit_message"):
+            self.first_response_at = time.perf_counter()
+        self.replies.append((kind, kwargs))
+
+    @property
+    def first_response_seconds(self) -> Optional[float]:
+        if self.first_response_at is None:
+            return None
+        return self.first_response_at - self.created
+
+    async def edit_original_response(self, content: str = None, **kwargs):
+        self.record("edit_original_response", content=content, **kwargs)
+
+class FakeAttachment:
+    def __init__(self, filename: str, data: bytes):
+        self.filename = filename
+        self.data = data
+        self.size = len(data)
+
+    async def read(self) -> bytes:
+        return self.data
+
+def bencode(value) -> bytes:
+    if isinstance(value, int):
+        return b"i%de" % value
+    if isinstance(value, str):
+        value = value.encode()
+    if isinstance(value, bytes):
+        return b"%d:%s" % (len(value), value)
+    if isinstance(value, list):
+        return b"l" + b"".join(bencode(v) for v in value) + b"e"
+    if isinstance(value, dict):
+        items = sorted((k.encode() if isinstance(k, str) else k, v) for k, v in value.items())
+        return b"d" + b"".join(bencode(k) + bencode(v) for k, v in items) + b"e"
+    raise TypeError(f"cannot bencode {type(value).__name__}")
+
+def make_torrent(name: str, size: int = 2 ** 30) -> bytes:
+    # A minimal single-file .torrent; its info-hash only depends on name and size
+    return bencode({
+        "announce": "http://tracker.invalid/announce",
+        "info": {"name": name, "length": size, "piece length": 2 ** 20, "pieces": b"\0" * 20},
+    })
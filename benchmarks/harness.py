@@ -0,0 +1,137 @@
+"""Boots the real bot module against mock Transmission daemons.
+
+bot.py builds its singletons (clients, cache, scheduler) at import time, so one
+process can only hold one configuration: benchmarks run each configuration in a
+fresh ``python -m benchmarks.<module>`` subprocess. Discord itself is never
+contacted; handlers are called directly with the fakes from benchmarks.fakes.
+"""
+import asyncio
+import importlib
+import logging
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from benchmarks.mock_transmission import MockTransmission
+from benchmarks.report import summarize
+
+# The bot's modules live at the top of the repository
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The first user id handed out to seeded torrents
+FIRST_USER_ID = 1000
+
+def start_mocks(torrents: int, backends: int = 1, latency: float = 0.0, per_torrent_latency: float = 0.0,
+                split: Optional[List[int]] = None) -> List[MockTransmission]:
+    """Start ``backends`` mock daemons sharing ``torrents`` (or holding ``split[i]`` each)."""
+    if split is None:
+        split = [torrents // backends + (i < torrents % backends) for i in range(backends)]
+    return [
+        MockTransmission(f"b{i}", count, latency=latency, per_torrent_latency=per_torrent_latency).start()
+        for i, count in enumerate(split)
+    ]
+
+def connect_pool(mocks: List[MockTransmission]):
+    """A TransmissionPool over ``mocks`` without importing bot.py, for benchmarks of one layer."""
+    from backends import TransmissionPool, connect_backends
+    pool = TransmissionPool(connect_backends({
+        m.name: {"host": "127.0.0.1", "port": m.port, "user": "bench", "password": "bench"} for m in mocks
+    }))
+    # Back-to-back rounds would otherwise be served from the previous round's result
+    for backend in pool.backends.values():
+        backend.flights.window = 0
+    return pool
+
+def load_bot(mocks: List[MockTransmission], env: Dict[str, str] = None):
+    """Import bot.py configured for ``mocks`` with a throwaway database; returns the module."""
+    workdir = tempfile.mkdtemp(prefix="transmissionbot-bench-")
+    os.environ.update({
+        "DISCORD_TOKEN": "benchmark",
+        "TRANSMISSION_BACKENDS": ",".join(m.backend_spec() for m in mocks),
+        "METRICS_PORT": "0",
+        # Back-to-back rounds would otherwise be served from the previous round's result
+        "COALESCE_WINDOW": "0",
+        **(env or {}),
+    })
+    for name in ("TRANSMISSION_HOST", "TRANSMISSION_PORT", "TRANSMISSION_USER", "TRANSMISSION_PASSWORD"):
+        os.environ.pop(name, None)
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+    # init_db deletes legacy databases relative to the working directory
+    os.chdir(workdir)
+    db = importlib.import_module("db")
+    db.DB.path = os.path.join(workdir, "transbotdata.db")
+    bot = importlib.import_module("bot")
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger("transmissionbot").setLevel(logging.WARNING)
+    return bot
+
+async def setup(bot, mocks: List[MockTransmission], users: int = 10):
+    """Create the schema, give every mock torrent an owner and run setup_hook's loading steps."""
+    db = sys.modules["db"]
+    await db.init_db()
+    writes = []
+    i = 0
+    for mock in mocks:
+        for tor in list(mock.torrents.values()):
+            writes.append(db.add_torrent(tor["hashString"], tor["name"], FIRST_USER_ID + i % users, backend=mock.name))
+            i += 1
+    # Queued concurrently, so the writer commits them in a few large transactions
+    await asyncio.gather(*writes)
+    await bot.CACHE.load()
+    bot.TSCLIENT.load_owners({hash: row.get("backend") for hash, row in bot.CACHE.rows.items()})
+    await bot.ADMISSION.load()
+    await bot.RECONCILER.load()
+    await bot.TRACKER.load()
+
+async def teardown(bot, mocks: List[MockTransmission]):
+    await sys.modules["db"].DB.close()
+    for mock in mocks:
+        mock.stop()
+
+def rpc_calls(mocks: List[MockTransmission]) -> Counter:
+    total = Counter()
+    for mock in mocks:
+        total.update(mock.calls)
+    return total
+
+def db_writes() -> tuple:
+    # (commits, rows written) so far
+    db = sys.modules["db"]
+    metrics = sys.modules["metrics"]
+    return db.DB.commit_count, metrics.DB_ROWS_WRITTEN.values.get((), 0)
+
+async def measure(mocks: List[MockTransmission], op: Callable[[int], Awaitable], rounds: int,
+                  before: Callable[[int], Optional[Awaitable]] = None) -> dict:
+    """Run ``op(i)`` ``rounds`` times in a row and report latency, RPCs and DB writes per op.
+
+    ``before(i)`` runs untimed ahead of each round, e.g. to change mock state.
+    """
+    seconds = []
+    rpcs = Counter()
+    commits = rows = 0
+    for i in range(rounds):
+        if before is not None:
+            result = before(i)
+            if asyncio.iscoroutine(result):
+                await result
+        # Lets writes queued by the previous round commit outside the timed region
+        await asyncio.sleep(0)
+        calls_before = rpc_calls(mocks)
+        commits_before, rows_before = db_writes()
+        start = time.perf_counter()
+        await op(i)
+        seconds.append(time.perf_counter() - start)
+        rpcs.update(rpc_calls(mocks) - calls_before)
+        commits_after, rows_after = db_writes()
+        commits += commits_after - commits_before
+        rows += rows_after - rows_before
+    return {
+        **summarize(seconds),
+        "rpc": sum(rpcs.values()) / rounds,
+        "rpc_by_method": {method: count / rounds for method, count in sorted(rpcs.items())},
+        "db_commits": commits / rounds,
+        "db_rows": rows / rounds,
+    }
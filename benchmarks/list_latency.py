@@ -0,0 +1,101 @@
+"""Many concurrent /list calls against a deliberately slow Transmission.
+
+    python -m benchmarks.list_latency --calls 50 --latency 1.0
+
+Every call finds its page's cached state stale, so each one has to wait for a
+torrent-get. The first response (the defer) must still come right away, the calls
+must overlap instead of queueing behind each other, and the event loop has to stay
+responsive while the RPCs are in flight.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+from benchmarks import fakes, harness
+from benchmarks.report import format_table, summarize
+
+class LagProbe:
+    """Measures how late a short sleep wakes up, i.e. how long the event loop was blocked."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.max_lag = 0.0
+        self._task = None
+
+    async def _run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.max_lag = max(self.max_lag, time.perf_counter() - start - self.interval)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+async def run(args) -> dict:
+    mocks = harness.start_mocks(args.torrents, latency=args.latency)
+    bot = harness.load_bot(mocks)
+    try:
+        await harness.setup(bot, mocks, users=args.users)
+        # Nothing is cached yet, so every /list has to ask Transmission
+        bot.CACHE.live_at.clear()
+
+        async def one(i: int):
+            interaction = fakes.FakeInteraction(fakes.FakeUser(harness.FIRST_USER_ID + i % args.users))
+            await bot.list_cmd.callback(interaction)
+            return interaction, time.perf_counter() - interaction.created
+
+        probe = LagProbe()
+        probe.start()
+        calls_before = harness.rpc_calls(mocks)
+        start = time.perf_counter()
+        done = await asyncio.gather(*(one(i) for i in range(args.calls)))
+        wall = time.perf_counter() - start
+        await probe.stop()
+        rpcs = harness.rpc_calls(mocks) - calls_before
+    finally:
+        await harness.teardown(bot, mocks)
+    answered = sum(any(kind == "followup" and "embed" in kw for kind, kw in i.replies) for i, _ in done)
+    return {
+        "calls": args.calls,
+        "latency_ms": args.latency * 1000,
+        "answered": answered,
+        "first_response": summarize([i.first_response_seconds for i, _ in done]),
+        "completed": summarize([seconds for _, seconds in done]),
+        "wall_ms": wall * 1000,
+        "max_loop_lag_ms": probe.max_lag * 1000,
+        "rpc": sum(rpcs.values()),
+        "rpc_by_method": dict(rpcs),
+    }
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument("--calls", type=int, default=50)
+    p.add_argument("--latency", type=float, default=1.0, help="seconds added to every RPC by the mock")
+    p.add_argument("--torrents", type=int, default=1000)
+    p.add_argument("--users", type=int, default=10, help="distinct users making the calls")
+    p.add_argument("--json", action="store_true", help="print the raw result as JSON")
+    args = p.parse_args(argv)
+    result = asyncio.run(run(args))
+    if args.json:
+        json.dump(result, sys.stdout)
+        sys.stdout.write("\n")
+        return
+    print(f"{args.calls} concurrent /list calls from {args.users} users, {result['latency_ms']:.0f} ms RPC latency")
+    print(format_table(["", "p50 ms", "p99 ms", "max ms"], [
+        ["first response", *(result["first_response"][k] for k in ("p50_ms", "p99_ms", "max_ms"))],
+        ["completed", *(result["completed"][k] for k in ("p50_ms", "p99_ms", "max_ms"))],
+    ]))
+    print(f"answered {result['answered']}/{args.calls}, wall {result['wall_ms']:.0f} ms, "
+          f"{result['rpc']} RPCs, max event loop lag {result['max_loop_lag_ms']:.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+"""A local Transmission JSON-RPC server for benchmarks and tests.
+
+It speaks enough of the RPC protocol for transmission_rpc.Client and the bot:
+the X-Transmission-Session-Id (409) handshake, session-get, session-stats,
+free-space, torrent-get (by id, hash or "recently-active", only the requested
+fields), torrent-add, torrent-start/stop/remove and torrent-set. Each server runs
+its own event loop in a background thread, so the synchronous client can connect
+to it while the bot module is being imported.
+"""
+import asyncio
+import base64
+import hashlib
+import random
+import re
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+from aiohttp import web
+
+from torrentfile import parse_torrent
+
+SESSION_ID = "benchmark-session"
+# Transmission's status codes
+STOPPED, DOWNLOADING, SEEDING = 0, 4, 6
+# Seconds a torrent stays in "recently-active" after it changed, as in Transmission
+RECENTLY_ACTIVE_SECONDS = 60
+
+WORDS = [
+    "stellar", "odyssey", "shadow", "kingdom", "racing", "legends", "dragon", "empire", "tactics", "frontier",
+    "galaxy", "knight", "harvest", "chronicles", "zero", "midnight", "arcade", "rogue", "ocean", "citadel",
+    "phantom", "velocity", "quest", "iron", "crystal", "forgotten", "station", "horizon", "tales", "fortress",
+]
+TAGS = ["Remastered", "GOTY", "Deluxe.Edition", "Complete", "v1.0.4", "v2.1", "Update.3"]
+GROUPS = ["CODEX", "PLAZA", "SKIDROW", "FLT", "RUNE", "TENOKE"]
+_BTIH_RE = re.compile(r"xt=urn:btih:([0-9a-fA-F]{40})")
+
+def torrent_name(rng: random.Random) -> str:
+    words = [w.capitalize() for w in rng.sample(WORDS, rng.randint(2, 4))]
+    return ".".join(words + [rng.choice(TAGS)]) + f"-{rng.choice(GROUPS)}"
+
+def torrent_hash(backend: str, index: int) -> str:
+    return hashlib.sha1(f"{backend}:{index}".encode()).hexdigest()
+
+class MockTransmission:
+    """One mock daemon holding ``torrents`` generated torrents.
+
+    ``latency`` is added to every request and ``per_torrent_latency`` once per
+    torrent in a torrent-get response, standing in for the daemon's serialization
+    cost. ``calls`` counts handled requests per RPC method.
+    """
+
+    def __init__(self, name: str = "default", torrents: int = 0, latency: float = 0.0,
+                 per_torrent_latency: float = 0.0, free_space: int = 2 ** 40, seed: int = 0):
+        self.name = name
+        self.latency = latency
+        self.per_torrent_latency = per_torrent_latency
+        self.free_space = free_space
+        self.rng = random.Random(f"{name}:{seed}")
+        self.calls: Counter = Counter()
+        self.torrents: Dict[int, dict] = {}
+        self.by_hash: Dict[str, int] = {}
+        # id -> monotonic time of the last change / of the removal
+        self.active_at: Dict[int, float] = {}
+        self.removed_at: Dict[int, float] = {}
+        self.next_id = 1
+        for i in range(torrents):
+            self._create(torrent_hash(name, i), torrent_name(self.rng), self.rng.randint(1, 50) * 2 ** 30)
+        self.port: Optional[int] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def hashes(self) -> List[str]:
+        return list(self.by_hash)
+
+    def rpc_count(self, method: str = None) -> int:
+        return self.calls[method] if method else sum(self.calls.values())
+
+    def _create(self, hash: str, name: str, size: int, status: int = None, active: bool = False) -> dict:
+        if status is None:
+            status = self.rng.choice([DOWNLOADING, SEEDING, SEEDING, STOPPED])
+        done = 1.0 if status == SEEDING else round(self.rng.random() * 0.9, 4)
+        id = self.next_id
+        self.next_id += 1
+        tor = {
+            "id": id, "hashString": hash, "name": name, "status": status, "percentDone": done,
+            "eta": -1 if done >= 1 else self.rng.randint(60, 36000), "error": 0, "errorString": "",
+            "totalSize": size, "downloadedEver": int(size * done), "uploadedEver": int(size * self.rng.random()),
+            "rateDownload": self.rng.randint(0, 5 * 2 ** 20) if status == DOWNLOADING else 0,
+            "rateUpload": self.rng.randint(0, 2 ** 20) if status != STOPPED else 0,
+            "uploadRatio": round(self.rng.random() * 3, 3), "doneDate": 1700000000 + id if done >= 1 else 0,
+            "downloadDir": "/downloads",
+        }
+        self.torrents[id] = tor
+        self.by_hash[hash] = id
+        if active:
+            self.active_at[id] = time.monotonic()
+        return tor
+
+    # State changes driven by the benchmark, from any thread
+
+    def step(self, changes: int = 10, completions: int = 1):
+        """Advance ``changes`` downloading torrents, finishing ``completions`` of them."""
+        self._run(self._step, changes, completions)
+
+    def _step(self, changes: int, completions: int):
+        downloading = [t for t in self.torrents.values() if t["status"] == DOWNLOADING]
+        now = time.monotonic()
+        for i, tor in enumerate(self.rng.sample(downloading, min(changes, len(downloading)))):
+            if i < completions:
+                tor.update(status=SEEDING, percentDone=1.0, eta=-1, rateDownload=0, doneDate=int(time.time()))
+                tor["downloadedEver"] = tor["totalSize"]
+            else:
+                tor["percentDone"] = min(0.99, round(tor["percentDone"] + 0.01, 4))
+                tor["downloadedEver"] = int(tor["totalSize"] * tor["percentDone"])
+            self.active_at[tor["id"]] = now
+
+    def remove_external(self, hashes: List[str]):
+        # Removes torrents as if someone used the Transmission web UI
+        self._run(self._remove, hashes)
+
+    def _run(self, func, *args):
+        if self._loop is None:
+            return func(*args)
+        future = asyncio.run_coroutine_threadsafe(self._call(func, *args), self._loop)
+        return future.result()
+
+    async def _call(self, func, *args):
+        return func(*args)
+
+    # RPC methods
+
+    def _select(self, ids) -> List[dict]:
+        if ids is None:
+            return list(self.torrents.values())
+        if ids == "recently-active":
+            cutoff = time.monotonic() - RECENTLY_ACTIVE_SECONDS
+            return [self.torrents[i] for i, at in self.active_at.items() if at >= cutoff and i in self.torrents]
+        if not isinstance(ids, list):
+            ids = [ids]
+        selected = []
+        for i in ids:
+            id = self.by_hash.get(i) if isinstance(i, str) else i
+            if id in self.torrents:
+                selected.append(self.torrents[id])
+        return selected
+
+    def _files(self, tor: dict) -> dict:
+        # Generated on request only, like the real daemon's expensive file fields
+        count = 1 + tor["id"] % 40
+        size = tor["totalSize"] // count
+        return {
+            "files": [{"name": f"{tor['name']}/part{n:03}.bin", "length": size, "bytesCompleted": int(size * tor["percentDone"])}
+                      for n in range(count)],
+            "priorities": [0] * count,
+            "wanted": [1] * count,
+        }
+
+    async def torrent_get(self, args: dict) -> dict:
+        fields = args.get("fields") or []
+        torrents = self._select(args.get("ids"))
+        result = []
+        for tor in torrents:
+            source = {**tor, **self._files(tor)} if "files" in fields else tor
+            result.append({f: source[f] for f in fields if f in source})
+        if self.per_torrent_latency:
+            await asyncio.sleep(self.per_torrent_latency * len(result))
+        response = {"torrents": result}
+        if args.get("ids") == "recently-active":
+            cutoff = time.monotonic() - RECENTLY_ACTIVE_SECONDS
+            response["removed"] = [i for i, at in self.removed_at.items() if at >= cutoff]
+        return response
+
+    async def torrent_add(self, args: dict) -> dict:
+        if "metainfo" in args:
+            info = parse_torrent(base64.b64decode(args["metainfo"]))
+            hash, name, size = info["hash"], info.get("name") or info["hash"], info["total_size"]
+        else:
+            match = _BTIH_RE.search(args.get("filename", ""))
+            if not match:
+                raise ValueError("invalid or corrupt torrent file")
+            hash, name, size = match.group(1).lower(), match.group(1).lower(), 2 ** 30
+        if hash in self.by_hash:
+            tor = self.torrents[self.by_hash[hash]]
+            return {"torrent-duplicate": {"id": tor["id"], "name": tor["name"], "hashString": hash}}
+        tor = self._create(hash, name, size, status=DOWNLOADING, active=True)
+        return {"torrent-added": {"id": tor["id"], "name": tor["name"], "hashString": hash}}
+
+    def _set_status(self, args: dict, status: int) -> dict:
+        now = time.monotonic()
+        for tor in self._select(args.get("ids")):
+            tor["status"] = SEEDING if status == DOWNLOADING and tor["percentDone"] >= 1 else status
+            self.active_at[tor["id"]] = now
+        return {}
+
+    def _remove(self, hashes) -> dict:
+        now = time.monotonic()
+        for tor in self._select(hashes):
+            del self.torrents[tor["id"]]
+            del self.by_hash[tor["hashString"]]
+            self.active_at.pop(tor["id"], None)
+            self.removed_at[tor["id"]] = now
+        return {}
+
+    def session_stats(self) -> dict:
+        torrents = self.torrents.values()
+        totals = {
+            "uploadedBytes": sum(t["uploadedEver"] for t in torrents),
+            "downloadedBytes": sum(t["downloadedEver"] for t in torrents),
+            "filesAdded": len(self.torrents), "sessionCount": 1, "secondsActive": 3600,
+        }
+        return {
+            "activeTorrentCount": sum(t["status"] != STOPPED for t in torrents),
+            "pausedTorrentCount": sum(t["status"] == STOPPED for t in torrents),
+            "torrentCount": len(self.torrents),
+            "downloadSpeed": sum(t["rateDownload"] for t in torrents),
+            "uploadSpeed": sum(t["rateUpload"] for t in torrents),
+            "cumulative-stats": totals, "current-stats": totals,
+        }
+
+    async def dispatch(self, method: str, args: dict) -> dict:
+        if method == "session-get":
+            return {"rpc-version": 17, "rpc-version-semver": "5.3.0", "version": "4.0.5 (mock)", "download-dir": "/downloads"}
+        if method == "session-stats":
+            return self.session_stats()
+        if method == "free-space":
+            return {"path": args.get("path"), "size-bytes": self.free_space}
+        if method == "torrent-get":
+            return await self.torrent_get(args)
+        if method == "torrent-add":
+            return await self.torrent_add(args)
+        if method == "torrent-start":
+            return self._set_status(args, DOWNLOADING)
+        if method == "torrent-stop":
+            return self._set_status(args, STOPPED)
+        if method == "torrent-remove":
+            return self._remove(args.get("ids"))
+        if method == "torrent-set":
+            return {}
+        raise ValueError(f"method {method} not supported by the mock")
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if request.headers.get("X-Transmission-Session-Id") != SESSION_ID:
+            return web.Response(status=409, headers={"X-Transmission-Session-Id": SESSION_ID})
+        query = await request.json()
+        method = query.get("method")
+        self.calls[method] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        try:
+            arguments = await self.dispatch(method, query.get("arguments") or {})
+            body = {"result": "success", "arguments": arguments}
+        except ValueError as e:
+            body = {"result": str(e), "arguments": {}}
+        if "tag" in query:
+            body["tag"] = query["tag"]
+        return web.json_response(body)
+
+    # Lifecycle
+
+    def start(self) -> "MockTransmission":
+        ready = threading.Event()
+        self._thread = threading.Thread(target=self._serve, args=(ready,), name=f"mock-transmission-{self.name}", daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self
+
+    def _serve(self, ready: threading.Event):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        app = web.Application(client_max_size=64 * 2 ** 20)
+        app.router.add_post("/transmission/rpc", self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        self._loop.run_until_complete(self._runner.setup())
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        self._loop.run_until_complete(site.start())
+        self.port = self._runner.addresses[0][1]
+        ready.set()
+        self._loop.run_forever()
+        self._loop.run_until_complete(self._runner.cleanup())
+        self._loop.close()
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop = None
+
+    def backend_spec(self) -> str:
+        # An entry for TRANSMISSION_BACKENDS
+        return f"{self.name}=bench:bench@127.0.0.1:{self.port}"
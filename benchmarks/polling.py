@@ -0,0 +1,81 @@
+"""Full poll cost: one batched torrent-get per chunk vs the old get_torrent per torrent.
+
+    python -m benchmarks.polling --sizes 10,1000,10000 --latency 0.002
+
+The old loop is what bot.py did before the shared poller: a synchronous
+``get_torrent(hash)`` per tracked torrent. It is only run up to --old-max torrents,
+since at 10k it takes minutes by design.
+"""
+import argparse
+import asyncio
+import math
+import time
+
+import transmission_rpc
+
+from benchmarks.harness import connect_pool
+from benchmarks.mock_transmission import MockTransmission
+from benchmarks.report import format_table, percentile
+from poller import POLL_CHUNK_SIZE, TorrentPoller
+
+HEADERS = ["torrents", "approach", "RPCs", "expected", "p50 ms", "p99 ms"]
+
+def old_poll(client: transmission_rpc.Client, hashes):
+    # The pre-poller loop: one blocking round trip per torrent
+    return {h: client.get_torrent(h) for h in hashes}
+
+async def measure_poller(mock: MockTransmission, chunk_size: int, rounds: int) -> dict:
+    poller = TorrentPoller(connect_pool([mock]), chunk_size=chunk_size)
+    hashes = mock.hashes
+    seconds = []
+    before = mock.rpc_count("torrent-get")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        snapshot = await poller.poll(hashes)
+        seconds.append(time.perf_counter() - start)
+        assert len(snapshot) == len(hashes)
+    return {"rpc": (mock.rpc_count("torrent-get") - before) / rounds, "seconds": seconds}
+
+def measure_old(mock: MockTransmission, rounds: int) -> dict:
+    client = transmission_rpc.Client(host="127.0.0.1", port=mock.port, username="bench", password="bench")
+    hashes = mock.hashes
+    seconds = []
+    before = mock.rpc_count("torrent-get")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        old_poll(client, hashes)
+        seconds.append(time.perf_counter() - start)
+    return {"rpc": (mock.rpc_count("torrent-get") - before) / rounds, "seconds": seconds}
+
+def run(sizes, latency: float, per_torrent_latency: float, chunk_size: int, rounds: int, old_max: int):
+    rows = []
+    for size in sizes:
+        mock = MockTransmission("poll", size, latency=latency, per_torrent_latency=per_torrent_latency).start()
+        try:
+            new = asyncio.run(measure_poller(mock, chunk_size, rounds))
+            rows.append([size, "batched poller", new["rpc"], math.ceil(size / chunk_size),
+                         percentile(new["seconds"], 50) * 1000, percentile(new["seconds"], 99) * 1000])
+            if size <= old_max:
+                old = measure_old(mock, max(1, rounds // 5))
+                rows.append([size, "get_torrent loop", old["rpc"], size,
+                             percentile(old["seconds"], 50) * 1000, percentile(old["seconds"], 99) * 1000])
+        finally:
+            mock.stop()
+    return rows
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument("--sizes", default="10,1000,10000")
+    p.add_argument("--latency", type=float, default=0.002, help="seconds added to every RPC by the mock")
+    p.add_argument("--per-torrent-latency", type=float, default=0.0, help="seconds per torrent in a torrent-get reply")
+    p.add_argument("--chunk-size", type=int, default=POLL_CHUNK_SIZE)
+    p.add_argument("--rounds", type=int, default=10)
+    p.add_argument("--old-max", type=int, default=1000, help="largest size the per-torrent loop is run for")
+    args = p.parse_args(argv)
+    rows = run([int(s) for s in args.sizes.split(",")], args.latency, args.per_torrent_latency,
+               args.chunk_size, args.rounds, args.old_max)
+    print(f"Full poll, {args.latency * 1000:.1f} ms RPC latency, chunks of {args.chunk_size}")
+    print(format_table(HEADERS, rows))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+import math
+from typing import Dict, Iterable, List, Sequence
+
+def percentile(values: Sequence[float], q: float) -> float:
+    # Nearest-rank percentile; q in 0..100
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+def summarize(seconds: Sequence[float]) -> Dict[str, float]:
+    return {
+        "n": len(seconds),
+        "p50_ms": percentile(seconds, 50) * 1000,
+        "p99_ms": percentile(seconds, 99) * 1000,
+        "max_ms": max(seconds, default=0.0) * 1000,
+        "min_ms": min(seconds, default=0.0) * 1000,
+    }
+
+def format_table(headers: List[str], rows: Iterable[Sequence]) -> str:
+    rows = [[_cell(v) for v in row] for row in rows]
+    widths = [max(len(h), *(len(r[i]) for r in rows)) if rows else len(h) for i, h in enumerate(headers)]
+    lines = ["  ".join(h.ljust(w) if i == 0 else h.rjust(w) for i, (h, w) in enumerate(zip(headers, widths)))]
+    lines.append("  ".join("-" * w for w in widths))
+    for row in rows:
+        lines.append("  ".join(v.ljust(w) if i == 0 else v.rjust(w) for i, (v, w) in enumerate(zip(row, widths))))
+    return "\n".join(lines)
+
+def _cell(value) -> str:
+    if isinstance(value, float):
+        return f"{value:.2f}" if value < 100 else f"{value:.0f}"
+    return str(value)
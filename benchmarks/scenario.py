@@ -0,0 +1,111 @@
+"""One benchmark configuration: the bot's handlers and scheduler jobs against mock daemons.
+
+Run by ``python -m benchmarks`` in a subprocess per library size; prints one JSON
+object with p50/p99 latency, RPCs and DB writes per operation.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import sys
+
+from benchmarks import fakes, harness
+
+ADMIN = fakes.FakeUser(1, roles=["admin"])
+USER = fakes.FakeUser(harness.FIRST_USER_ID)
+# Prefix, multi-word, single-letter, miss (falls back to the bounded fuzzy pass) and empty
+QUERIES = ["st", "stellar od", "dragon", "k", "zzqx", "", "kingdom tal", "remaster"]
+
+def magnet(i: int) -> str:
+    btih = hashlib.sha1(f"bench-magnet:{i}".encode()).hexdigest()
+    return f"magnet:?xt=urn:btih:{btih}&dn=bench{i}"
+
+async def run(args) -> dict:
+    mocks = harness.start_mocks(args.torrents, args.backends, args.latency, args.per_torrent_latency)
+    bot = harness.load_bot(mocks)
+    await harness.setup(bot, mocks, users=args.users)
+    # Warm-up: the first cycle records the baseline state without events
+    for job in bot.SCHEDULER.jobs:
+        job.last_run = 0
+    await bot.SCHEDULER.run_cycle()
+
+    def full_poll(i):
+        bot.TRACKER.last_poll = 0
+
+    def changes(i):
+        for mock in mocks:
+            mock.step(changes=args.changes, completions=1)
+
+    def cold_cache(i):
+        bot.CACHE.live_at.clear()
+
+    def all_jobs_due(i):
+        changes(i)
+        for job in bot.SCHEDULER.jobs:
+            job.last_run = 0
+
+    async def list_as(user, i):
+        interaction = fakes.FakeInteraction(user)
+        await bot.list_cmd.callback(interaction)
+
+    async def autocomplete_as(user, i):
+        await bot.torrent_name_autocomplete(fakes.FakeInteraction(user), QUERIES[i % len(QUERIES)])
+
+    async def add_magnet(i):
+        await bot.add_cmd.callback(fakes.FakeInteraction(USER), magnet=magnet(i))
+
+    async def add_file(i):
+        data = fakes.make_torrent(f"Bench.Upload.{i}-GROUP")
+        await bot.add_cmd.callback(fakes.FakeInteraction(USER), file=fakes.FakeAttachment(f"upload{i}.torrent", data))
+
+    ops = {
+        "poll events (full)": (lambda i: bot.poll_torrent_events(), full_poll),
+        "poll events (incremental)": (lambda i: bot.poll_torrent_events(), changes),
+        "stats refresh": (lambda i: bot.refresh_torrent_stats(), None),
+        "stats history sample": (lambda i: bot.sample_stats_history(), None),
+        "session stats": (lambda i: bot.SESSION.refresh(), None),
+        "reconcile": (lambda i: bot.reconcile_torrents(), None),
+        "scheduler cycle (all jobs)": (lambda i: bot.SCHEDULER.run_cycle(), all_jobs_due),
+        "/list user (warm)": (lambda i: list_as(USER, i), None),
+        "/list user (cold)": (lambda i: list_as(USER, i), cold_cache),
+        "/list admin (cold)": (lambda i: list_as(ADMIN, i), cold_cache),
+        "autocomplete user": (lambda i: autocomplete_as(USER, i), None),
+        "autocomplete admin": (lambda i: autocomplete_as(ADMIN, i), None),
+        "/add magnet": (add_magnet, None),
+        "/add file": (add_file, None),
+    }
+    results = {}
+    try:
+        for name, (op, before) in ops.items():
+            if args.only and not any(key in name for key in args.only):
+                continue
+            rounds = args.rounds * 10 if name.startswith("autocomplete") else args.rounds
+            results[name] = await harness.measure(mocks, op, rounds, before)
+    finally:
+        await harness.teardown(bot, mocks)
+    return {
+        "torrents": args.torrents,
+        "backends": args.backends,
+        "latency_ms": args.latency * 1000,
+        "results": results,
+    }
+
+def parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument("--torrents", type=int, default=1000)
+    p.add_argument("--backends", type=int, default=1)
+    p.add_argument("--latency", type=float, default=0.002, help="seconds added to every RPC by the mock")
+    p.add_argument("--per-torrent-latency", type=float, default=0.0, help="seconds per torrent in a torrent-get reply")
+    p.add_argument("--users", type=int, default=10, help="owners the seeded torrents are spread over")
+    p.add_argument("--changes", type=int, default=20, help="torrents changing between incremental polls, per backend")
+    p.add_argument("--rounds", type=int, default=20)
+    p.add_argument("--only", nargs="*", help="only operations whose name contains one of these")
+    return p
+
+def main(argv=None):
+    args = parser().parse_args(argv)
+    json.dump(asyncio.run(run(args)), sys.stdout)
+    sys.stdout.write("\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Full poll time with torrents spread over several Transmission backends.
+
+    python -m benchmarks.sharding --per-torrent-latency 0.0002
+
+The pool polls every backend at once, so a cycle should take about as long as
+polling the largest backend alone, not the sum of polling each one in turn. Each
+layout is compared with both. Replies are still parsed in this one process, so
+with equal backends the pool lands somewhat above the largest one alone.
+"""
+import argparse
+import asyncio
+import time
+from typing import List
+
+from benchmarks.harness import connect_pool
+from benchmarks.mock_transmission import MockTransmission
+from benchmarks.report import format_table, percentile
+from poller import POLL_CHUNK_SIZE, TorrentPoller
+
+LAYOUTS = [[10000], [5000, 5000], [2500, 2500, 2500, 2500], [7000, 1000, 1000, 1000]]
+HEADERS = ["backends", "largest", "RPCs", "pool poll ms", "largest alone ms", "one by one ms"]
+
+async def poll_time(mocks: List[MockTransmission], chunk_size: int, rounds: int) -> float:
+    pool = connect_pool(mocks)
+    pool.load_owners({h: m.name for m in mocks for h in m.hashes})
+    poller = TorrentPoller(pool, chunk_size=chunk_size)
+    hashes = [h for m in mocks for h in m.hashes]
+    seconds = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        snapshot = await poller.poll(hashes)
+        seconds.append(time.perf_counter() - start)
+        assert len(snapshot) == len(hashes)
+    return percentile(seconds, 50)
+
+async def measure(split: List[int], latency: float, per_torrent_latency: float, chunk_size: int, rounds: int) -> dict:
+    mocks = [MockTransmission(f"b{i}", n, latency=latency, per_torrent_latency=per_torrent_latency).start()
+             for i, n in enumerate(split)]
+    try:
+        calls_before = sum(m.rpc_count("torrent-get") for m in mocks)
+        pooled = await poll_time(mocks, chunk_size, rounds)
+        rpcs = (sum(m.rpc_count("torrent-get") for m in mocks) - calls_before) / rounds
+        alone = [await poll_time([m], chunk_size, rounds) for m in mocks]
+    finally:
+        for m in mocks:
+            m.stop()
+    return {"split": split, "rpc": rpcs, "pool": pooled, "largest": max(alone), "sum": sum(alone)}
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument("--latency", type=float, default=0.002, help="seconds added to every RPC by the mock")
+    p.add_argument("--per-torrent-latency", type=float, default=0.0002,
+                   help="seconds per torrent in a torrent-get reply, the daemon's own cost")
+    p.add_argument("--chunk-size", type=int, default=POLL_CHUNK_SIZE)
+    p.add_argument("--rounds", type=int, default=3)
+    args = p.parse_args(argv)
+    rows = []
+    for split in LAYOUTS:
+        r = asyncio.run(measure(split, args.latency, args.per_torrent_latency, args.chunk_size, args.rounds))
+        rows.append(["+".join(map(str, split)), max(split), r["rpc"], r["pool"] * 1000, r["largest"] * 1000, r["sum"] * 1000])
+    print(f"Full poll of 10000 torrents, {args.per_torrent_latency * 1e6:.0f} us per torrent in the daemon, "
+          f"chunks of {args.chunk_size}")
+    print(format_table(HEADERS, rows))
+
+if __name__ == "__main__":
+    main()
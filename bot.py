@@ -1,6 +1,7 @@
 import os
-import re
-import sys
+import time
+# Process start, for reporting how long startup took
+STARTED_AT = time.perf_counter()
 DEBUG = os.environ.get("DEBUG", "0") == "1"
 
 import discord
@@ -8,12 +9,27 @@ from discord import app_commands
 from discord.ext import commands
 import logging
 import asyncio
-from db import init_db, add_torrent, list_torrents, update_torrent_status, get_torrent, update_torrent_name, update_torrent_stats, remove_torrent
-import transmission_rpc
+import datetime
+from db import DB, init_db, SCHEMA_VERSION, get_meta, set_meta, add_torrent, list_torrents, update_torrent_status, get_torrent, remove_torrent, bulk_update_torrents, summarize, page_torrents, select_torrents, set_torrents_status, remove_torrents, record_stats_sample, stats_history
+from poller import TorrentPoller, torrent_row
+from backends import TransmissionPool, parse_backends, connect_backends, DEFAULT_BACKEND
+from cache import TorrentCache
+from search import NameIndex
+from names import NameCleaner
+from events import StateTracker, event_id
+from torrentfile import parse_torrent, magnet_info_hash
+from notify import NotificationDispatcher
+from admission import AdmissionController
+from reconcile import Reconciler, RECONCILE_INTERVAL
+from sessionstats import SessionMonitor, SESSION_STATS_INTERVAL, SESSION_STATS_TTL, session_stats_ttl
+from filelist import FileListCache, parse_file_selection
+from metrics import REGISTRY, Counter, Gauge, COMMAND_SECONDS, start_metrics_server, monitor_loop_lag
+from scheduler import PollScheduler, ACTIVITY_IDLE, ACTIVITY_ACTIVE, ACTIVITY_NEAR_COMPLETION
 import random
-import tempfile
 import math
-import time
+import hashlib
+import inspect
+import json
 
 # Load config/token
 TOKEN = os.environ.get("DISCORD_TOKEN")
@@ -31,6 +47,8 @@ TS_HOST = os.environ.get("TRANSMISSION_HOST")
 TS_PORT = os.environ.get("TRANSMISSION_PORT")
 TS_USER = os.environ.get("TRANSMISSION_USER")
 TS_PASS = os.environ.get("TRANSMISSION_PASSWORD")
+# Several daemons: TRANSMISSION_BACKENDS="disk1=user:pass@host1:9091,disk2=user:pass@host2:9091"
+TS_BACKENDS = parse_backends(os.environ.get("TRANSMISSION_BACKENDS", ""))
 if TS_HOST and TS_PORT and TS_USER and TS_PASS:
     TS_CONFIG = {
         "host": TS_HOST,
@@ -38,7 +56,7 @@ if TS_HOST and TS_PORT and TS_USER and TS_PASS:
         "user": TS_USER,
         "password": TS_PASS,
     }
-elif TS_CONFIG is None:
+elif TS_CONFIG is None and not TS_BACKENDS:
     # Fallback to config.json if env vars not set
     try:
         from config import CONFIG
@@ -56,35 +74,58 @@ log_level = logging.DEBUG if DEBUG else logging.INFO
 logging.basicConfig(level=log_level)
 logger = logging.getLogger("transmissionbot")
 
+class InstrumentedCommandTree(app_commands.CommandTree):
+    """Command tree that records how long each slash command takes, per command and outcome."""
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        interaction.extras["started"] = time.perf_counter()
+        return True
+
+    async def on_error(self, interaction: discord.Interaction, error: app_commands.AppCommandError):
+        observe_command(interaction, "error")
+        await super().on_error(interaction, error)
+
+def observe_command(interaction: discord.Interaction, outcome: str):
+    started = interaction.extras.get("started")
+    if started is not None and interaction.command is not None:
+        COMMAND_SECONDS.observe(time.perf_counter() - started, interaction.command.qualified_name, outcome)
+
 intents = discord.Intents.default()
 intents.message_content = True  # Enable privileged intent (even if not needed for slash commands)
-client = commands.Bot(command_prefix="!", intents=intents)
-
-# Transmission RPC client
-TSCLIENT = transmission_rpc.Client(
-    host=TS_CONFIG["host"],
-    port=TS_CONFIG["port"],
-    username=TS_CONFIG["user"],
-    password=TS_CONFIG["password"]
-)
+client = commands.Bot(command_prefix="!", intents=intents, tree_cls=InstrumentedCommandTree)
+
+# Transmission RPC clients, one per backend, routed by hash; every call is awaited so a
+# slow daemon never blocks the event loop
+TSCLIENT = TransmissionPool(connect_backends(TS_BACKENDS or {DEFAULT_BACKEND: TS_CONFIG}))
+
+# Shared batched poller used by both background loops
+POLLER = TorrentPoller(TSCLIENT)
+# The stats loop reuses any snapshot younger than this instead of polling again
+STATS_SNAPSHOT_MAX_AGE = 90
 
 # Name cleanup: set NAME_CLEANUP_REPLACE and NAME_CLEANUP_REMOVE as comma-separated pairs in env, e.g.
 # NAME_CLEANUP_REPLACE='+: ,%20: ', NAME_CLEANUP_REMOVE='SomeGroup,AnotherTag'
+# The rules are compiled once; /namerules reloads or overrides them at runtime.
+NAME_CLEANER = NameCleaner()
+
 def clean_torrent_name(name):
-    replace = os.environ.get("NAME_CLEANUP_REPLACE", "+: ,%20: ")
-    remove = os.environ.get("NAME_CLEANUP_REMOVE", "")
-    # Apply replacements
-    for pair in replace.split(","):
-        if ":" in pair:
-            k, v = pair.split(":", 1)
-            name = name.replace(k, v)
-    # Remove substrings
-    for word in remove.split(","):
-        if word.strip():
-            name = re.sub(re.escape(word.strip()), "", name, flags=re.IGNORECASE)
-    # Collapse double spaces
-    name = re.sub(r"\s+", " ", name).strip()
-    return name
+    return NAME_CLEANER.clean(name)
+
+# In-memory torrent state for commands, kept fresh by the poller, plus the
+# autocomplete name index it maintains
+NAME_INDEX = NameIndex(clean_torrent_name)
+CACHE = TorrentCache(index=NAME_INDEX)
+POLLER.listeners.append(CACHE.update_live)
+# Completion and error detection from recently-active polls
+TRACKER = StateTracker(TSCLIENT, POLLER)
+# File lists for /files, fetched per torrent on demand
+FILES = FileListCache(TSCLIENT, CACHE)
+# One scheduler runs all periodic polling with an adaptive interval
+SCHEDULER = PollScheduler()
+RECONCILER = Reconciler(TSCLIENT, CACHE)
+STATS_REFRESH_INTERVAL = 300
+# Seconds between bandwidth history samples used by /stats
+STATS_SAMPLE_INTERVAL = int(os.environ.get("STATS_SAMPLE_INTERVAL", "60"))
 
 def is_admin(interaction: discord.Interaction) -> bool:
     if not interaction.guild:
@@ -93,6 +134,25 @@ def is_admin(interaction: discord.Interaction) -> bool:
 
 NOTIFY_MODE = os.environ.get("NOTIFY_MODE", "dm").lower()
 NOTIFY_CHANNEL_ID = int(os.environ.get("NOTIFY_CHANNEL_ID", "0"))
+NOTIFIER = NotificationDispatcher(client, NOTIFY_MODE, NOTIFY_CHANNEL_ID)
+
+REGISTRY.register(Gauge("transmissionbot_notification_queue_depth", "Notifications waiting to be sent", func=NOTIFIER.depth))
+REGISTRY.register(Counter("transmissionbot_notifications_sent_total", "Notifications delivered since start", func=lambda: NOTIFIER.sent))
+REGISTRY.register(Counter("transmissionbot_notifications_failed_total", "Notifications dropped since start", func=lambda: NOTIFIER.failed))
+REGISTRY.register(Counter("transmissionbot_cache_hits_total", "Torrent cache reads served without a Transmission poll", func=lambda: CACHE.hits))
+REGISTRY.register(Counter("transmissionbot_cache_misses_total", "Torrent cache reads that needed a Transmission poll", func=lambda: CACHE.misses))
+REGISTRY.register(Gauge("transmissionbot_cache_hit_ratio", "Share of torrent cache reads served from cache",
+                        func=lambda: CACHE.hits / (CACHE.hits + CACHE.misses) if CACHE.hits + CACHE.misses else 0.0))
+REGISTRY.register(Gauge("transmissionbot_tracked_torrents", "Torrents tracked in the cache", func=lambda: len(CACHE.rows)))
+
+# Where /add tells Transmission to save new torrents
+DOWNLOAD_DIR = os.environ.get("DOWNLOAD_DIR", "/data/games")
+# Largest .torrent attachment /add accepts, in bytes
+TORRENT_UPLOAD_MAX_BYTES = int(os.environ.get("TORRENT_UPLOAD_MAX_BYTES", str(10 * 1024 * 1024)))
+# Cached session-stats and free space, refreshed by the scheduler; /info and /add read it
+SESSION = SessionMonitor(TSCLIENT, [DOWNLOAD_DIR], ttl=SESSION_STATS_TTL or session_stats_ttl(
+    SCHEDULER.max_interval, SCHEDULER.jitter, SESSION_STATS_INTERVAL))
+TSCLIENT.session_stats = SESSION
 
 # Legend for status and metrics (only those actually used)
 LEGEND = {
@@ -119,143 +179,196 @@ LEGEND = {
     'local_error': '🖥',
 }
 
-# --- Robust DB Initialization and Cleanup ---
-LEGACY_DBS = ["torrents.db"]
-# Use the mounted file for the DB, new name for clean start
-DB_PATH = "/app/transbotdata.db"
-
-def robust_db_init():
-    # Remove legacy DBs
-    for db in LEGACY_DBS:
-        if os.path.exists(db):
-            try:
-                os.remove(db)
-                print(f"Removed legacy DB: {db}")
-            except Exception as e:
-                print(f"Failed to remove legacy DB {db}: {e}")
-    # Ensure correct DB exists and schema is valid
-    import aiosqlite
-    import asyncio
-    async def check_schema():
-        try:
-            async with aiosqlite.connect(DB_PATH) as db:
-                await db.execute("CREATE TABLE IF NOT EXISTS torrents (hash TEXT PRIMARY KEY, name TEXT NOT NULL, user_id INTEGER NOT NULL, status TEXT, added_at TEXT);")
-                await db.commit()
-                # Check schema
-                cursor = await db.execute("PRAGMA table_info(torrents);")
-                cols = await cursor.fetchall()
-                if len(cols) < 5:
-                    print("torrents table schema is invalid or missing columns!")
-                    sys.exit(1)
-        except Exception as e:
-            print(f"Failed to initialize/check DB: {e}")
-            sys.exit(1)
-    asyncio.get_event_loop().run_until_complete(check_schema())
-    print(f"Database {DB_PATH} initialized and checked.")
-# --- End Robust DB Initialization ---
-
-robust_db_init()
-
 # Remove hardcoded UNC_BASE, use env var only
 def get_unc_base():
     return os.environ.get("UNC_BASE", "")
 
-async def notify_completed_torrents():
-    await client.wait_until_ready()
-    notified = set()
-    while not client.is_closed():
-        try:
-            torrents = await list_torrents()
-            for t in torrents:
-                if t["status"] != "finished":
-                    try:
-                        tor = TSCLIENT.get_torrent(t["hash"])
-                        db_torrent = await get_torrent(t["hash"])
-                        if not db_torrent or "user_id" not in db_torrent:
-                            logger.error(f"No user_id found for torrent {t['hash']}")
-                            continue
-                        # Update name in DB if it has changed (magnet got real name)
-                        if tor.name and db_torrent["name"] != tor.name:
-                            await update_torrent_name(t["hash"], tor.name)
-                        if tor.status == "seeding" and t["hash"] not in notified:
-                            user_id = db_torrent["user_id"]
-                            # Use configurable UNC base if available
-                            unc_base = get_unc_base()
-                            unc_path = f"{unc_base}\{clean_torrent_name(tor.name)}"
-                            msg = f"✅ <@{user_id}> Your download is complete and available at: `{unc_path}`"
-                            
-                            # Send notification based on mode
-                            if NOTIFY_MODE == "channel" and NOTIFY_CHANNEL_ID:
-                                try:
-                                    channel = client.get_channel(int(NOTIFY_CHANNEL_ID))
-                                    if channel:
-                                        await channel.send(msg)
-                                    else:
-                                        logger.error(f"Could not find notification channel with ID {NOTIFY_CHANNEL_ID}")
-                                except ValueError:
-                                    logger.error(f"Invalid notification channel ID: {NOTIFY_CHANNEL_ID}")
-                                except Exception as channel_err:
-                                    logger.error(f"Error sending channel notification: {channel_err}")
-                            else:
-                                try:
-                                    user = await client.fetch_user(user_id)
-                                    await user.send(msg)
-                                except discord.errors.NotFound:
-                                    logger.error(f"User with ID {user_id} not found for notification")
-                                except Exception as dm_err:
-                                    logger.error(f"Error sending DM notification: {dm_err}")
-                            
-                            notified.add(t["hash"])
-                            await update_torrent_status(t["hash"], "finished")
-                    except transmission_rpc.error.TransmissionError as te:
-                        logger.error(f"Transmission error for torrent {t['hash']}: {te}")
-                    except Exception as e:
-                        logger.error(f"Error checking torrent {t['hash']}: {e}")
-        except Exception as main_error:
-            logger.error(f"Critical error in notification loop: {main_error}")
-        
-        await asyncio.sleep(60)
-
-async def periodic_stats_refresh():
+async def notify_completion(event):
+    if event.kind != "completed":
+        return
+    row = CACHE.rows.get(event.hash) or await get_torrent(event.hash)
+    if not row or row.get("user_id") is None:
+        logger.error(f"No user_id found for torrent {event.hash}")
+        return
+    user_id = row["user_id"]
+    # Use configurable UNC base if available
+    unc_base = get_unc_base()
+    unc_path = f"{unc_base}\\{clean_torrent_name(event.torrent.name)}"
+    msg = f"✅ <@{user_id}> Your download is complete and available at: `{unc_path}`"
+
+    await NOTIFIER.submit(user_id, msg, id=event_id(event))
+
+async def log_torrent_error(event):
+    if event.kind == "error":
+        logger.warning(f"Torrent {event.hash} reported an error: {event.torrent.fields.get('errorString', '')}")
+    elif event.kind == "error_cleared":
+        logger.info(f"Torrent {event.hash} error cleared")
+
+TRACKER.subscribe(notify_completion)
+TRACKER.subscribe(log_torrent_error)
+
+def torrent_activity(torrents) -> int:
+    # Activity level for the scheduler: any download close to done, any download, or idle
+    activity = ACTIVITY_IDLE
+    for tor in torrents:
+        if str(tor.status) not in ("downloading", "download pending"):
+            continue
+        eta = tor.fields.get("eta", -1)
+        if tor.fields.get("percentDone", 0) >= 0.95 or 0 <= eta <= 2 * SCHEDULER.active_interval:
+            return ACTIVITY_NEAR_COMPLETION
+        activity = ACTIVITY_ACTIVE
+    return activity
+
+async def poll_torrent_events():
+    await CACHE.ensure_loaded()
+    # Only torrents that changed since the last cycle come back here
+    changed = await TRACKER.poll(list(CACHE.rows))
+    rows = [torrent_row(tor) for tor in changed.values()]
+    # Keeps names current (magnets get their real name) along with status and stats
+    await bulk_update_torrents(rows)
+    for row in rows:
+        CACHE.update_row(row["hash"], status=row["status"], **({"name": row["name"]} if row["name"] else {}))
+    return torrent_activity(changed.values())
+
+async def refresh_torrent_stats():
+    torrents = await list_torrents()
+    # Reuse the event poll's snapshot when it is recent enough
+    snapshot = await POLLER.get_snapshot([t["hash"] for t in torrents], max_age=STATS_SNAPSHOT_MAX_AGE)
+    rows = []
+    for t in torrents:
+        tor = snapshot.get(t["hash"])
+        if tor is None:
+            logger.error(f"Error updating stats for {t['hash']}: not found in Transmission")
+            continue
+        rows.append(torrent_row(tor))
+    written = await bulk_update_torrents(rows)
+    for row in rows:
+        CACHE.update_row(row["hash"], status=row["status"], **({"name": row["name"]} if row["name"] else {}))
+    logger.debug(f"Stats refresh wrote {written}/{len(rows)} changed rows")
+    logger.info(f"Periodic stats refresh complete ({len(snapshot)} torrents, {POLLER.last_duration:.2f}s poll).")
+
+async def reconcile_torrents():
+    result = await RECONCILER.run()
+    if result["orphans"]:
+        # Removed torrents may have freed quota for queued adds
+        SCHEDULER.wake()
+
+async def start_queued_adds():
+    # New downloads were started, so poll at the active rate
+    if await ADMISSION.run_queue():
+        return ACTIVITY_ACTIVE
+
+async def sample_stats_history():
+    await record_stats_sample(int(time.time()))
+
+SCHEDULER.add_job("torrent events", poll_torrent_events)
+SCHEDULER.add_job("stats refresh", refresh_torrent_stats, every=STATS_REFRESH_INTERVAL)
+SCHEDULER.add_job("stats history", sample_stats_history, every=STATS_SAMPLE_INTERVAL)
+SCHEDULER.add_job("add queue", start_queued_adds)
+SCHEDULER.add_job("reconcile", reconcile_torrents, every=RECONCILE_INTERVAL)
+SCHEDULER.add_job("session stats", SESSION.refresh, every=SESSION_STATS_INTERVAL)
+
+def health():
+    # Liveness for /healthz: connected to Discord and the poll loop is still cycling
+    if client.is_closed() or not client.is_ready():
+        return False, "not connected to Discord"
+    since = time.monotonic() - SCHEDULER.last_cycle_at
+    if SCHEDULER.last_cycle_at and since > 2 * SCHEDULER.max_interval + 60:
+        return False, f"no poll cycle for {since:.0f}s"
+    return True, "ok"
+
+# Long-running loops by name; start_background_task never starts a second copy
+BACKGROUND_TASKS = {}
+
+def start_background_task(name: str, coro_func):
+    task = BACKGROUND_TASKS.get(name)
+    if task is not None and not task.done():
+        logger.warning(f"Background task {name} is already running, not starting another")
+        return task
+    task = asyncio.create_task(coro_func(), name=name)
+    task.add_done_callback(log_background_task_exit)
+    BACKGROUND_TASKS[name] = task
+    return task
+
+def log_background_task_exit(task: asyncio.Task):
+    if task.cancelled():
+        return
+    if task.exception():
+        logger.error(f"Background task {task.get_name()} crashed: {task.exception()}")
+    else:
+        logger.warning(f"Background task {task.get_name()} exited")
+
+def running_background_tasks() -> int:
+    return sum(not t.done() for t in BACKGROUND_TASKS.values()) + sum(not t.done() for t in NOTIFIER.tasks)
+
+REGISTRY.register(Gauge("transmissionbot_background_tasks", "Background loops currently running", func=running_background_tasks))
+
+async def run_scheduler():
     await client.wait_until_ready()
-    import time
-    while not client.is_closed():
-        try:
-            torrents = await list_torrents()
-            for t in torrents:
-                try:
-                    tor = TSCLIENT.get_torrent(t["hash"])
-                    stats = {
-                        'total_size': getattr(tor, 'total_size', 0),
-                        'downloaded_ever': getattr(tor, 'downloaded_ever', 0),
-                        'uploaded_ever': getattr(tor, 'uploaded_ever', 0),
-                        'rate_download': getattr(tor, 'rate_download', 0),
-                        'rate_upload': getattr(tor, 'rate_upload', 0),
-                        'upload_ratio': getattr(tor, 'upload_ratio', 0.0),
-                    }
-                    await update_torrent_stats(t["hash"], stats)
-                    await update_torrent_status(t["hash"], tor.status)
-                except Exception as e:
-                    logger.error(f"Error updating stats for {t['hash']}: {e}")
-            logger.info("Periodic stats refresh complete.")
-        except Exception as e:
-            logger.error(f"Error in periodic stats refresh: {e}")
-        await asyncio.sleep(300)  # 5 minutes
+    await SCHEDULER.run(client.is_closed)
+
+# Set to 1 to sync slash commands even if the command tree did not change
+FORCE_COMMAND_SYNC = os.environ.get("FORCE_COMMAND_SYNC", "0") == "1"
+
+def command_payload(command) -> dict:
+    # discord.py 2.4 added the tree argument to to_dict(); 2.3 takes none
+    if inspect.signature(command.to_dict).parameters:
+        return command.to_dict(client.tree)
+    return command.to_dict()
+
+async def sync_commands():
+    """Sync the slash commands with Discord only when their definition changed.
+
+    The fingerprint is a hash of the serialized command tree, stored per application
+    and scope in bot_meta, so restarts and reconnects skip the rate-limited sync.
+    """
+    guild = discord.Object(id=GUILD_ID) if GUILD_ID else None
+    payload = [command_payload(command) for command in client.tree.get_commands(guild=guild)]
+    fingerprint = hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+    key = f"command_tree:{client.application_id}:{GUILD_ID or 'global'}"
+    if not FORCE_COMMAND_SYNC and await get_meta(key) == fingerprint:
+        logger.info(f"Slash commands unchanged ({len(payload)} commands), skipping sync.")
+        return
+    synced = await client.tree.sync(guild=guild)
+    await set_meta(key, fingerprint)
+    logger.info(f"Synced {len(synced)} commands.")
+
+STARTUP_SECONDS = REGISTRY.register(Gauge("transmissionbot_startup_seconds", "Seconds from process start to the first ready event"))
 
 @client.event
-async def on_ready():
-    logger.info(f"Bot connected as {client.user}")
-    await init_db()
+async def setup_hook():
+    # Runs once on the bot's own loop, after login and before the gateway connects.
+    # Everything started here survives reconnects; on_ready can fire many times.
+    start = time.perf_counter()
+    applied = await init_db()
+    logger.info(f"Database ready at schema v{SCHEMA_VERSION} ({applied} migrations applied) in {time.perf_counter() - start:.3f}s")
+    await CACHE.load()
+    TSCLIENT.load_owners({hash: row.get("backend") for hash, row in CACHE.rows.items()})
+    await ADMISSION.load()
+    await RECONCILER.load()
     try:
-        if GUILD_ID:
-            synced = await client.tree.sync(guild=discord.Object(id=GUILD_ID))
-        else:
-            synced = await client.tree.sync()
-        logger.info(f"Synced {len(synced)} commands.")
+        await sync_commands()
     except Exception as e:
         logger.error(f"Failed to sync commands: {e}")
-    client.loop.create_task(notify_completed_torrents())
-    client.loop.create_task(periodic_stats_refresh())
+    NOTIFIER.start()
+    start_background_task("scheduler", run_scheduler)
+    start_background_task("loop lag monitor", monitor_loop_lag)
+    try:
+        await start_metrics_server(health)
+    except OSError as e:
+        logger.error(f"Could not start metrics endpoint: {e}")
+    logger.info(f"Setup done in {time.perf_counter() - start:.2f}s, {running_background_tasks()} background loops running.")
+
+@client.event
+async def on_ready():
+    logger.info(f"Bot connected as {client.user}")
+    if not STARTUP_SECONDS.values:
+        STARTUP_SECONDS.set(time.perf_counter() - STARTED_AT)
+        logger.info(f"Startup took {STARTUP_SECONDS.values[()]:.2f}s")
+
+@client.event
+async def on_app_command_completion(interaction: discord.Interaction, command):
+    observe_command(interaction, "ok")
 
 @client.tree.command(name="help", description="Show help for TransmissionBot")
 async def help_cmd(interaction: discord.Interaction):
@@ -263,66 +376,225 @@ async def help_cmd(interaction: discord.Interaction):
         "**TransmissionBot Slash Commands**\n"
         "/help - Show this help message\n"
         "/info - Show bot/system info (admin only)\n"
-        "/add - Add a torrent (magnet or file)\n"
+        "/add - Add torrents (magnet links or up to 3 files)\n"
         "/list - List your torrents\n"
         "/summary - Show a summary of your torrents\n"
+        "/stats - Show bandwidth and ratio trends over the last hour, day, week or month\n"
         "/pause - Pause a torrent by name or hash (with autocomplete)\n"
         "/resume - Resume a torrent by name or hash (with autocomplete)\n"
         "/remove - Remove a torrent by name or hash (autocomplete, optional delete_data to also delete files)\n"
+        "/bulk - Pause, resume or remove many torrents by status, age, ratio or owner\n"
         "/legend - Show the meaning of status/metrics emojis\n"
+        "/namerules - Show, reload or change name cleanup rules (admin only)\n"
+        "/files - Show a torrent's files and choose which to download or prioritize\n"
+        "/claim - Assign a torrent added outside the bot to a user (admin only)\n"
         "\nYou can use torrent names or hashes for /pause, /resume, and /remove. Autocomplete is available for these commands!\n"
         "For /remove, set delete_data=True to also delete downloaded files."
     )
     await interaction.response.send_message(help_text, ephemeral=True)
 
+def session_summary() -> str:
+    # /info lines from the session-stats cache; no RPC is made here
+    totals = SESSION.totals()
+    if totals is None:
+        return "Transmission session stats: not available yet"
+    free = SESSION.max_free_space(DOWNLOAD_DIR)
+    return (
+        f"Transmission: {LEGEND['download_rate']} {fmt_bytes(totals['download_speed'])}/s "
+        f"{LEGEND['upload_rate']} {fmt_bytes(totals['upload_speed'])}/s, "
+        f"{totals['active']} active / {totals['paused']} paused / {totals['torrents']} torrents "
+        f"(as of {totals['age']:.0f}s ago)\n"
+        f"All time: {LEGEND['total_downloaded']} {fmt_bytes(totals['downloaded'])} "
+        f"{LEGEND['total_uploaded']} {fmt_bytes(totals['uploaded'])}\n"
+        f"Free space in {DOWNLOAD_DIR}: {fmt_bytes(free) if free is not None else 'unknown'}"
+    )
+
 @client.tree.command(name="info", description="Show bot/system info (admin only)")
 async def info_cmd(interaction: discord.Interaction):
     if not is_admin(interaction):
         await interaction.response.send_message("You do not have permission to use this command.", ephemeral=True)
         return
-    info_text = f"Bot user: {client.user}\nGuild: {interaction.guild.name if interaction.guild else 'DM'}"
+    info_text = (
+        f"Bot user: {client.user}\nGuild: {interaction.guild.name if interaction.guild else 'DM'}\n"
+        f"Poll interval: {SCHEDULER.interval:.0f}s (last cycle {SCHEDULER.last_cycle_duration:.2f}s, {SCHEDULER.cycles} cycles)\n"
+        f"Transmission backends: {', '.join(TSCLIENT.backends)} (add policy: {TSCLIENT.policy})\n"
+        f"Since start: {TSCLIENT.rpc_count} RPC calls, {DB.commit_count} DB commits\n"
+        f"Coalesced: {TSCLIENT.rpc_deduplicated} RPC calls, {DB.reads.deduplicated}/{DB.reads.calls} DB reads\n"
+        f"Background loops running: {running_background_tasks()}\n"
+        f"Unowned torrents in Transmission: {len(RECONCILER.unowned)} (assign with /claim)\n"
+        f"{session_summary()}"
+    )
     await interaction.response.send_message(info_text, ephemeral=True)
 
-@client.tree.command(name="add", description="Add a torrent (magnet or file)")
-@app_commands.describe(magnet="Magnet link for the torrent", file="Upload a .torrent file")
-async def add_cmd(interaction: discord.Interaction, magnet: str = None, file: discord.Attachment = None):
-    if DEBUG:
-        logger.debug(f"/add called by {interaction.user} (id={interaction.user.id}) with magnet={magnet} file={file}")
-    await interaction.response.defer(ephemeral=True)
-    if not magnet and not file:
-        await interaction.followup.send("Please provide a magnet link or upload a .torrent file.", ephemeral=True)
+@client.tree.command(name="namerules", description="Show, reload or change torrent name cleanup rules (admin only)")
+@app_commands.describe(replace="Replacement pairs, e.g. '+: ,%20: '", remove="Comma-separated strings to remove")
+async def namerules_cmd(interaction: discord.Interaction, replace: str = None, remove: str = None):
+    if not is_admin(interaction):
+        await interaction.response.send_message("You do not have permission to use this command.", ephemeral=True)
         return
-    download_dir = "/data/games"
+    # Without options the rules are re-read from the environment
+    if replace is None and remove is None:
+        NAME_CLEANER.load()
+    else:
+        NAME_CLEANER.load(
+            replace if replace is not None else NAME_CLEANER.replace_rules,
+            remove if remove is not None else NAME_CLEANER.remove_rules,
+        )
+    CACHE.reindex()
+    await interaction.response.send_message(
+        f"Name cleanup rules loaded.\nReplace: `{NAME_CLEANER.replace_rules}`\nRemove: `{NAME_CLEANER.remove_rules}`",
+        ephemeral=True,
+    )
+
+async def start_add(user_id: int, torrent, download_dir: str, size: int = 0):
+    # Hands a magnet or .torrent bytes to Transmission and records the new row
+    backend = await TSCLIENT.pick_backend(download_dir, size)
+    # Checked against the backend that gets the torrent, not the roomiest one
+    free = SESSION.free_space(backend, download_dir)
+    if size and free is not None and size > free:
+        raise ValueError(f"needs {fmt_bytes(size)} but only {fmt_bytes(free)} is free")
+    tor = await TSCLIENT.add_torrent(torrent, backend=backend, download_dir=download_dir)
     if DEBUG:
-        logger.debug(f"Setting download_dir to {download_dir}")
+        logger.debug(f"add_torrent(download_dir={download_dir}) returned: {tor}")
+    await add_torrent(tor.hashString, tor.name, user_id, backend=tor.backend)
+    CACHE.put_row({"hash": tor.hashString, "name": tor.name, "status": "added", "added_at": None, "user_id": user_id, "backend": tor.backend})
+    return tor
+
+async def start_queued_add(entry: dict):
+    # Called by ADMISSION when a queued add gets its turn
+    tor = await start_add(entry["user_id"], entry["magnet"] or entry["data"], entry["download_dir"], entry["total_size"])
+    SCHEDULER.wake()
+    await NOTIFIER.submit(entry["user_id"], f"▶️ <@{entry['user_id']}> Your queued torrent **{clean_torrent_name(tor.name)}** has started.")
+
+async def notify_queued_add_failed(entry: dict, error: Exception):
+    # Called by ADMISSION when a queued add failed for good and was dropped
+    label = entry["name"] or "torrent"
+    await NOTIFIER.submit(entry["user_id"], f"❌ <@{entry['user_id']}> Your queued torrent {label} could not be added: {error}")
+
+ADMISSION = AdmissionController(start_queued_add, notify_queued_add_failed)
+
+# Info-hashes currently being added by any /add, so two concurrent adds of one torrent cannot both start
+ADDS_IN_FLIGHT = set()
+
+async def read_add(magnet: str = None, file: discord.Attachment = None) -> dict:
+    """Read one /add input and work out its info-hash and size.
+
+    Returns a dict with label, torrent (magnet text or .torrent bytes), magnet, hash
+    (None if it cannot be known up front), size and error (a reply line, or None).
+    """
+    label = file.filename if file else magnet[:60]
+    item = {"label": label, "torrent": magnet, "magnet": magnet, "hash": None, "size": 0, "error": None}
     try:
         if file:
-            with tempfile.NamedTemporaryFile(delete=False) as tmp:
-                await file.save(tmp.name)
-                if DEBUG:
-                    logger.debug(f"Saved uploaded file to {tmp.name}")
-                with open(tmp.name, 'rb') as f:
-                    tor = TSCLIENT.add_torrent(torrent=f, download_dir=download_dir)
-                    if DEBUG:
-                        logger.debug(f"add_torrent(torrent=f, download_dir=...) returned: {tor}")
-                os.unlink(tmp.name)
-                if DEBUG:
-                    logger.debug(f"Deleted temp file {tmp.name}")
-        else:
-            if DEBUG:
-                logger.debug(f"Adding magnet: {magnet}")
-            tor = TSCLIENT.add_torrent(magnet, download_dir=download_dir)
+            if file.size > TORRENT_UPLOAD_MAX_BYTES:
+                item["error"] = f"Failed to add {label}: file is larger than {fmt_bytes(TORRENT_UPLOAD_MAX_BYTES)}"
+                return item
+            # Read straight into memory; Transmission gets it as base64 metainfo
+            torrent = await file.read()
             if DEBUG:
-                logger.debug(f"add_torrent(magnet, download_dir=...) returned: {tor}")
-        real_hash = tor.hashString
-        real_name = tor.name
+                logger.debug(f"Read {len(torrent)} bytes from uploaded file {file.filename}")
+            info = parse_torrent(torrent)
+            item.update(torrent=torrent, hash=info["hash"], size=info["total_size"])
+        else:
+            item["hash"] = magnet_info_hash(magnet)
+    except Exception as e:
+        logger.error(f"Error reading torrent {label}: {e}")
+        item["error"] = f"Failed to add {label}: {e}"
+    return item
+
+async def add_one(interaction: discord.Interaction, item: dict, download_dir: str) -> str:
+    # Adds a single magnet or attachment read by read_add and returns the result line for the reply
+    label = item["label"]
+    known_hash = item["hash"]
+    size = item["size"]
+    torrent = item["torrent"]
+    # Reject duplicates locally before any RPC
+    existing = CACHE.rows.get(known_hash) if known_hash else None
+    if existing:
+        if existing.get("user_id") == interaction.user.id or is_admin(interaction):
+            return f"Already added: **{clean_torrent_name(existing['name'])}** (`{known_hash[:6]}`)"
+        return f"Already added: `{known_hash[:6]}` is already being downloaded."
+    if known_hash in ADDS_IN_FLIGHT:
+        return f"Already being added: `{known_hash[:6]}`"
+    if known_hash:
+        ADDS_IN_FLIGHT.add(known_hash)
+    try:
+        if known_hash and await ADMISSION.is_queued(known_hash):
+            return f"Already queued: `{known_hash[:6]}`"
+        # Magnets have no size until their metadata arrives, so only files are checked.
+        # No backend has room: reject before queueing; start_add checks the chosen backend
+        free = SESSION.max_free_space(download_dir)
+        if size and free is not None and size > free:
+            return f"Failed to add {label}: needs {fmt_bytes(size)} but only {fmt_bytes(free)} is free"
+        exempt = is_admin(interaction)
+        reason = await ADMISSION.admit(interaction.user.id, size, exempt)
+        if reason:
+            position = await ADMISSION.enqueue(
+                interaction.user.id, known_hash, label, size, download_dir,
+                magnet=item["magnet"], data=None if item["magnet"] else torrent, exempt=exempt,
+            )
+            return f"Queued {label}: {reason} (#{position} in your queue, you will be notified when it starts)"
+        try:
+            tor = await start_add(interaction.user.id, torrent, download_dir, size)
+        finally:
+            ADMISSION.release(interaction.user.id, size)
         if DEBUG:
-            logger.debug(f"Torrent added: hash={real_hash}, name={real_name}")
-        await add_torrent(real_hash, real_name, interaction.user.id)
-        await interaction.followup.send(f"Added torrent: **{clean_torrent_name(real_name)}** (`{real_hash[:6]}`)", ephemeral=True)
+            logger.debug(f"Torrent added: hash={tor.hashString}, name={tor.name}")
+        return f"Added torrent: **{clean_torrent_name(tor.name)}** (`{tor.hashString[:6]}`)"
     except Exception as e:
-        logger.error(f"Error adding torrent: {e}")
-        await interaction.followup.send(f"Failed to add torrent: {e}", ephemeral=True)
+        logger.error(f"Error adding torrent {label}: {e}")
+        return f"Failed to add {label}: {e}"
+    finally:
+        ADDS_IN_FLIGHT.discard(known_hash)
+
+@client.tree.command(name="add", description="Add torrents (magnet links or files)")
+@app_commands.describe(
+    magnet="Magnet link for the torrent (separate several with spaces)",
+    file="Upload a .torrent file",
+    file2="Another .torrent file",
+    file3="Another .torrent file",
+)
+async def add_cmd(interaction: discord.Interaction, magnet: str = None, file: discord.Attachment = None,
+                  file2: discord.Attachment = None, file3: discord.Attachment = None):
+    files = [f for f in (file, file2, file3) if f]
+    magnets = magnet.split() if magnet else []
+    if DEBUG:
+        logger.debug(f"/add called by {interaction.user} (id={interaction.user.id}) with magnets={magnets} files={files}")
+    await interaction.response.defer(ephemeral=True)
+    if not magnets and not files:
+        await interaction.followup.send("Please provide a magnet link or upload a .torrent file.", ephemeral=True)
+        return
+    download_dir = DOWNLOAD_DIR
+    if DEBUG:
+        logger.debug(f"Setting download_dir to {download_dir}")
+    await CACHE.ensure_loaded()
+    items = await asyncio.gather(*(read_add(magnet=m) for m in magnets), *(read_add(file=f) for f in files))
+    # The same torrent given twice (two uploads, or a magnet and a file) is only added once
+    results = [item["error"] for item in items]
+    todo = []
+    seen = set()
+    for i, item in enumerate(items):
+        if item["error"]:
+            continue
+        key = item["hash"] or item["magnet"]
+        if key in seen:
+            results[i] = f"Skipped {item['label']}: same torrent as another one in this /add"
+            continue
+        seen.add(key)
+        todo.append(i)
+    # Submitted concurrently; the Transmission client bounds how many run at once
+    added = await asyncio.gather(*(add_one(interaction, items[i], download_dir) for i in todo))
+    for i, line in zip(todo, added):
+        results[i] = line
+    SCHEDULER.wake()
+    await interaction.followup.send("\n".join(results)[:2000], ephemeral=True)
+
+def fmt_bytes(num):
+    for unit in ['B','KB','MB','GB','TB']:
+        if abs(num) < 1024.0:
+            return f"{num:3.2f} {unit}"
+        num /= 1024.0
+    return f"{num:.2f} PB"
 
 def progress_bar(pct):
     blocks = 10
@@ -336,131 +608,209 @@ def progress_bar(pct):
         color = ''  # red (use underline)
     return f"{bar} {int(pct*100)}%"
 
+# Torrents per /list page; keeps each embed well under Discord's size limits
+LIST_PAGE_SIZE = 15
+
+def format_torrent_line(t) -> str:
+    try:
+        tor = CACHE.live[t["hash"]]
+        status = tor.status
+        status_emoji = LEGEND.get(str(status).lower(), f"[{status}]")
+        pct = tor.progress / 100.0
+        eta = tor.eta
+        bar = progress_bar(pct)
+    except Exception:
+        status = t["status"]
+        status_emoji = LEGEND.get(str(status).lower(), f"[{status}]")
+        bar = "?"
+        eta = "--"
+    return f"`{t['hash'][:6]}` {clean_torrent_name(t['name'])[:80]} {status_emoji} {bar} ETA: {eta}"
+
+class TorrentListView(discord.ui.View):
+    """Prev/next pages for /list; each page is one keyset DB query plus live data for its rows."""
+
+    def __init__(self, viewer_id: int, user_id: int = None, total: int = 0):
+        super().__init__(timeout=600)
+        self.viewer_id = viewer_id
+        self.user_id = user_id
+        self.total = total
+        # cursors[i] is the (added_at, hash) of the last row before page i
+        self.cursors = [None]
+        self.page = 0
+        self.rows = []
+
+    async def load_page(self):
+        rows = await page_torrents(user_id=self.user_id, after=self.cursors[self.page], limit=LIST_PAGE_SIZE + 1)
+        has_more = len(rows) > LIST_PAGE_SIZE
+        self.rows = rows[:LIST_PAGE_SIZE]
+        if has_more and len(self.cursors) == self.page + 1:
+            last = self.rows[-1]
+            self.cursors.append((last["added_at"], last["hash"]))
+        self.prev_button.disabled = self.page == 0
+        self.next_button.disabled = not has_more
+        # Only go to Transmission for this page's torrents whose cached state is older than the TTL
+        stale = CACHE.stale_hashes(t["hash"] for t in self.rows)
+        if stale:
+            try:
+                await POLLER.fetch(stale)
+            except Exception as e:
+                logger.error(f"Error refreshing torrents for /list: {e}")
+
+    def embed(self) -> discord.Embed:
+        embed = discord.Embed(title="Your Torrents", description="\n".join(format_torrent_line(t) for t in self.rows)[:4096])
+        pages = max(1, math.ceil(self.total / LIST_PAGE_SIZE))
+        embed.set_footer(text=f"Page {self.page + 1} of {pages} · {self.total} torrents")
+        return embed
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        return interaction.user.id == self.viewer_id
+
+    @discord.ui.button(label="◀ Prev", style=discord.ButtonStyle.secondary)
+    async def prev_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        # load_page may wait on Transmission, so acknowledge within Discord's 3s first
+        await interaction.response.defer()
+        self.page = max(0, self.page - 1)
+        await self.load_page()
+        await interaction.edit_original_response(embed=self.embed(), view=self)
+
+    @discord.ui.button(label="Next ▶", style=discord.ButtonStyle.secondary)
+    async def next_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await interaction.response.defer()
+        if self.page + 1 < len(self.cursors):
+            self.page += 1
+        await self.load_page()
+        await interaction.edit_original_response(embed=self.embed(), view=self)
+
 @client.tree.command(name="list", description="List your torrents")
 async def list_cmd(interaction: discord.Interaction):
     # Admins see all torrents, users see only their own
-    if is_admin(interaction):
-        torrents = await list_torrents()
-    else:
-        torrents = await list_torrents(user_id=interaction.user.id)
-    if not torrents:
-        await interaction.response.send_message("You have no torrents.", ephemeral=True)
+    await CACHE.ensure_loaded()
+    user_id = None if is_admin(interaction) else interaction.user.id
+    total = len(CACHE.rows) if user_id is None else len(CACHE.by_user.get(user_id, {}))
+    view = TorrentListView(interaction.user.id, user_id=user_id, total=total)
+    # load_page may wait on a slow Transmission; defer so the interaction does not expire
+    await interaction.response.defer(ephemeral=True)
+    await view.load_page()
+    if not view.rows:
+        await interaction.followup.send("You have no torrents.", ephemeral=True)
         return
-    lines = []
-    for t in torrents:
-        try:
-            tor = TSCLIENT.get_torrent(t["hash"])
-            # Update DB with latest stats
-            stats = {
-                'total_size': getattr(tor, 'total_size', 0),
-                'downloaded_ever': getattr(tor, 'downloaded_ever', 0),
-                'uploaded_ever': getattr(tor, 'uploaded_ever', 0),
-                'rate_download': getattr(tor, 'rate_download', 0),
-                'rate_upload': getattr(tor, 'rate_upload', 0),
-                'upload_ratio': getattr(tor, 'upload_ratio', 0.0),
-            }
-            await update_torrent_stats(t["hash"], stats)
-            await update_torrent_status(t["hash"], tor.status)
-            status = tor.status
-            status_emoji = LEGEND.get(str(status).lower(), f"[{status}]")
-            pct = tor.progress / 100.0
-            eta = tor.eta
-            bar = progress_bar(pct)
-        except Exception as e:
-            status = t["status"]
-            status_emoji = LEGEND.get(str(status).lower(), f"[{status}]")
-            bar = "?"
-            eta = "--"
-        lines.append(f"`{t['hash'][:6]}` {clean_torrent_name(t['name'])} {status_emoji} {bar} ETA: {eta}")
-    msg = "**Your Torrents:**\n" + "\n".join(lines)
-    await interaction.response.send_message(msg, ephemeral=True)
+    await interaction.followup.send(embed=view.embed(), view=view, ephemeral=True)
 
 @client.tree.command(name="summary", description="Show a summary of your torrents")
 async def summary_cmd(interaction: discord.Interaction):
-    # Admins see all torrents, users see only their own
+    # Admins see all torrents, users see only their own. Uses only DB values, does not query Transmission.
     if is_admin(interaction):
-        torrents = await list_torrents()
+        summary = await summarize()
     else:
-        torrents = await list_torrents(user_id=interaction.user.id)
-    if not torrents:
+        summary = await summarize(user_id=interaction.user.id)
+    if not summary['total']:
         await interaction.response.send_message("You have no torrents.", ephemeral=True)
         return
-    total = len(torrents)
-    completed = 0
-    in_progress = 0
-    total_size = 0
-    total_downloaded = 0
-    total_uploaded = 0
-    total_rate_download = 0
-    total_rate_upload = 0
-    total_seed_ratio = 0
-    seed_ratio_count = 0
-    for t in torrents:
-        # Use only DB values, do not query Transmission
-        pct = 1.0 if t.get('status', '').lower() in ('seeding', 'finished', 'stopped') or t.get('downloaded_ever', 0) >= t.get('total_size', 0) > 0 else 0.0
-        if pct >= 1.0:
-            completed += 1
-        else:
-            in_progress += 1
-        total_size += t.get('total_size', 0)
-        total_downloaded += t.get('downloaded_ever', 0)
-        total_uploaded += t.get('uploaded_ever', 0)
-        total_rate_download += t.get('rate_download', 0)
-        total_rate_upload += t.get('rate_upload', 0)
-        if t.get('upload_ratio') is not None:
-            total_seed_ratio += t.get('upload_ratio', 0.0)
-            seed_ratio_count += 1
-    percent = completed / total if total else 0
-    avg_seed_ratio = (total_seed_ratio / seed_ratio_count) if seed_ratio_count else 0
-    def fmt_bytes(num):
-        for unit in ['B','KB','MB','GB','TB']:
-            if abs(num) < 1024.0:
-                return f"{num:3.2f} {unit}"
-            num /= 1024.0
-        return f"{num:.2f} PB"
+    percent = summary['completed'] / summary['total']
+    by_status = ", ".join(
+        f"{LEGEND.get(str(status).lower(), '')}{status}: {count}" for status, count in sorted(summary['by_status'].items())
+    )
     msg = (
         f"**Summary:**\n"
-        f"Total torrents: {total}\n"
-        f"Completed: {completed}\n"
-        f"In progress: {in_progress}\n"
+        f"Total torrents: {summary['total']}\n"
+        f"Completed: {summary['completed']}\n"
+        f"In progress: {summary['in_progress']}\n"
         f"Completion: {int(percent*100)}%\n"
-        f"Total size: {fmt_bytes(total_size)}\n"
-        f"Total downloaded: {fmt_bytes(total_downloaded)}\n"
-        f"Total uploaded: {fmt_bytes(total_uploaded)}\n"
-        f"Current download speed: {fmt_bytes(total_rate_download)}/s\n"
-        f"Current upload speed: {fmt_bytes(total_rate_upload)}/s\n"
-        f"Average seed ratio: {avg_seed_ratio:.2f}"
+        f"By status: {by_status}\n"
+        f"Total size: {fmt_bytes(summary['total_size'])}\n"
+        f"Total downloaded: {fmt_bytes(summary['downloaded_ever'])}\n"
+        f"Total uploaded: {fmt_bytes(summary['uploaded_ever'])}\n"
+        f"Current download speed: {fmt_bytes(summary['rate_download'])}/s\n"
+        f"Current upload speed: {fmt_bytes(summary['rate_upload'])}/s\n"
+        f"Average seed ratio: {summary['avg_ratio']:.2f}"
+    )
+    await interaction.response.send_message(msg, ephemeral=True)
+
+# /stats periods: (length in seconds, rollup bucket size in seconds)
+STATS_PERIODS = {
+    "hour": (3600, 60),
+    "day": (86400, 3600),
+    "week": (7 * 86400, 3600),
+    "month": (30 * 86400, 86400),
+}
+SPARK_BLOCKS = "▁▂▃▄▅▆▇█"
+
+def sparkline(values):
+    peak = max(values, default=0)
+    if not peak:
+        return SPARK_BLOCKS[0] * len(values)
+    return "".join(SPARK_BLOCKS[min(len(SPARK_BLOCKS) - 1, int(v / peak * len(SPARK_BLOCKS)))] for v in values)
+
+@client.tree.command(name="stats", description="Show bandwidth and ratio trends over time")
+@app_commands.describe(
+    period="How far back to look (default: day)",
+    user="Show this user's trends (admin only)",
+    everyone="Show trends for all torrents (admin only)",
+)
+@app_commands.choices(period=[app_commands.Choice(name=p, value=p) for p in STATS_PERIODS])
+async def stats_cmd(interaction: discord.Interaction, period: str = "day", user: discord.User = None, everyone: bool = False):
+    admin = is_admin(interaction)
+    if (everyone or (user and user.id != interaction.user.id)) and not admin:
+        await interaction.response.send_message("You do not have permission to view other users' stats.", ephemeral=True)
+        return
+    # user_id 0 holds the totals over all users
+    user_id = 0 if everyone else (user or interaction.user).id
+    length, resolution = STATS_PERIODS[period]
+    # Reads at most a few hundred rollup rows, however long the history is
+    history = await stats_history(user_id, resolution, int(time.time()) - length)
+    if not history:
+        await interaction.response.send_message("No stats recorded for this period yet.", ephemeral=True)
+        return
+    first, last = history[0], history[-1]
+    downloaded = max(0, last["downloaded_ever"] - first["downloaded_ever"])
+    uploaded = max(0, last["uploaded_ever"] - first["uploaded_ever"])
+    ratio = last["uploaded_ever"] / last["downloaded_ever"] if last["downloaded_ever"] else 0.0
+    # From the byte counters over the elapsed time: buckets are missing while the
+    # scheduler idles, so averaging the buckets' rates would overweight busy periods
+    elapsed = max(resolution, last["bucket"] - first["bucket"])
+    avg_down = downloaded / elapsed
+    avg_up = uploaded / elapsed
+    # Downsample to fit one line of a Discord message
+    step = max(1, math.ceil(len(history) / 48))
+    buckets = [history[i:i + step] for i in range(0, len(history), step)]
+    down_line = sparkline([sum(h["rate_download"] for h in b) / len(b) for b in buckets])
+    up_line = sparkline([sum(h["rate_upload"] for h in b) / len(b) for b in buckets])
+    scope = "all users" if everyone else f"<@{user_id}>"
+    msg = (
+        f"**Stats for {scope}, last {period}:**\n"
+        f"Downloaded: {fmt_bytes(downloaded)}\n"
+        f"Uploaded: {fmt_bytes(uploaded)}\n"
+        f"Average download speed: {fmt_bytes(avg_down)}/s (peak {fmt_bytes(max(h['rate_download_max'] for h in history))}/s)\n"
+        f"Average upload speed: {fmt_bytes(avg_up)}/s (peak {fmt_bytes(max(h['rate_upload_max'] for h in history))}/s)\n"
+        f"Overall ratio: {ratio:.2f}\n"
+        f"🔻 `{down_line}`\n"
+        f"🔺 `{up_line}`"
     )
     await interaction.response.send_message(msg, ephemeral=True)
 
 async def torrent_name_autocomplete(interaction: discord.Interaction, current: str):
     # Admins see all, users see only their own
-    if is_admin(interaction):
-        torrents = await list_torrents()
-    else:
-        torrents = await list_torrents(user_id=interaction.user.id)
-    # Filter by name
-    options = []
-    for t in torrents:
-        name = clean_torrent_name(t['name'])
-        if current.lower() in name.lower():
-            # Discord autocomplete: value (hash), name (display)
-            options.append(app_commands.Choice(name=f"{name} [{t['hash'][:6]}]", value=t['hash']))
-        if len(options) >= 25:
-            break
-    return options
+    await CACHE.ensure_loaded()
+    user_id = None if is_admin(interaction) else interaction.user.id
+    # Discord autocomplete: value (hash), name (display, max 100 chars)
+    return [
+        app_commands.Choice(name=f"{name[:90]} [{hash[:6]}]", value=hash)
+        for hash, name in NAME_INDEX.search(current, user_id=user_id, limit=25)
+    ]
 
 @client.tree.command(name="pause", description="Pause a torrent by name or hash (autocomplete supported)")
 @app_commands.autocomplete(hash=torrent_name_autocomplete)
 async def pause_cmd(interaction: discord.Interaction, hash: str):
     try:
-        tor = TSCLIENT.get_torrent(hash)
+        tor = await TSCLIENT.get_torrent(hash)
         active_statuses = ["downloading", "seeding", "verifying", "queued"]
         if str(tor.status).lower() not in active_statuses:
             await interaction.response.send_message(f"Torrent **{clean_torrent_name(tor.name)}** (`{hash[:6]}`) is not active (status: {tor.status}). Cannot pause.", ephemeral=True)
             return
-        TSCLIENT.stop_torrent(hash)
+        await TSCLIENT.stop_torrent(hash)
         await update_torrent_status(hash, 'paused')
+        CACHE.update_row(hash, status='paused')
+        CACHE.invalidate(hash)
         await interaction.response.send_message(f"Paused torrent: **{clean_torrent_name(tor.name)}** (`{hash[:6]}`)", ephemeral=True)
     except Exception as e:
         await interaction.response.send_message(f"Failed to pause: {e}", ephemeral=True)
@@ -469,13 +819,15 @@ async def pause_cmd(interaction: discord.Interaction, hash: str):
 @app_commands.autocomplete(hash=torrent_name_autocomplete)
 async def resume_cmd(interaction: discord.Interaction, hash: str):
     try:
-        tor = TSCLIENT.get_torrent(hash)
-        inactive_statuses = ["stopped", "paused", "finished"]
-        if str(tor.status).lower() not in inactive_statuses:
+        tor = await TSCLIENT.get_torrent(hash)
+        if str(tor.status).lower() not in INACTIVE_STATUSES:
             await interaction.response.send_message(f"Torrent **{clean_torrent_name(tor.name)}** (`{hash[:6]}`) is already active (status: {tor.status}). Cannot resume.", ephemeral=True)
             return
-        TSCLIENT.start_torrent(hash)
+        await TSCLIENT.start_torrent(hash)
         await update_torrent_status(hash, 'downloading')
+        CACHE.update_row(hash, status='downloading')
+        CACHE.invalidate(hash)
+        SCHEDULER.wake()
         await interaction.response.send_message(f"Resumed torrent: **{clean_torrent_name(tor.name)}** (`{hash[:6]}`)", ephemeral=True)
     except Exception as e:
         await interaction.response.send_message(f"Failed to resume: {e}", ephemeral=True)
@@ -486,9 +838,10 @@ async def resume_cmd(interaction: discord.Interaction, hash: str):
 async def remove_cmd(interaction: discord.Interaction, hash: str, delete_data: bool = False):
     try:
         # Check if torrent exists
-        tor = TSCLIENT.get_torrent(hash)
-        TSCLIENT.remove_torrent(hash, delete_data=delete_data)
+        tor = await TSCLIENT.get_torrent(hash)
+        await TSCLIENT.remove_torrent(hash, delete_data=delete_data)
         await remove_torrent(hash)
+        CACHE.drop(hash)
         name = clean_torrent_name(tor.name)
         msg = f"Removed torrent: **{name}** (`{hash[:6]}`)"
         if delete_data:
@@ -497,6 +850,231 @@ async def remove_cmd(interaction: discord.Interaction, hash: str, delete_data: b
     except Exception as e:
         await interaction.response.send_message(f"Failed to remove: {e}", ephemeral=True)
 
+async def unowned_autocomplete(interaction: discord.Interaction, current: str):
+    current = current.lower()
+    return [
+        app_commands.Choice(name=f"{clean_torrent_name(row['name'] or '')[:90]} [{hash[:6]}]", value=hash)
+        for hash, row in RECONCILER.unowned.items()
+        if current in hash or current in (row["name"] or "").lower()
+    ][:25]
+
+@client.tree.command(name="claim", description="Assign a torrent added outside the bot to a user (admin only)")
+@app_commands.describe(hash="Torrent found in Transmission without an owner", owner="User to assign it to (default: you)")
+@app_commands.autocomplete(hash=unowned_autocomplete)
+async def claim_cmd(interaction: discord.Interaction, hash: str, owner: discord.User = None):
+    if not is_admin(interaction):
+        await interaction.response.send_message("You do not have permission to use this command.", ephemeral=True)
+        return
+    if hash not in RECONCILER.unowned:
+        await interaction.response.send_message(f"`{hash[:6]}` is not an unowned torrent.", ephemeral=True)
+        return
+    owner = owner or interaction.user
+    row = await RECONCILER.claim(hash)
+    await add_torrent(hash, row["name"] or hash, owner.id, backend=row["backend"])
+    CACHE.put_row({"hash": hash, "name": row["name"] or hash, "status": "added", "added_at": None, "user_id": owner.id, "backend": row["backend"]})
+    SCHEDULER.wake()
+    await interaction.response.send_message(
+        f"Assigned **{clean_torrent_name(row['name'] or hash)}** (`{hash[:6]}`) to {owner.mention}", ephemeral=True
+    )
+
+# Files per /files page
+FILES_PAGE_SIZE = 20
+FILE_PRIORITY_MARKS = {-1: "🔽", 0: "", 1: "🔼"}
+
+def format_file_line(f) -> str:
+    pct = f.completed / f.size if f.size else 1.0
+    selected = "✅" if f.selected else "⛔"
+    return f"`{f.id + 1:>4}` {selected}{FILE_PRIORITY_MARKS.get(int(f.priority), '')} {f.name[-70:]} · {fmt_bytes(f.size)} · {int(pct * 100)}%"
+
+class FileListView(discord.ui.View):
+    """Prev/next pages for /files over a file list that was fetched once."""
+
+    def __init__(self, viewer_id: int, name: str, files: list, page: int = 0):
+        super().__init__(timeout=600)
+        self.viewer_id = viewer_id
+        self.name = name
+        self.files = files
+        self.pages = max(1, math.ceil(len(files) / FILES_PAGE_SIZE))
+        self.page = min(max(0, page), self.pages - 1)
+        self.update_buttons()
+
+    def update_buttons(self):
+        self.prev_button.disabled = self.page == 0
+        self.next_button.disabled = self.page + 1 >= self.pages
+
+    def embed(self) -> discord.Embed:
+        rows = self.files[self.page * FILES_PAGE_SIZE:(self.page + 1) * FILES_PAGE_SIZE]
+        embed = discord.Embed(title=self.name[:256], description="\n".join(format_file_line(f) for f in rows)[:4096])
+        wanted = sum(f.size for f in self.files if f.selected)
+        embed.set_footer(text=f"Page {self.page + 1} of {self.pages} · {len(self.files)} files · {fmt_bytes(wanted)} wanted")
+        return embed
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        return interaction.user.id == self.viewer_id
+
+    @discord.ui.button(label="◀ Prev", style=discord.ButtonStyle.secondary)
+    async def prev_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.page = max(0, self.page - 1)
+        self.update_buttons()
+        await interaction.response.edit_message(embed=self.embed(), view=self)
+
+    @discord.ui.button(label="Next ▶", style=discord.ButtonStyle.secondary)
+    async def next_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.page = min(self.pages - 1, self.page + 1)
+        self.update_buttons()
+        await interaction.response.edit_message(embed=self.embed(), view=self)
+
+@client.tree.command(name="files", description="Show the files of a torrent and choose which ones to download")
+@app_commands.describe(
+    hash="Torrent to show (autocomplete supported)",
+    select="File numbers to change, e.g. '1-3,7' or 'all'",
+    download="Download the selected files (True) or skip them (False)",
+    priority="Download priority for the selected files",
+)
+@app_commands.choices(priority=[app_commands.Choice(name=p, value=p) for p in ("high", "normal", "low")])
+@app_commands.autocomplete(hash=torrent_name_autocomplete)
+async def files_cmd(interaction: discord.Interaction, hash: str, select: str = None, download: bool = None, priority: str = None):
+    await CACHE.ensure_loaded()
+    row = CACHE.rows.get(hash)
+    if row is None:
+        await interaction.response.send_message(f"`{hash[:6]}` is not a tracked torrent.", ephemeral=True)
+        return
+    if row.get("user_id") != interaction.user.id and not is_admin(interaction):
+        await interaction.response.send_message("You can only view the files of your own torrents.", ephemeral=True)
+        return
+    if select and download is None and priority is None:
+        await interaction.response.send_message("Set `download` and/or `priority` for the selected files.", ephemeral=True)
+        return
+    # Large packs can take a while to fetch
+    await interaction.response.defer(ephemeral=True)
+    try:
+        files = await FILES.get(hash)
+        note = ""
+        page = 0
+        if select:
+            ids = parse_file_selection(select, len(files))
+            await FILES.set_files(hash, ids, wanted=download, priority=priority)
+            if download:
+                SCHEDULER.wake()
+            files = await FILES.get(hash)
+            page = ids[0] // FILES_PAGE_SIZE
+            note = f"Updated {len(ids)} files."
+    except ValueError as e:
+        await interaction.followup.send(f"Invalid selection: {e}", ephemeral=True)
+        return
+    except Exception as e:
+        logger.error(f"Error loading files of {hash}: {e}")
+        await interaction.followup.send(f"Failed to load files: {e}", ephemeral=True)
+        return
+    if not files:
+        await interaction.followup.send("No file list yet; the torrent's metadata has not been downloaded.", ephemeral=True)
+        return
+    view = FileListView(interaction.user.id, clean_torrent_name(row["name"]), files, page=page)
+    await interaction.followup.send(note or None, embed=view.embed(), view=view, ephemeral=True)
+
+# DB statuses counted as not running, for /pause, /resume and /bulk
+INACTIVE_STATUSES = ["stopped", "paused", "finished"]
+# /bulk status filter choices mapped to the DB statuses they cover
+BULK_STATUS_FILTERS = {
+    "downloading": ["downloading", "download pending"],
+    "seeding": ["seeding", "seed pending"],
+    "stopped": INACTIVE_STATUSES,
+    "checking": ["checking", "check pending", "verifying"],
+}
+# Hashes per torrent-start/stop/remove call in /bulk
+BULK_CHUNK_SIZE = 200
+
+@client.tree.command(name="bulk", description="Pause, resume or remove many torrents at once by filter")
+@app_commands.describe(
+    action="What to do with the matching torrents",
+    status="Only torrents with this status",
+    older_than_days="Only torrents added more than this many days ago",
+    min_ratio="Only torrents with at least this seed ratio",
+    owner="Only torrents of this user (admin only)",
+    all_mine="Confirm acting on all of your torrents when no other filter is set",
+    delete_data="For remove: also delete downloaded files (default: False)",
+)
+@app_commands.choices(
+    action=[app_commands.Choice(name=a, value=a) for a in ("pause", "resume", "remove")],
+    status=[app_commands.Choice(name=s, value=s) for s in BULK_STATUS_FILTERS],
+)
+async def bulk_cmd(interaction: discord.Interaction, action: str, status: str = None, older_than_days: int = None,
+                   min_ratio: float = None, owner: discord.User = None, all_mine: bool = False, delete_data: bool = False):
+    admin = is_admin(interaction)
+    if owner and not admin and owner.id != interaction.user.id:
+        await interaction.response.send_message("You do not have permission to act on other users' torrents.", ephemeral=True)
+        return
+    if not (status or older_than_days is not None or min_ratio is not None or owner or all_mine):
+        await interaction.response.send_message("Set at least one filter, or all_mine=True to act on all of your torrents.", ephemeral=True)
+        return
+    await interaction.response.defer(ephemeral=True)
+    # Users only ever match their own torrents; admins match everyone's unless owner is set
+    if owner:
+        user_id = owner.id
+    elif admin and not all_mine:
+        user_id = None
+    else:
+        user_id = interaction.user.id
+    statuses = list(BULK_STATUS_FILTERS[status]) if status else None
+    if action == "pause":
+        statuses = [s for s in statuses if s not in INACTIVE_STATUSES] if statuses else None
+    elif action == "resume":
+        statuses = [s for s in statuses if s in INACTIVE_STATUSES] if statuses else INACTIVE_STATUSES
+    added_before = None
+    if older_than_days is not None:
+        added_before = (datetime.datetime.utcnow() - datetime.timedelta(days=older_than_days)).isoformat()
+    if statuses == []:
+        matches = []
+    else:
+        matches = await select_torrents(user_id=user_id, statuses=statuses, added_before=added_before, min_ratio=min_ratio)
+    if action == "pause":
+        matches = [t for t in matches if t["status"] not in INACTIVE_STATUSES]
+    if not matches:
+        await interaction.followup.send("No torrents matched.", ephemeral=True)
+        return
+
+    hashes = [t["hash"] for t in matches]
+    done = []
+    try:
+        for i in range(0, len(hashes), BULK_CHUNK_SIZE):
+            chunk = hashes[i:i + BULK_CHUNK_SIZE]
+            if action == "pause":
+                await TSCLIENT.stop_torrent(chunk)
+            elif action == "resume":
+                await TSCLIENT.start_torrent(chunk)
+            else:
+                await TSCLIENT.remove_torrent(chunk, delete_data=delete_data)
+            done.extend(chunk)
+            if len(hashes) > BULK_CHUNK_SIZE:
+                await interaction.edit_original_response(content=f"Working: {action} {len(done)}/{len(hashes)}...")
+    except Exception as e:
+        logger.error(f"Error in bulk {action}: {e}")
+        error = e
+    else:
+        error = None
+
+    # One DB transaction for everything Transmission accepted
+    if action == "remove":
+        await remove_torrents(done)
+        for hash in done:
+            CACHE.drop(hash)
+    else:
+        new_status = "paused" if action == "pause" else "downloading"
+        await set_torrents_status(done, new_status)
+        for hash in done:
+            CACHE.update_row(hash, status=new_status)
+            CACHE.invalidate(hash)
+        if action == "resume":
+            SCHEDULER.wake()
+
+    verb = {"pause": "Paused", "resume": "Resumed", "remove": "Removed"}[action]
+    msg = f"{verb} {len(done)} of {len(hashes)} matching torrents."
+    if action == "remove" and delete_data:
+        msg += " Downloaded files were deleted."
+    if error:
+        msg += f"\nStopped early: {error}"
+    await interaction.followup.send(msg, ephemeral=True)
+
 @client.tree.command(name="legend", description="Show the meaning of status/metrics emojis")
 async def legend_cmd(interaction: discord.Interaction):
     legend_text = (
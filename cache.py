@@ -0,0 +1,107 @@
+import logging
+import os
+import time
+from typing import Dict, Iterable, List, Optional
+
+from db import list_torrents
+
+logger = logging.getLogger("transmissionbot")
+
+# Live Transmission data older than this (seconds) is refreshed before it is shown
+TORRENT_CACHE_TTL = float(os.environ.get("TORRENT_CACHE_TTL", "30"))
+
+class TorrentCache:
+    """Process-wide view of tracked torrents, keyed by hash.
+
+    Holds the DB row of every tracked torrent (owner, name, status) with a per-user
+    index, plus the latest Transmission object for each hash as delivered by the
+    poller. Commands read from here instead of hitting the DB or Transmission.
+    """
+
+    def __init__(self, ttl: float = TORRENT_CACHE_TTL, index=None):
+        self.ttl = ttl
+        # Optional search.NameIndex kept in step with the cached rows
+        self.index = index
+        self.rows: Dict[str, dict] = {}
+        # user_id -> hashes in insertion order (a dict used as an ordered set)
+        self.by_user: Dict[int, Dict[str, None]] = {}
+        self.live: Dict[str, object] = {}
+        self.live_at: Dict[str, float] = {}
+        self.loaded = False
+        self.hits = 0
+        self.misses = 0
+
+    async def load(self):
+        rows = await list_torrents()
+        self.rows.clear()
+        self.by_user.clear()
+        if self.index is not None:
+            self.index.clear()
+        for row in rows:
+            self.put_row(row)
+        self.loaded = True
+        logger.info(f"Torrent cache loaded {len(self.rows)} torrents.")
+
+    async def ensure_loaded(self):
+        if not self.loaded:
+            await self.load()
+
+    def reindex(self):
+        # Rebuild the search index, e.g. after the name cleanup rules changed
+        if self.index is None:
+            return
+        self.index.clear()
+        for row in self.rows.values():
+            self.index.add(row["hash"], row["name"], row.get("user_id"))
+
+    def put_row(self, row: dict):
+        old = self.rows.get(row["hash"])
+        if old and old.get("user_id") != row.get("user_id"):
+            self.by_user.get(old.get("user_id"), {}).pop(row["hash"], None)
+        self.rows[row["hash"]] = row
+        self.by_user.setdefault(row.get("user_id"), {})[row["hash"]] = None
+        if self.index is not None:
+            self.index.add(row["hash"], row["name"], row.get("user_id"))
+
+    def update_row(self, hash: str, **fields):
+        row = self.rows.get(hash)
+        if row is None:
+            return
+        renamed = "name" in fields and fields["name"] != row.get("name")
+        row.update(fields)
+        if renamed and self.index is not None:
+            self.index.add(hash, row["name"], row.get("user_id"))
+
+    def drop(self, hash: str):
+        row = self.rows.pop(hash, None)
+        if row:
+            self.by_user.get(row.get("user_id"), {}).pop(hash, None)
+        if self.index is not None:
+            self.index.remove(hash)
+        self.live.pop(hash, None)
+        self.live_at.pop(hash, None)
+
+    def invalidate(self, hash: str):
+        # Forces the next reader to fetch fresh Transmission data for this hash
+        self.live_at.pop(hash, None)
+
+    def update_live(self, snapshot: Dict[str, object]):
+        now = time.monotonic()
+        for hash, tor in snapshot.items():
+            if hash in self.rows:
+                self.live[hash] = tor
+                self.live_at[hash] = now
+
+    def list(self, user_id: Optional[int] = None) -> List[dict]:
+        if user_id is None:
+            return list(self.rows.values())
+        return [self.rows[h] for h in self.by_user.get(user_id, ()) if h in self.rows]
+
+    def stale_hashes(self, hashes: Iterable[str]) -> List[str]:
+        now = time.monotonic()
+        stale = [h for h in hashes if now - self.live_at.get(h, float("-inf")) > self.ttl]
+        if stale:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return stale
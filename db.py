@@ -1,10 +1,21 @@
 import aiosqlite
 import asyncio
-from typing import List, Optional
+from typing import Dict, List, Optional
 import datetime
+import logging
+import os
+import time
+from urllib.parse import quote
 
-# Use the same DB path as in bot.py, now as a file mount with new name
+from metrics import DB_QUERY_SECONDS, DB_COMMIT_SECONDS, DB_BATCH_SIZE, DB_ROWS_WRITTEN
+from singleflight import SingleFlight, freeze
+
+# Mounted into the container as a file
 DB_PATH = "/app/transbotdata.db"
+# Databases from earlier versions that are deleted at startup
+LEGACY_DBS = ["torrents.db"]
+
+logger = logging.getLogger("transmissionbot")
 
 CREATE_TORRENTS_TABLE = """
 CREATE TABLE IF NOT EXISTS torrents (
@@ -22,90 +33,761 @@ CREATE TABLE IF NOT EXISTS torrents (
 );
 """
 
-# Health check to ensure DB and schema are correct
-async def health_check_db():
-    try:
-        async with aiosqlite.connect(DB_PATH) as db:
-            await db.execute(CREATE_TORRENTS_TABLE)
-            await db.commit()
-            cursor = await db.execute("PRAGMA table_info(torrents);")
-            cols = await cursor.fetchall()
-            if len(cols) < 5:
-                raise RuntimeError("torrents table schema is invalid or missing columns!")
-    except Exception as e:
-        raise RuntimeError(f"Failed to initialize/check DB: {e}")
-
-# Run health check at import time
-asyncio.get_event_loop().run_until_complete(health_check_db())
-
-async def init_db():
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(CREATE_TORRENTS_TABLE)
-        await db.commit()
-
-async def add_torrent(hash: str, name: str, user_id: int, status: str = "added", stats: dict = None):
+# user_id + status serves both per-user lookups and per-user status filters
+CREATE_TORRENTS_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_torrents_user_status ON torrents (user_id, status);",
+    "CREATE INDEX IF NOT EXISTS idx_torrents_status ON torrents (status);",
+    # Keyset pagination order for /list, per user and across everyone
+    "CREATE INDEX IF NOT EXISTS idx_torrents_user_added ON torrents (user_id, added_at, hash);",
+    "CREATE INDEX IF NOT EXISTS idx_torrents_added ON torrents (added_at, hash);",
+]
+
+# Last Transmission state seen per torrent, so transitions survive restarts
+CREATE_TORRENT_STATE_TABLE = """
+CREATE TABLE IF NOT EXISTS torrent_state (
+    hash TEXT PRIMARY KEY,
+    status TEXT,
+    error INTEGER DEFAULT 0,
+    done INTEGER DEFAULT 0,
+    updated_at INTEGER
+) WITHOUT ROWID;
+"""
+
+# Outbox for user notifications. Finished rows (sent or given up) keep their id with
+# sent_at set for NOTIFY_SENT_RETENTION, so a replayed event cannot queue them again.
+CREATE_NOTIFICATION_QUEUE_TABLE = """
+CREATE TABLE IF NOT EXISTS notification_queue (
+    id TEXT PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    message TEXT NOT NULL,
+    attempts INTEGER DEFAULT 0,
+    next_attempt INTEGER DEFAULT 0,
+    created_at INTEGER
+);
+"""
+
+# Raw bandwidth samples, one row per user per sample plus user_id 0 for all users.
+# Keyed by time first so pruning old samples is a range delete.
+CREATE_STATS_SAMPLES_TABLE = """
+CREATE TABLE IF NOT EXISTS stats_samples (
+    ts INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    rate_download INTEGER,
+    rate_upload INTEGER,
+    downloaded_ever INTEGER,
+    uploaded_ever INTEGER,
+    PRIMARY KEY (ts, user_id)
+) WITHOUT ROWID;
+"""
+
+# Samples rolled up into fixed buckets: rate sums (divide by samples for the mean),
+# rate peaks, and the byte counters as of the last sample in the bucket
+CREATE_STATS_ROLLUPS_TABLE = """
+CREATE TABLE IF NOT EXISTS stats_rollups (
+    resolution INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    samples INTEGER,
+    rate_download_sum INTEGER,
+    rate_upload_sum INTEGER,
+    rate_download_max INTEGER,
+    rate_upload_max INTEGER,
+    downloaded_ever INTEGER,
+    uploaded_ever INTEGER,
+    PRIMARY KEY (resolution, user_id, bucket)
+) WITHOUT ROWID;
+"""
+
+# Seconds raw samples are kept, and (bucket size, retention) of each rollup
+STATS_RAW_RETENTION = 86400
+STATS_ROLLUPS = ((60, 2 * 86400), (3600, 90 * 86400), (86400, 5 * 365 * 86400))
+
+# /add requests held back by admission control until the owner is under their limits
+CREATE_ADD_QUEUE_TABLE = """
+CREATE TABLE IF NOT EXISTS add_queue (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    hash TEXT,
+    name TEXT,
+    total_size INTEGER DEFAULT 0,
+    download_dir TEXT,
+    magnet TEXT,
+    data BLOB,
+    exempt INTEGER DEFAULT 0,
+    queued_at INTEGER
+);
+"""
+
+CREATE_ADD_QUEUE_INDEXES = [
+    # Oldest entry per user, and duplicate checks by info-hash
+    "CREATE INDEX IF NOT EXISTS idx_add_queue_user ON add_queue (user_id, id);",
+    "CREATE INDEX IF NOT EXISTS idx_add_queue_hash ON add_queue (hash);",
+    # Covers the per-user quota query so it never reads the table itself
+    "CREATE INDEX IF NOT EXISTS idx_torrents_user_quota ON torrents (user_id, status, total_size);",
+]
+
+# Small key/value store for bot state, e.g. the fingerprint of the last synced command tree
+CREATE_BOT_META_TABLE = """
+CREATE TABLE IF NOT EXISTS bot_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+) WITHOUT ROWID;
+"""
+
+# Torrents found in Transmission that no user added through the bot, waiting for /claim
+CREATE_UNOWNED_TORRENTS_TABLE = """
+CREATE TABLE IF NOT EXISTS unowned_torrents (
+    hash TEXT PRIMARY KEY,
+    name TEXT,
+    backend TEXT,
+    first_seen INTEGER
+) WITHOUT ROWID;
+"""
+
+# Statuses that hold a download slot, and statuses that do not count as active
+DOWNLOADING_STATUSES = ('added', 'downloading', 'download pending')
+INACTIVE_STATUSES = ('stopped', 'paused', 'finished')
+
+# Statuses counted as complete by summarize(), besides rows with all bytes downloaded
+COMPLETED_STATUSES = ('seeding', 'finished', 'stopped')
+
+# Columns added to torrents after the first release; older databases lack them
+TORRENT_STAT_COLUMNS = [
+    ("total_size", "INTEGER DEFAULT 0"),
+    ("downloaded_ever", "INTEGER DEFAULT 0"),
+    ("uploaded_ever", "INTEGER DEFAULT 0"),
+    ("rate_download", "INTEGER DEFAULT 0"),
+    ("rate_upload", "INTEGER DEFAULT 0"),
+    ("upload_ratio", "REAL DEFAULT 0.0"),
+]
+
+def _add_columns(table, columns):
+    # Migration step adding any of the (name, definition) columns the table does not have yet
+    async def step(conn: aiosqlite.Connection):
+        async with conn.execute(f"PRAGMA table_info({table})") as cursor:
+            existing = {row[1] for row in await cursor.fetchall()}
+        for column, definition in columns:
+            if column not in existing:
+                await conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    return step
+
+# Schema history. Entry N brings the database to user_version N; steps are SQL
+# strings or async callables taking the connection, and are safe to re-run.
+# Append new migrations at the end, never edit or reorder applied ones.
+MIGRATIONS = [
+    ("torrents table", [CREATE_TORRENTS_TABLE]),
+    ("torrent stats columns", [_add_columns("torrents", TORRENT_STAT_COLUMNS)]),
+    ("torrents indexes", CREATE_TORRENTS_INDEXES),
+    ("torrent state table", [CREATE_TORRENT_STATE_TABLE]),
+    ("notification queue", [CREATE_NOTIFICATION_QUEUE_TABLE]),
+    ("stats history tables", [CREATE_STATS_SAMPLES_TABLE, CREATE_STATS_ROLLUPS_TABLE]),
+    # Name of the Transmission backend holding the torrent; NULL until first seen
+    ("torrent backend column", [_add_columns("torrents", [("backend", "TEXT")])]),
+    ("add queue", [CREATE_ADD_QUEUE_TABLE] + CREATE_ADD_QUEUE_INDEXES),
+    ("bot meta table", [CREATE_BOT_META_TABLE]),
+    ("unowned torrents table", [CREATE_UNOWNED_TORRENTS_TABLE]),
+    ("notification sent column", [_add_columns("notification_queue", [("sent_at", "INTEGER")])]),
+    # Retry state of queued adds that failed because Transmission was unreachable
+    ("add queue retry columns", [
+        _add_columns("add_queue", [("attempts", "INTEGER DEFAULT 0"), ("next_attempt", "INTEGER DEFAULT 0")]),
+    ]),
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+async def migrate(conn: aiosqlite.Connection) -> int:
+    """Apply every migration newer than the database's user_version, each in its own transaction.
+
+    Returns the number of migrations applied. Raises RuntimeError if the database was
+    written by a newer version of the bot.
+    """
+    async with conn.execute("PRAGMA user_version") as cursor:
+        version = (await cursor.fetchone())[0]
+    if version > SCHEMA_VERSION:
+        raise RuntimeError(f"Database schema v{version} is newer than this bot supports (v{SCHEMA_VERSION})")
+    for number, (description, steps) in enumerate(MIGRATIONS[version:], start=version + 1):
+        await conn.execute("BEGIN")
+        try:
+            for step in steps:
+                if callable(step):
+                    await step(conn)
+                else:
+                    await conn.execute(step)
+            # PRAGMA does not take parameters; number is always an int
+            await conn.execute(f"PRAGMA user_version = {number}")
+            await conn.execute("COMMIT")
+        except Exception:
+            await conn.execute("ROLLBACK")
+            raise
+        logger.info(f"Applied database migration {number}: {description}")
+    return SCHEMA_VERSION - version
+
+# Tuned for the long-lived writer connection: WAL lets the separate read connection
+# query while a batch is being committed, and synchronous=NORMAL only fsyncs at
+# checkpoints, which is still crash-safe under WAL.
+PRAGMAS = [
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+]
+# The read-only connection inherits WAL from the file and only needs its own caches
+READ_PRAGMAS = [
+    "PRAGMA cache_size=-16000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+]
+
+# Upper bound on queued writes merged into a single transaction
+WRITE_BATCH_SIZE = 1000
+
+class Database:
+    """One shared writer connection with a write queue, plus one read-only connection.
+
+    Writes from any coroutine are queued and a writer task commits everything that
+    has piled up in one transaction, merging consecutive runs of the same statement
+    into one executemany call. Callers still wait until their write is committed.
+    Reads go through the read-only connection, so they only ever see committed data,
+    never a batch the writer has open. Identical concurrent reads share one query;
+    every commit drops shared results.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.conn: Optional[aiosqlite.Connection] = None
+        self.reader: Optional[aiosqlite.Connection] = None
+        self.commit_count = 0
+        self._connect_lock = asyncio.Lock()
+        self._queue: Optional[asyncio.Queue] = None
+        self._writer: Optional[asyncio.Task] = None
+        self.reads = SingleFlight("db")
+
+    async def connect(self) -> aiosqlite.Connection:
+        async with self._connect_lock:
+            if self.conn is None:
+                # isolation_level=None: transactions are opened explicitly by the writer
+                conn = await aiosqlite.connect(self.path, isolation_level=None)
+                for pragma in PRAGMAS:
+                    await conn.execute(pragma)
+                # Opened after the writer, which creates the file and switches it to WAL
+                reader = await aiosqlite.connect(f"file:{quote(os.path.abspath(self.path))}?mode=ro", uri=True, isolation_level=None)
+                for pragma in READ_PRAGMAS:
+                    await reader.execute(pragma)
+                self.conn = conn
+                self.reader = reader
+                self._queue = asyncio.Queue()
+                self._writer = asyncio.create_task(self._write_loop())
+        return self.conn
+
+    async def close(self):
+        if self.conn is None:
+            return
+        # The sentinel lets the writer commit everything queued before it
+        self._queue.put_nowait(None)
+        await self._writer
+        await self.reader.close()
+        await self.conn.close()
+        self.conn = None
+        self.reader = None
+
+    async def fetchall(self, sql: str, params=()) -> List[tuple]:
+        return await self.reads.do(("all", sql, freeze(params)), lambda: self._fetch(sql, params, True))
+
+    async def fetchone(self, sql: str, params=()) -> Optional[tuple]:
+        return await self.reads.do(("one", sql, freeze(params)), lambda: self._fetch(sql, params, False))
+
+    async def _fetch(self, sql: str, params, all: bool):
+        await self.connect()
+        with DB_QUERY_SECONDS.time():
+            async with self.reader.execute(sql, params) as cursor:
+                return await cursor.fetchall() if all else await cursor.fetchone()
+
+    async def execute(self, sql: str, params=(), rowcount: bool = False) -> Optional[int]:
+        """Queue one statement and wait until it is committed.
+
+        With ``rowcount=True`` the statement is not merged with others and the number
+        of rows it changed is returned.
+        """
+        return await self.executemany(sql, [params], rowcount)
+
+    async def executemany(self, sql: str, rows, rowcount: bool = False) -> Optional[int]:
+        await self.connect()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((sql, list(rows), future, rowcount))
+        return await future
+
+    async def _write_loop(self):
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            stop = False
+            while not self._queue.empty() and len(batch) < WRITE_BATCH_SIZE:
+                item = self._queue.get_nowait()
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            try:
+                results = await self._commit(batch)
+                for (_, _, future, _), result in zip(batch, results):
+                    if not future.done():
+                        future.set_result(result)
+            except Exception:
+                # One bad statement must not fail everyone else's write, so retry one by one
+                for entry in batch:
+                    future = entry[2]
+                    try:
+                        result, = await self._commit([entry])
+                        if not future.done():
+                            future.set_result(result)
+                    except Exception as e:
+                        if not future.done():
+                            future.set_exception(e)
+            if stop:
+                return
+
+    async def _commit(self, batch) -> List[Optional[int]]:
+        # Returns one result per batch entry: the changed row count if it asked for it
+        groups = []
+        for i, (sql, rows, _, rowcount) in enumerate(batch):
+            if groups and groups[-1][0] == sql and not rowcount and groups[-1][2] is None:
+                groups[-1][1].extend(rows)
+            else:
+                groups.append((sql, list(rows), i if rowcount else None))
+        results: List[Optional[int]] = [None] * len(batch)
+        DB_BATCH_SIZE.observe(len(batch))
+        with DB_COMMIT_SECONDS.time():
+            await self.conn.execute("BEGIN")
+            try:
+                for sql, rows, index in groups:
+                    cursor = await self.conn.executemany(sql, rows)
+                    if index is not None:
+                        results[index] = cursor.rowcount
+                await self.conn.execute("COMMIT")
+            except Exception:
+                await self.conn.execute("ROLLBACK")
+                raise
+        self.reads.forget()
+        self.commit_count += 1
+        DB_ROWS_WRITTEN.inc(amount=sum(len(rows) for _, rows, _ in groups))
+        return results
+
+DB = Database(DB_PATH)
+
+# Columns written by bulk_update_torrents, in statement order
+BULK_UPDATE_COLUMNS = ('name', 'status', 'backend', 'total_size', 'downloaded_ever', 'uploaded_ever', 'rate_download', 'rate_upload', 'upload_ratio')
+BULK_UPDATE_DEFAULTS = {'total_size': 0, 'downloaded_ever': 0, 'uploaded_ever': 0, 'rate_download': 0, 'rate_upload': 0, 'upload_ratio': 0.0}
+
+# Values last written per hash by bulk_update_torrents, so unchanged rows can be skipped.
+# Any other write to a row drops its entry.
+_last_written: Dict[str, tuple] = {}
+
+async def init_db() -> int:
+    """Open the shared connection and bring the schema up to date.
+
+    Must run before anything else uses the database: migrations go straight to the
+    connection, outside the write queue. Returns the number of migrations applied.
+    """
+    for path in LEGACY_DBS:
+        if os.path.exists(path):
+            try:
+                os.remove(path)
+                logger.info(f"Removed legacy DB: {path}")
+            except OSError as e:
+                logger.error(f"Failed to remove legacy DB {path}: {e}")
+    conn = await DB.connect()
+    return await migrate(conn)
+
+async def add_torrent(hash: str, name: str, user_id: int, status: str = "added", stats: dict = None, backend: str = None):
     stats = stats or {}
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(
-            "INSERT OR REPLACE INTO torrents (hash, name, user_id, status, added_at, total_size, downloaded_ever, uploaded_ever, rate_download, rate_upload, upload_ratio) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
-            (
-                hash, name, user_id, status, datetime.datetime.utcnow().isoformat(),
-                stats.get('total_size', 0),
-                stats.get('downloaded_ever', 0),
-                stats.get('uploaded_ever', 0),
-                stats.get('rate_download', 0),
-                stats.get('rate_upload', 0),
-                stats.get('upload_ratio', 0.0)
-            )
+    _last_written.pop(hash, None)
+    await DB.execute(
+        "INSERT OR REPLACE INTO torrents (hash, name, user_id, status, added_at, backend, total_size, downloaded_ever, uploaded_ever, rate_download, rate_upload, upload_ratio) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (
+            hash, name, user_id, status, datetime.datetime.utcnow().isoformat(), backend,
+            stats.get('total_size', 0),
+            stats.get('downloaded_ever', 0),
+            stats.get('uploaded_ever', 0),
+            stats.get('rate_download', 0),
+            stats.get('rate_upload', 0),
+            stats.get('upload_ratio', 0.0)
         )
-        await db.commit()
+    )
 
 async def list_torrents(user_id: Optional[int] = None) -> List[dict]:
-    async with aiosqlite.connect(DB_PATH) as db:
-        if user_id:
-            cursor = await db.execute("SELECT hash, name, status, added_at FROM torrents WHERE user_id = ?", (user_id,))
-        else:
-            cursor = await db.execute("SELECT hash, name, status, added_at FROM torrents", ())
-        rows = await cursor.fetchall()
-        return [
-            {"hash": row[0], "name": row[1], "status": row[2], "added_at": row[3]} for row in rows
-        ]
+    if user_id:
+        rows = await DB.fetchall("SELECT hash, name, status, added_at, user_id, backend FROM torrents WHERE user_id = ?", (user_id,))
+    else:
+        rows = await DB.fetchall("SELECT hash, name, status, added_at, user_id, backend FROM torrents", ())
+    return [
+        {"hash": row[0], "name": row[1], "status": row[2], "added_at": row[3], "user_id": row[4], "backend": row[5]} for row in rows
+    ]
 
 async def get_torrent(hash: str) -> Optional[dict]:
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute("SELECT hash, name, user_id, status, added_at FROM torrents WHERE hash = ?", (hash,))
-        row = await cursor.fetchone()
-        if row:
-            return {"hash": row[0], "name": row[1], "user_id": row[2], "status": row[3], "added_at": row[4]}
-        return None
+    row = await DB.fetchone("SELECT hash, name, user_id, status, added_at, backend FROM torrents WHERE hash = ?", (hash,))
+    if row:
+        return {"hash": row[0], "name": row[1], "user_id": row[2], "status": row[3], "added_at": row[4], "backend": row[5]}
+    return None
 
 async def update_torrent_status(hash: str, status: str):
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute("UPDATE torrents SET status = ? WHERE hash = ?", (status, hash))
-        await db.commit()
+    _last_written.pop(hash, None)
+    await DB.execute("UPDATE torrents SET status = ? WHERE hash = ?", (status, hash))
 
 async def remove_torrent(hash: str):
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute("DELETE FROM torrents WHERE hash = ?", (hash,))
-        await db.commit()
+    _last_written.pop(hash, None)
+    await DB.execute("DELETE FROM torrents WHERE hash = ?", (hash,))
+    await DB.execute("DELETE FROM torrent_state WHERE hash = ?", (hash,))
 
 async def update_torrent_name(hash: str, name: str):
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute("UPDATE torrents SET name = ? WHERE hash = ?", (name, hash))
-        await db.commit()
+    _last_written.pop(hash, None)
+    await DB.execute("UPDATE torrents SET name = ? WHERE hash = ?", (name, hash))
+
+async def update_torrent_names(names: Dict[str, str]):
+    # hash -> new name, written as one executemany in a single write batch
+    for hash in names:
+        _last_written.pop(hash, None)
+    await DB.executemany("UPDATE torrents SET name = ? WHERE hash = ?", [(name, hash) for hash, name in names.items()])
 
 async def update_torrent_stats(hash: str, stats: dict):
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(
-            "UPDATE torrents SET total_size=?, downloaded_ever=?, uploaded_ever=?, rate_download=?, rate_upload=?, upload_ratio=? WHERE hash=?",
-            (
-                stats.get('total_size', 0),
-                stats.get('downloaded_ever', 0),
-                stats.get('uploaded_ever', 0),
-                stats.get('rate_download', 0),
-                stats.get('rate_upload', 0),
-                stats.get('upload_ratio', 0.0),
-                hash
-            )
+    _last_written.pop(hash, None)
+    await DB.execute(
+        "UPDATE torrents SET total_size=?, downloaded_ever=?, uploaded_ever=?, rate_download=?, rate_upload=?, upload_ratio=? WHERE hash=?",
+        (
+            stats.get('total_size', 0),
+            stats.get('downloaded_ever', 0),
+            stats.get('uploaded_ever', 0),
+            stats.get('rate_download', 0),
+            stats.get('rate_upload', 0),
+            stats.get('upload_ratio', 0.0),
+            hash
+        )
+    )
+
+async def bulk_update_torrents(rows: List[dict]) -> int:
+    """Write name, status and stats for many torrents in a single transaction.
+
+    Each row is a dict with ``hash`` plus any of BULK_UPDATE_COLUMNS; a missing or
+    empty name, status or backend keeps the stored one. Rows identical to what this function last
+    wrote for that hash are skipped. Returns the number of rows written.
+    """
+    params = []
+    written = {}
+    for row in rows:
+        values = (row.get('name') or None, row.get('status'), row.get('backend')) + tuple(
+            row.get(col, BULK_UPDATE_DEFAULTS[col]) for col in BULK_UPDATE_COLUMNS[3:]
+        )
+        if _last_written.get(row['hash']) == values:
+            continue
+        params.append(values + (row['hash'],))
+        written[row['hash']] = values
+    if not params:
+        return 0
+    await DB.executemany(
+        "UPDATE torrents SET name=COALESCE(?, name), status=COALESCE(?, status), backend=COALESCE(?, backend), total_size=?, downloaded_ever=?, uploaded_ever=?, rate_download=?, rate_upload=?, upload_ratio=? WHERE hash=?",
+        params
+    )
+    _last_written.update(written)
+    return len(params)
+
+async def summarize(user_id: Optional[int] = None) -> dict:
+    """Aggregate counts, byte totals, rates and average ratio in one indexed query.
+
+    Returns totals plus ``by_status``, a {status: count} dict.
+    """
+    placeholders = ", ".join("?" for _ in COMPLETED_STATUSES)
+    sql = (
+        "SELECT status, COUNT(*), "
+        f"SUM(CASE WHEN LOWER(status) IN ({placeholders}) OR (total_size > 0 AND downloaded_ever >= total_size) THEN 1 ELSE 0 END), "
+        "SUM(total_size), SUM(downloaded_ever), SUM(uploaded_ever), SUM(rate_download), SUM(rate_upload), "
+        "SUM(CASE WHEN upload_ratio >= 0 THEN upload_ratio ELSE 0 END), COUNT(CASE WHEN upload_ratio >= 0 THEN 1 END) "
+        "FROM torrents"
+    )
+    params = list(COMPLETED_STATUSES)
+    if user_id:
+        sql += " WHERE user_id = ?"
+        params.append(user_id)
+    sql += " GROUP BY status"
+    rows = await DB.fetchall(sql, params)
+    summary = {
+        'total': 0, 'completed': 0, 'total_size': 0, 'downloaded_ever': 0, 'uploaded_ever': 0,
+        'rate_download': 0, 'rate_upload': 0, 'avg_ratio': 0.0, 'by_status': {},
+    }
+    ratio_sum = 0.0
+    ratio_count = 0
+    for status, count, completed, size, downloaded, uploaded, rate_down, rate_up, ratio_total, ratios in rows:
+        summary['by_status'][status or 'unknown'] = count
+        summary['total'] += count
+        summary['completed'] += completed or 0
+        summary['total_size'] += size or 0
+        summary['downloaded_ever'] += downloaded or 0
+        summary['uploaded_ever'] += uploaded or 0
+        summary['rate_download'] += rate_down or 0
+        summary['rate_upload'] += rate_up or 0
+        ratio_sum += ratio_total or 0.0
+        ratio_count += ratios or 0
+    summary['in_progress'] = summary['total'] - summary['completed']
+    summary['avg_ratio'] = ratio_sum / ratio_count if ratio_count else 0.0
+    return summary
+
+async def load_torrent_states() -> Dict[str, tuple]:
+    rows = await DB.fetchall("SELECT hash, status, error, done FROM torrent_state", ())
+    return {row[0]: (row[1], row[2], bool(row[3])) for row in rows}
+
+async def save_torrent_states(states: Dict[str, tuple]):
+    # states: {hash: (status, error, done)}
+    if not states:
+        return
+    now = int(time.time())
+    await DB.executemany(
+        "INSERT OR REPLACE INTO torrent_state (hash, status, error, done, updated_at) VALUES (?, ?, ?, ?, ?)",
+        [(hash, status, error, int(done), now) for hash, (status, error, done) in states.items()]
+    )
+
+async def delete_torrent_states(hashes: List[str]):
+    if not hashes:
+        return
+    await DB.executemany("DELETE FROM torrent_state WHERE hash = ?", [(hash,) for hash in hashes])
+
+async def select_torrents(user_id: Optional[int] = None, statuses: Optional[List[str]] = None,
+                          added_before: Optional[str] = None, min_ratio: Optional[float] = None) -> List[dict]:
+    # Filtered listing for bulk operations; user_id and status go through idx_torrents_user_status
+    clauses = []
+    params = []
+    if user_id:
+        clauses.append("user_id = ?")
+        params.append(user_id)
+    if statuses:
+        clauses.append(f"status IN ({', '.join('?' for _ in statuses)})")
+        params.extend(statuses)
+    if added_before:
+        clauses.append("added_at < ?")
+        params.append(added_before)
+    if min_ratio is not None:
+        clauses.append("upload_ratio >= ?")
+        params.append(min_ratio)
+    sql = "SELECT hash, name, status, added_at, user_id FROM torrents"
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    rows = await DB.fetchall(sql, params)
+    return [
+        {"hash": row[0], "name": row[1], "status": row[2], "added_at": row[3], "user_id": row[4]} for row in rows
+    ]
+
+async def set_torrents_status(hashes: List[str], status: str):
+    for hash in hashes:
+        _last_written.pop(hash, None)
+    await DB.executemany("UPDATE torrents SET status = ? WHERE hash = ?", [(status, hash) for hash in hashes])
+
+async def remove_torrents(hashes: List[str]):
+    for hash in hashes:
+        _last_written.pop(hash, None)
+    params = [(hash,) for hash in hashes]
+    # Queued together so both deletes land in the same write batch
+    await asyncio.gather(
+        DB.executemany("DELETE FROM torrents WHERE hash = ?", params),
+        DB.executemany("DELETE FROM torrent_state WHERE hash = ?", params),
+    )
+
+async def page_torrents(user_id: Optional[int] = None, after: Optional[tuple] = None, limit: int = 15) -> List[dict]:
+    """One page of torrents ordered by (added_at, hash), starting after the ``after`` cursor.
+
+    Keyset pagination: the cost of a page does not depend on how deep it is.
+    """
+    clauses = []
+    params = []
+    if user_id:
+        clauses.append("user_id = ?")
+        params.append(user_id)
+    if after:
+        clauses.append("(added_at, hash) > (?, ?)")
+        params.extend(after)
+    sql = "SELECT hash, name, status, added_at, user_id FROM torrents"
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    sql += " ORDER BY added_at, hash LIMIT ?"
+    params.append(limit)
+    rows = await DB.fetchall(sql, params)
+    return [
+        {"hash": row[0], "name": row[1], "status": row[2], "added_at": row[3], "user_id": row[4]} for row in rows
+    ]
+
+async def queue_notification(id: str, user_id: int, message: str) -> bool:
+    """Store a notification; False if one with this id was already queued or sent."""
+    inserted = await DB.execute(
+        "INSERT OR IGNORE INTO notification_queue (id, user_id, message, attempts, next_attempt, created_at) VALUES (?, ?, ?, 0, 0, ?)",
+        (id, user_id, message, int(time.time())),
+        rowcount=True,
+    )
+    return inserted == 1
+
+async def load_due_notifications(now: int) -> List[dict]:
+    rows = await DB.fetchall(
+        "SELECT id, user_id, message, attempts FROM notification_queue WHERE sent_at IS NULL AND next_attempt <= ? "
+        "ORDER BY created_at", (now,)
+    )
+    return [{"id": row[0], "user_id": row[1], "message": row[2], "attempts": row[3]} for row in rows]
+
+async def finish_notifications(ids: List[str]):
+    # Sent or given up; the row stays behind as a marker until prune_notifications
+    if ids:
+        now = int(time.time())
+        await DB.executemany("UPDATE notification_queue SET sent_at = ? WHERE id = ?", [(now, id) for id in ids])
+
+async def prune_notifications(before: int):
+    await DB.execute("DELETE FROM notification_queue WHERE sent_at IS NOT NULL AND sent_at < ?", (before,))
+
+async def reschedule_notifications(ids: List[str], next_attempt: int):
+    if ids:
+        await DB.executemany(
+            "UPDATE notification_queue SET attempts = attempts + 1, next_attempt = ? WHERE id = ?",
+            [(next_attempt, id) for id in ids]
         )
-        await db.commit() 
\ No newline at end of file
+
+async def record_stats_sample(ts: int):
+    """Sample current per-user and global rates and counters from the torrents table.
+
+    The raw insert, the upsert into every rollup bucket and the pruning of expired
+    rows are queued together and land in one write batch.
+    """
+    writes = [
+        DB.execute(
+            "INSERT OR REPLACE INTO stats_samples (ts, user_id, rate_download, rate_upload, downloaded_ever, uploaded_ever) "
+            "SELECT ?, user_id, SUM(rate_download), SUM(rate_upload), SUM(downloaded_ever), SUM(uploaded_ever) "
+            "FROM torrents WHERE user_id IS NOT NULL GROUP BY user_id",
+            (ts,)
+        ),
+        DB.execute(
+            "INSERT OR REPLACE INTO stats_samples (ts, user_id, rate_download, rate_upload, downloaded_ever, uploaded_ever) "
+            "SELECT ?, 0, COALESCE(SUM(rate_download), 0), COALESCE(SUM(rate_upload), 0), "
+            "COALESCE(SUM(downloaded_ever), 0), COALESCE(SUM(uploaded_ever), 0) FROM torrents",
+            (ts,)
+        ),
+        DB.execute("DELETE FROM stats_samples WHERE ts < ?", (ts - STATS_RAW_RETENTION,)),
+    ]
+    for resolution, retention in STATS_ROLLUPS:
+        writes.append(DB.execute(
+            "INSERT INTO stats_rollups (resolution, user_id, bucket, samples, rate_download_sum, rate_upload_sum, "
+            "rate_download_max, rate_upload_max, downloaded_ever, uploaded_ever) "
+            "SELECT ?, user_id, ts - ts % ?, 1, rate_download, rate_upload, rate_download, rate_upload, downloaded_ever, uploaded_ever "
+            "FROM stats_samples WHERE ts = ? "
+            "ON CONFLICT (resolution, user_id, bucket) DO UPDATE SET "
+            "samples = samples + 1, "
+            "rate_download_sum = rate_download_sum + excluded.rate_download_sum, "
+            "rate_upload_sum = rate_upload_sum + excluded.rate_upload_sum, "
+            "rate_download_max = MAX(rate_download_max, excluded.rate_download_max), "
+            "rate_upload_max = MAX(rate_upload_max, excluded.rate_upload_max), "
+            "downloaded_ever = excluded.downloaded_ever, "
+            "uploaded_ever = excluded.uploaded_ever",
+            (resolution, resolution, ts)
+        ))
+        writes.append(DB.execute(
+            "DELETE FROM stats_rollups WHERE resolution = ? AND bucket < ?", (resolution, ts - retention)
+        ))
+    await asyncio.gather(*writes)
+
+async def stats_history(user_id: int, resolution: int, since: int) -> List[dict]:
+    # Rollup buckets for one user (0 = everyone) from ``since`` on, oldest first
+    rows = await DB.fetchall(
+        "SELECT bucket, samples, rate_download_sum, rate_upload_sum, rate_download_max, rate_upload_max, "
+        "downloaded_ever, uploaded_ever FROM stats_rollups WHERE resolution = ? AND user_id = ? AND bucket >= ? "
+        "ORDER BY bucket",
+        (resolution, user_id, since)
+    )
+    return [
+        {
+            "bucket": row[0],
+            "rate_download": row[2] / row[1] if row[1] else 0,
+            "rate_upload": row[3] / row[1] if row[1] else 0,
+            "rate_download_max": row[4],
+            "rate_upload_max": row[5],
+            "downloaded_ever": row[6],
+            "uploaded_ever": row[7],
+        }
+        for row in rows
+    ]
+
+async def user_usage(user_id: int) -> dict:
+    """Active torrents, torrents holding a download slot, and total bytes of one user.
+
+    A range scan of idx_torrents_user_quota; the table itself is not read.
+    """
+    active = ", ".join("?" for _ in INACTIVE_STATUSES)
+    downloading = ", ".join("?" for _ in DOWNLOADING_STATUSES)
+    row = await DB.fetchone(
+        f"SELECT COUNT(CASE WHEN status NOT IN ({active}) THEN 1 END), "
+        f"COUNT(CASE WHEN status IN ({downloading}) THEN 1 END), COALESCE(SUM(total_size), 0) "
+        "FROM torrents WHERE user_id = ?",
+        (*INACTIVE_STATUSES, *DOWNLOADING_STATUSES, user_id)
+    )
+    return {"active": row[0], "downloading": row[1], "bytes": row[2]}
+
+async def count_downloading() -> int:
+    placeholders = ", ".join("?" for _ in DOWNLOADING_STATUSES)
+    row = await DB.fetchone(f"SELECT COUNT(*) FROM torrents WHERE status IN ({placeholders})", DOWNLOADING_STATUSES)
+    return row[0]
+
+async def queue_add(user_id: int, hash: Optional[str], name: str, total_size: int, download_dir: str,
+                    magnet: Optional[str] = None, data: Optional[bytes] = None, exempt: bool = False):
+    # exempt: the user is not subject to per-user limits (admins), only to global ones
+    await DB.execute(
+        "INSERT INTO add_queue (user_id, hash, name, total_size, download_dir, magnet, data, exempt, queued_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (user_id, hash, name, total_size, download_dir, magnet, data, int(exempt), int(time.time()))
+    )
+
+async def count_queued_adds(user_id: Optional[int] = None) -> int:
+    if user_id:
+        row = await DB.fetchone("SELECT COUNT(*) FROM add_queue WHERE user_id = ?", (user_id,))
+    else:
+        row = await DB.fetchone("SELECT COUNT(*) FROM add_queue", ())
+    return row[0]
+
+async def is_add_queued(hash: str) -> bool:
+    return await DB.fetchone("SELECT 1 FROM add_queue WHERE hash = ? LIMIT 1", (hash,)) is not None
+
+async def queued_add_heads(now: int) -> List[dict]:
+    # The oldest queued add of every user that has one, unless it is waiting to be retried
+    rows = await DB.fetchall(
+        "SELECT q.id, q.user_id, q.hash, q.name, q.total_size, q.download_dir, q.magnet, q.data, q.exempt, q.attempts "
+        "FROM add_queue q JOIN (SELECT MIN(id) AS id FROM add_queue GROUP BY user_id) heads ON q.id = heads.id "
+        "WHERE q.next_attempt <= ? ORDER BY q.id",
+        (now,)
+    )
+    return [
+        {"id": row[0], "user_id": row[1], "hash": row[2], "name": row[3], "total_size": row[4] or 0,
+         "download_dir": row[5], "magnet": row[6], "data": row[7], "exempt": bool(row[8]), "attempts": row[9] or 0}
+        for row in rows
+    ]
+
+async def reschedule_queued_add(id: int, next_attempt: int):
+    await DB.execute("UPDATE add_queue SET attempts = attempts + 1, next_attempt = ? WHERE id = ?", (next_attempt, id))
+
+async def delete_queued_add(id: int):
+    await DB.execute("DELETE FROM add_queue WHERE id = ?", (id,))
+
+async def get_meta(key: str) -> Optional[str]:
+    row = await DB.fetchone("SELECT value FROM bot_meta WHERE key = ?", (key,))
+    return row[0] if row else None
+
+async def set_meta(key: str, value: str):
+    await DB.execute("INSERT OR REPLACE INTO bot_meta (key, value) VALUES (?, ?)", (key, value))
+
+async def list_unowned_torrents() -> List[dict]:
+    rows = await DB.fetchall("SELECT hash, name, backend, first_seen FROM unowned_torrents ORDER BY first_seen, hash", ())
+    return [{"hash": row[0], "name": row[1], "backend": row[2], "first_seen": row[3]} for row in rows]
+
+async def save_unowned_torrents(rows: List[dict]):
+    # rows: dicts with hash, name and backend; first_seen is kept for known hashes
+    if not rows:
+        return
+    now = int(time.time())
+    await DB.executemany(
+        "INSERT INTO unowned_torrents (hash, name, backend, first_seen) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT (hash) DO UPDATE SET name = excluded.name, backend = excluded.backend",
+        [(row["hash"], row.get("name"), row.get("backend"), now) for row in rows]
+    )
+
+async def delete_unowned_torrents(hashes: List[str]):
+    if hashes:
+        await DB.executemany("DELETE FROM unowned_torrents WHERE hash = ?", [(hash,) for hash in hashes])
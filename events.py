@@ -0,0 +1,125 @@
+import logging
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from db import load_torrent_states, save_torrent_states, delete_torrent_states
+from poller import POLL_FIELDS
+
+logger = logging.getLogger("transmissionbot")
+
+# Transmission reports a torrent as "recently active" for about 60 seconds after it
+# changes. If more time than this passed since the last poll, do a full poll instead.
+RECENTLY_ACTIVE_WINDOW = 55
+# A full poll is still done this often (seconds) to pick up anything missed
+FULL_RESYNC_INTERVAL = 600
+
+class TorrentEvent(NamedTuple):
+    kind: str  # 'completed', 'error', 'error_cleared', 'status' or 'removed'
+    hash: str
+    old: Optional[tuple]  # (status, error, done) before, None if never seen
+    new: Optional[tuple]  # (status, error, done) after, None when removed
+    torrent: object  # transmission_rpc Torrent, None when removed
+
+def event_id(event: "TorrentEvent") -> str:
+    # Same id for the same transition, also when it is replayed after a restart
+    done_date = event.torrent.fields.get("doneDate", 0) if event.torrent is not None else 0
+    return f"{event.hash}:{event.kind}:{done_date}"
+
+def torrent_state(tor) -> tuple:
+    return (str(tor.status), tor.fields.get('error', 0), tor.fields.get('percentDone', 0) >= 1)
+
+class StateTracker:
+    """Turns Transmission polls into state-transition events.
+
+    After one full poll, each cycle only asks Transmission for recently-active
+    torrents, so its cost follows activity rather than library size. The last
+    state seen per torrent is stored in SQLite only after the subscribers ran, so a
+    crash in between replays the events instead of losing them. Subscribers must
+    therefore be idempotent, e.g. by submitting notifications with an id derived
+    from the event (see ``event_id``).
+    """
+
+    def __init__(self, tsclient, poller):
+        self.tsclient = tsclient
+        self.poller = poller
+        self.state: Dict[str, tuple] = {}
+        # (backend, torrent id) -> hash; ids are only unique within one Transmission daemon
+        self.ids: Dict[tuple, str] = {}
+        self.subscribers = []
+        self.last_poll = 0.0
+        self.last_full_poll = 0.0
+        self.loaded = False
+        # With no stored state at all (first run), record the current state silently
+        self.baseline = False
+
+    def subscribe(self, callback):
+        # callback: async def callback(event: TorrentEvent)
+        self.subscribers.append(callback)
+
+    async def load(self):
+        self.state = await load_torrent_states()
+        self.baseline = not self.state
+        self.loaded = True
+
+    async def poll(self, tracked: Iterable[str]) -> Dict[str, object]:
+        """Run one detection cycle and return the torrents that were fetched."""
+        if not self.loaded:
+            await self.load()
+        tracked = set(tracked)
+        start = time.monotonic()
+        if (not self.last_poll or start - self.last_poll > RECENTLY_ACTIVE_WINDOW
+                or start - self.last_full_poll > FULL_RESYNC_INTERVAL):
+            changed = await self.poller.poll(tracked)
+            self.last_full_poll = start
+            removed = [h for h in self.state if h in tracked and h not in changed]
+        else:
+            active, removed_ids = await self.tsclient.get_recently_active_torrents(arguments=POLL_FIELDS)
+            changed = {tor.fields["hashString"]: tor for tor in active if tor.fields["hashString"] in tracked}
+            for listener in self.poller.listeners:
+                listener(changed)
+            removed = [self.ids.pop(i) for i in removed_ids if i in self.ids]
+        self.last_poll = start
+        # Rows removed from the DB no longer need any stored state
+        removed += [h for h in self.state if h not in tracked and h not in removed]
+
+        events: List[TorrentEvent] = []
+        new_states = {}
+        for hash, tor in changed.items():
+            self.ids[(getattr(tor, "backend", None), tor.id)] = hash
+            new = torrent_state(tor)
+            old = self.state.get(hash)
+            if old == new:
+                continue
+            new_states[hash] = new
+            if self.baseline:
+                continue
+            before = old or (None, 0, False)
+            if new[2] and not before[2]:
+                events.append(TorrentEvent('completed', hash, old, new, tor))
+            if new[1] and not before[1]:
+                events.append(TorrentEvent('error', hash, old, new, tor))
+            elif before[1] and not new[1]:
+                events.append(TorrentEvent('error_cleared', hash, old, new, tor))
+            if new[0] != before[0]:
+                events.append(TorrentEvent('status', hash, old, new, tor))
+        for hash in removed:
+            old = self.state.get(hash)
+            if old is not None and hash in tracked:
+                events.append(TorrentEvent('removed', hash, old, None, None))
+
+        for event in events:
+            for callback in self.subscribers:
+                try:
+                    await callback(event)
+                except Exception as e:
+                    logger.error(f"Error handling {event.kind} event for {event.hash}: {e}")
+
+        # Persist after dispatching: a crash in between replays the events, and the
+        # subscribers' deterministic ids turn the replay into a no-op
+        await save_torrent_states(new_states)
+        await delete_torrent_states(removed)
+        self.state.update(new_states)
+        for hash in removed:
+            self.state.pop(hash, None)
+        self.baseline = False
+        return changed
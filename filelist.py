@@ -0,0 +1,97 @@
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Iterable, List, Optional
+
+logger = logging.getLogger("transmissionbot")
+
+# Only fetched on demand by /files; never part of the regular poll
+FILE_FIELDS = ["id", "hashString", "name", "percentDone", "files", "priorities", "wanted"]
+# File lists kept in memory at once; large packs have thousands of entries each
+FILE_CACHE_SIZE = int(os.environ.get("FILE_CACHE_SIZE", "32"))
+# Without live progress from the poller, a cached list is refetched after this many seconds
+FILE_CACHE_TTL = float(os.environ.get("FILE_CACHE_TTL", "60"))
+
+def parse_file_selection(spec: str, count: int) -> List[int]:
+    """Turn '1-3,7,10-' (1-based, as shown by /files) into sorted 0-based file ids.
+
+    Raises ValueError on a malformed part or a number outside 1..count.
+    """
+    ids = set()
+    for part in spec.replace(" ", "").split(","):
+        if not part:
+            continue
+        if part in ("*", "all"):
+            return list(range(count))
+        start, sep, end = part.partition("-")
+        try:
+            first = int(start) if start else 1
+            last = (int(end) if end else count) if sep else first
+        except ValueError:
+            raise ValueError(f"'{part}' is not a file number or range")
+        if not 1 <= first <= last <= count:
+            raise ValueError(f"'{part}' is outside 1-{count}")
+        ids.update(range(first - 1, last))
+    if not ids:
+        raise ValueError("no files selected")
+    return sorted(ids)
+
+class FileListCache:
+    """Per-torrent file lists for /files, loaded only when asked for.
+
+    A list is fetched with one torrent-get for that hash and kept until the
+    torrent's progress, as last seen by the poller, differs from the progress at
+    fetch time. Changes go out as a single torrent-set for all selected files and
+    drop the cached list so the next view shows what Transmission applied.
+    """
+
+    def __init__(self, tsclient, cache, size: int = FILE_CACHE_SIZE, ttl: float = FILE_CACHE_TTL):
+        self.tsclient = tsclient
+        # TorrentCache; its live objects tell whether progress moved since the fetch
+        self.cache = cache
+        self.size = max(1, size)
+        self.ttl = ttl
+        # hash -> (percentDone at fetch, fetched_at, [transmission_rpc File])
+        self.entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.fetches = 0
+
+    def _fresh(self, hash: str) -> bool:
+        entry = self.entries.get(hash)
+        if entry is None:
+            return False
+        percent_done, fetched_at, _ = entry
+        live = self.cache.live.get(hash)
+        if live is not None and "percentDone" in live.fields:
+            return live.fields["percentDone"] == percent_done
+        return time.monotonic() - fetched_at < self.ttl
+
+    async def get(self, hash: str) -> list:
+        if self._fresh(hash):
+            self.entries.move_to_end(hash)
+            return self.entries[hash][2]
+        tor = await self.tsclient.get_torrent(hash, arguments=FILE_FIELDS)
+        self.fetches += 1
+        files = tor.get_files()
+        self.entries[hash] = (tor.fields.get("percentDone"), time.monotonic(), files)
+        self.entries.move_to_end(hash)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+        return files
+
+    def invalidate(self, hash: str):
+        self.entries.pop(hash, None)
+
+    async def set_files(self, hash: str, ids: Iterable[int], wanted: Optional[bool] = None,
+                        priority: Optional[str] = None):
+        """Mark files wanted/unwanted and/or set their priority ('high', 'normal' or 'low')."""
+        ids = list(ids)
+        changes = {}
+        if wanted is not None:
+            changes["files_wanted" if wanted else "files_unwanted"] = ids
+        if priority is not None:
+            changes[f"priority_{priority}"] = ids
+        if not ids or not changes:
+            return
+        await self.tsclient.change_torrent(hash, **changes)
+        self.invalidate(hash)
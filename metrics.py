@@ -0,0 +1,210 @@
+import asyncio
+import bisect
+import logging
+import os
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("transmissionbot")
+
+# Port of the /metrics and /healthz HTTP endpoint; 0 disables it
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "9464"))
+# Event-loop lag (seconds) above which /healthz reports the bot unhealthy
+HEALTH_MAX_LOOP_LAG = float(os.environ.get("HEALTH_MAX_LOOP_LAG", "5"))
+
+# Bucket upper bounds in seconds, shared by all latency histograms
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+LOOP_LAG_INTERVAL = 1.0
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    """A counter that is either incremented directly or read from a callback at scrape time.
+
+    A callback must return a total that only grows, e.g. a count kept by another object.
+    """
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), func: Optional[Callable[[], float]] = None):
+        super().__init__(name, help, labels)
+        self.values: Dict[tuple, float] = {}
+        self.func = func
+
+    def inc(self, *labels, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        if self.func is not None:
+            try:
+                self.values[()] = self.func()
+            except Exception as e:
+                logger.debug(f"Could not read counter {self.name}: {e}")
+        return [f"{self.name}{_labels(self.label_names, k)} {v}" for k, v in self.values.items()]
+
+class Gauge(_Metric):
+    """A gauge that is either set directly or read from a callback at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), func: Optional[Callable[[], float]] = None):
+        super().__init__(name, help, labels)
+        self.values: Dict[tuple, float] = {}
+        self.func = func
+
+    def set(self, value: float, *labels):
+        self.values[labels] = value
+
+    def render(self) -> List[str]:
+        if self.func is not None:
+            try:
+                self.values[()] = self.func()
+            except Exception as e:
+                logger.debug(f"Could not read gauge {self.name}: {e}")
+        return [f"{self.name}{_labels(self.label_names, k)} {v}" for k, v in self.values.items()]
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (+Inf last), sum, count]
+        self.values: Dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        entry = self.values.get(labels)
+        if entry is None:
+            entry = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    def time(self, *labels):
+        return _Timer(self, labels)
+
+    def render(self) -> List[str]:
+        lines = []
+        for labels, (counts, total, count) in self.values.items():
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                bucket = _labels(self.label_names, labels, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{bucket} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {count}")
+        return lines
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram: Histogram, labels: tuple):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+        return False
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.header())
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+COMMAND_SECONDS = REGISTRY.register(Histogram(
+    "transmissionbot_command_seconds", "Slash command handling time", ("command", "outcome")))
+RPC_SECONDS = REGISTRY.register(Histogram(
+    "transmissionbot_rpc_seconds", "Transmission RPC latency", ("method",)))
+RPC_ERRORS = REGISTRY.register(Counter(
+    "transmissionbot_rpc_errors_total", "Failed Transmission RPC calls", ("method",)))
+COALESCED_CALLS = REGISTRY.register(Counter(
+    "transmissionbot_coalesced_calls_total", "Reads served by an identical in-flight or just-finished read", ("source",)))
+DB_QUERY_SECONDS = REGISTRY.register(Histogram(
+    "transmissionbot_db_query_seconds", "SQLite read query latency"))
+DB_COMMIT_SECONDS = REGISTRY.register(Histogram(
+    "transmissionbot_db_commit_seconds", "SQLite write batch commit latency"))
+DB_BATCH_SIZE = REGISTRY.register(Histogram(
+    "transmissionbot_db_batch_statements", "Statements per SQLite write batch", buckets=(1, 2, 5, 10, 50, 100, 500, 1000)))
+DB_ROWS_WRITTEN = REGISTRY.register(Counter(
+    "transmissionbot_db_rows_written_total", "Rows written by committed SQLite write batches"))
+POLL_CYCLE_SECONDS = REGISTRY.register(Histogram(
+    "transmissionbot_poll_cycle_seconds", "Duration of one scheduler poll cycle"))
+POLL_INTERVAL = REGISTRY.register(Gauge(
+    "transmissionbot_poll_interval_seconds", "Current wait between poll cycles"))
+LOOP_LAG = REGISTRY.register(Gauge(
+    "transmissionbot_event_loop_lag_seconds", "Most recent event loop scheduling delay"))
+LOOP_LAG_SECONDS = REGISTRY.register(Histogram(
+    "transmissionbot_event_loop_lag", "Event loop scheduling delay"))
+
+async def monitor_loop_lag(interval: float = LOOP_LAG_INTERVAL):
+    # Sleeps a fixed interval and records how late the loop woke up
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - start - interval)
+        LOOP_LAG.set(lag)
+        LOOP_LAG_SECONDS.observe(lag)
+
+async def start_metrics_server(health: Callable[[], Tuple[bool, str]], port: int = METRICS_PORT):
+    """Serve /metrics (Prometheus text format) and /healthz on ``port``.
+
+    ``health`` returns (healthy, reason); /healthz answers 200 or 503 with the reason.
+    Returns the aiohttp runner, or None when the endpoint is disabled.
+    """
+    if not port:
+        return None
+    from aiohttp import web
+
+    async def metrics(request):
+        return web.Response(text=REGISTRY.render(), content_type="text/plain", charset="utf-8")
+
+    async def healthz(request):
+        ok, reason = health()
+        if ok and LOOP_LAG.values.get((), 0) > HEALTH_MAX_LOOP_LAG:
+            ok, reason = False, f"event loop lag {LOOP_LAG.values[()]:.1f}s"
+        return web.Response(text=reason + "\n", status=200 if ok else 503)
+
+    app = web.Application()
+    app.router.add_get("/metrics", metrics)
+    app.router.add_get("/healthz", healthz)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, port=port).start()
+    logger.info(f"Metrics endpoint listening on port {port}")
+    return runner
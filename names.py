@@ -0,0 +1,92 @@
+import functools
+import os
+import re
+
+# Number of cleaned names remembered, keyed by the raw name
+NAME_CACHE_SIZE = int(os.environ.get("NAME_CACHE_SIZE", "65536"))
+
+DEFAULT_REPLACE = "+: ,%20: "
+
+class NameCleaner:
+    """Compiled form of the NAME_CLEANUP_REPLACE / NAME_CLEANUP_REMOVE rules.
+
+    The rules are parsed once into a translation table (single-character
+    replacements) or one alternation regex, which give the original output only
+    when no rule can create or hide another's match; otherwise the rules are
+    applied one after another as before. Removed words are only looked for one by
+    one in names that contain any of them. Results are memoized in a bounded LRU that is dropped
+    whenever the rules are reloaded.
+    """
+
+    def __init__(self, replace: str = None, remove: str = None, cache_size: int = NAME_CACHE_SIZE):
+        self.cache_size = cache_size
+        self.load(replace, remove)
+
+    def load(self, replace: str = None, remove: str = None):
+        # Missing arguments are read from the environment again
+        if replace is None:
+            replace = os.environ.get("NAME_CLEANUP_REPLACE", DEFAULT_REPLACE)
+        if remove is None:
+            remove = os.environ.get("NAME_CLEANUP_REMOVE", "")
+        self.replace_rules = replace
+        self.remove_rules = remove
+
+        pairs = []
+        for pair in replace.split(","):
+            if ":" in pair:
+                k, v = pair.split(":", 1)
+                if k:
+                    pairs.append((k, v))
+        # The first rule for a key wins; a duplicate has nothing left to replace
+        # unless another rule brings the key back, which counts as an overlap below
+        self._replace_map = {}
+        for k, v in pairs:
+            self._replace_map.setdefault(k, v)
+        self._table = None
+        self._replace_re = None
+        self._chained = None
+        if not _independent(pairs):
+            # One rule can change what another matches, so apply them in order
+            self._chained = pairs
+        elif pairs and all(len(k) == 1 for k in self._replace_map):
+            self._table = str.maketrans(self._replace_map)
+        elif pairs:
+            self._replace_re = re.compile("|".join(re.escape(k) for k in self._replace_map))
+
+        # Removing one word can join the text around it into a later word, so the
+        # words are removed in order, but only from names containing any of them
+        words = [w.strip() for w in remove.split(",") if w.strip()]
+        self._remove_re = re.compile("|".join(re.escape(w) for w in words), re.IGNORECASE) if words else None
+        self._remove_words = [re.compile(re.escape(w), re.IGNORECASE) for w in words]
+        self.clean = functools.lru_cache(maxsize=self.cache_size)(self._clean)
+
+    def _clean(self, name: str) -> str:
+        if self._table is not None:
+            name = name.translate(self._table)
+        elif self._replace_re is not None:
+            name = self._replace_re.sub(lambda m: self._replace_map[m.group(0)], name)
+        elif self._chained:
+            for k, v in self._chained:
+                name = name.replace(k, v)
+        if self._remove_re is not None and self._remove_re.search(name):
+            for word in self._remove_words:
+                name = word.sub("", name)
+        # Collapse double spaces
+        return " ".join(name.split())
+
+def _overlap(a: str, b: str) -> bool:
+    # a and b can share characters in some text: one contains the other or they chain end to start
+    if a in b or b in a:
+        return True
+    return any(a.endswith(b[:i]) or b.endswith(a[:i]) for i in range(1, min(len(a), len(b))))
+
+def _independent(pairs: list) -> bool:
+    # No key overlaps another rule's key or value. Repeats of a key are fine: once
+    # the first has replaced it, only another rule's value could bring it back.
+    for i, (key, _) in enumerate(pairs):
+        for j, (other, value) in enumerate(pairs):
+            if i == j:
+                continue
+            if (other != key and _overlap(key, other)) or _overlap(key, value):
+                return False
+    return True
@@ -0,0 +1,193 @@
+import asyncio
+import logging
+import os
+import time
+import uuid
+from typing import Dict, List, Set, Tuple
+
+import discord
+
+from db import queue_notification, load_due_notifications, finish_notifications, prune_notifications, reschedule_notifications
+
+logger = logging.getLogger("transmissionbot")
+
+# Seconds a worker waits for more messages to the same user before sending them as one
+NOTIFY_COALESCE_SECONDS = float(os.environ.get("NOTIFY_COALESCE_SECONDS", "2"))
+NOTIFY_WORKERS = int(os.environ.get("NOTIFY_WORKERS", "2"))
+# Failed sends are retried with exponential backoff, then dropped
+NOTIFY_MAX_ATTEMPTS = 8
+NOTIFY_RETRY_BASE = 30
+NOTIFY_RETRY_POLL = 30
+# How long ids of finished notifications are remembered to reject replays (seconds)
+NOTIFY_SENT_RETENTION = 7 * 86400
+
+# Discord's message length limit
+MESSAGE_LIMIT = 2000
+
+def _split_message(lines: List[str]) -> List[Tuple[str, int]]:
+    # Joins lines into messages under Discord's limit; returns (text, number of lines in it)
+    chunks = []
+    current = ""
+    count = 0
+    for line in lines:
+        line = line[:MESSAGE_LIMIT]
+        if count and len(current) + 1 + len(line) > MESSAGE_LIMIT:
+            chunks.append((current, count))
+            current = line
+            count = 1
+        else:
+            current = f"{current}\n{line}" if count else line
+            count += 1
+    if count:
+        chunks.append((current, count))
+    return chunks
+
+class NotificationDispatcher:
+    """Delivers user notifications in the background.
+
+    ``submit`` stores the message in the notification_queue table and returns, so
+    the caller never waits on Discord. Worker tasks merge everything queued for one
+    user into a single message, pause on 429 responses, and reschedule failed sends
+    in SQLite with exponential backoff. Unsent rows are picked up again after a
+    restart. A message submitted with an id that was queued before is ignored, so
+    callers replaying an event after a crash pass a deterministic id.
+    """
+
+    def __init__(self, client: discord.Client, mode: str = "dm", channel_id: int = 0,
+                 workers: int = NOTIFY_WORKERS, coalesce_window: float = NOTIFY_COALESCE_SECONDS):
+        self.client = client
+        self.mode = mode
+        self.channel_id = channel_id
+        self.workers = max(1, workers)
+        self.coalesce_window = coalesce_window
+        self.dm_channels: Dict[int, discord.abc.Messageable] = {}
+        # user_id -> [(id, message, attempts)] waiting to be sent
+        self.pending: Dict[int, List[Tuple[str, str, int]]] = {}
+        self.in_memory: Set[str] = set()
+        # Ids finished or rescheduled while the retry loop's query ran; its rows may predate that
+        self._settled: Set[str] = set()
+        self.sent = 0
+        self.failed = 0
+        self.rate_limited_until = 0.0
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._scheduled: Set[int] = set()
+        # user_id -> monotonic time their oldest waiting message was queued
+        self._first_queued: Dict[int, float] = {}
+        self.tasks: List[asyncio.Task] = []
+
+    def depth(self) -> int:
+        return sum(len(items) for items in self.pending.values())
+
+    def start(self):
+        if self.tasks:
+            return
+        self.tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self.tasks.append(asyncio.create_task(self._retry_loop()))
+
+    async def submit(self, user_id: int, message: str, id: str = None):
+        id = id or uuid.uuid4().hex
+        # Stored first, so a crash before delivery still sends it after the restart
+        if await queue_notification(id, user_id, message):
+            self._add(user_id, id, message, 0)
+
+    def _add(self, user_id: int, id: str, message: str, attempts: int):
+        if id in self.in_memory:
+            return
+        self.in_memory.add(id)
+        self.pending.setdefault(user_id, []).append((id, message, attempts))
+        if user_id not in self._scheduled:
+            self._scheduled.add(user_id)
+            self._first_queued[user_id] = time.monotonic()
+            self._queue.put_nowait(user_id)
+
+    async def _retry_loop(self):
+        while True:
+            try:
+                self._settled.clear()
+                for row in await load_due_notifications(int(time.time())):
+                    if row["id"] not in self._settled:
+                        self._add(row["user_id"], row["id"], row["message"], row["attempts"])
+                await prune_notifications(int(time.time() - NOTIFY_SENT_RETENTION))
+            except Exception as e:
+                logger.error(f"Error loading queued notifications: {e}")
+            await asyncio.sleep(NOTIFY_RETRY_POLL)
+
+    async def _worker(self):
+        while True:
+            user_id = await self._queue.get()
+            # Waits out the window from the user's first message, not from now, so a
+            # user who sat in the queue behind others is not held back again
+            first = self._first_queued.get(user_id, time.monotonic())
+            wait = max(first + self.coalesce_window, self.rate_limited_until) - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._scheduled.discard(user_id)
+            self._first_queued.pop(user_id, None)
+            items = self.pending.pop(user_id, [])
+            if items:
+                await self._deliver(user_id, items)
+
+    async def _deliver(self, user_id: int, items: List[Tuple[str, str, int]]):
+        sent = 0
+        error = None
+        try:
+            for chunk, count in _split_message([message for _, message, _ in items]):
+                await self._send(user_id, chunk)
+                sent += count
+        except Exception as e:
+            error = e
+        if sent:
+            self.sent += sent
+            await self._forget([id for id, _, _ in items[:sent]])
+        if error is None:
+            return
+        # Only the messages whose chunk did not go out are retried or dropped
+        items = items[sent:]
+        if isinstance(error, discord.HTTPException) and error.status == 429:
+            headers = getattr(error.response, "headers", None) or {}
+            retry_after = float(headers.get("Retry-After", 5))
+            self.rate_limited_until = time.monotonic() + retry_after
+            logger.warning(f"Rate limited sending notifications, backing off {retry_after:.1f}s")
+            for id, message, attempts in items:
+                self.in_memory.discard(id)
+                self._add(user_id, id, message, attempts)
+        elif isinstance(error, discord.HTTPException) and error.status in (403, 404):
+            # DMs closed or user gone; retrying will not help
+            logger.error(f"Dropping notification for user {user_id}: {error}")
+            self.failed += len(items)
+            await self._forget([id for id, _, _ in items])
+        else:
+            await self._retry_later(user_id, items, error)
+
+    async def _forget(self, ids: List[str]):
+        await finish_notifications(ids)
+        self._settled.update(ids)
+        self.in_memory.difference_update(ids)
+
+    async def _retry_later(self, user_id: int, items: List[Tuple[str, str, int]], error: Exception):
+        attempts = max(a for _, _, a in items) + 1
+        ids = [id for id, _, _ in items]
+        if attempts >= NOTIFY_MAX_ATTEMPTS:
+            logger.error(f"Giving up on notification for user {user_id} after {attempts} attempts: {error}")
+            self.failed += len(items)
+            await self._forget(ids)
+            return
+        delay = NOTIFY_RETRY_BASE * 2 ** (attempts - 1)
+        logger.error(f"Error sending notification to user {user_id}, retrying in {delay}s: {error}")
+        await reschedule_notifications(ids, int(time.time() + delay))
+        self._settled.update(ids)
+        self.in_memory.difference_update(ids)
+
+    async def _send(self, user_id: int, text: str):
+        if self.mode == "channel" and self.channel_id:
+            channel = self.client.get_channel(self.channel_id)
+            if channel is None:
+                channel = await self.client.fetch_channel(self.channel_id)
+            await channel.send(text)
+            return
+        channel = self.dm_channels.get(user_id)
+        if channel is None:
+            user = self.client.get_user(user_id) or await self.client.fetch_user(user_id)
+            channel = user.dm_channel or await user.create_dm()
+            self.dm_channels[user_id] = channel
+        await channel.send(text)
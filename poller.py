@@ -0,0 +1,99 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, Iterable
+
+logger = logging.getLogger("transmissionbot")
+
+# Only the torrent-get fields the bot actually reads. Asking Transmission for
+# everything makes each response many times larger than it needs to be.
+POLL_FIELDS = [
+    "id", "hashString", "name", "status", "percentDone", "eta", "error", "errorString",
+    "totalSize", "downloadedEver", "uploadedEver", "rateDownload", "rateUpload", "uploadRatio",
+    # Tells one completion of a torrent apart from a later one, for notification ids
+    "doneDate",
+]
+
+# Very large libraries are fetched in several torrent-get calls of this many hashes
+POLL_CHUNK_SIZE = int(os.environ.get("POLL_CHUNK_SIZE", "500"))
+
+def torrent_stats(tor) -> dict:
+    return {
+        'total_size': tor.fields.get('totalSize', 0),
+        'downloaded_ever': tor.fields.get('downloadedEver', 0),
+        'uploaded_ever': tor.fields.get('uploadedEver', 0),
+        'rate_download': tor.fields.get('rateDownload', 0),
+        'rate_upload': tor.fields.get('rateUpload', 0),
+        'upload_ratio': float(tor.fields.get('uploadRatio', 0.0)),
+    }
+
+def torrent_row(tor) -> dict:
+    # Row shape expected by db.bulk_update_torrents
+    return {
+        'hash': tor.fields['hashString'],
+        'name': tor.fields.get('name'),
+        'status': str(tor.status),
+        # Set by backends.TransmissionPool
+        'backend': getattr(tor, 'backend', None),
+        **torrent_stats(tor),
+    }
+
+class TorrentPoller:
+    """Fetches all tracked torrents in batched torrent-get calls and shares one snapshot.
+
+    Both background loops read from the same snapshot, so a loop that runs shortly
+    after another one reuses its result instead of querying Transmission again.
+    """
+
+    def __init__(self, tsclient, chunk_size: int = POLL_CHUNK_SIZE):
+        self.tsclient = tsclient
+        self.chunk_size = max(1, chunk_size)
+        self.snapshot: Dict[str, object] = {}
+        self.polled_hashes = set()
+        self.updated_at = 0.0
+        self.rpc_count = 0
+        self.last_duration = 0.0
+        # Callables handed every fetched batch, e.g. TorrentCache.update_live
+        self.listeners = []
+        self._lock = asyncio.Lock()
+
+    def age(self) -> float:
+        if not self.updated_at:
+            return float("inf")
+        return time.monotonic() - self.updated_at
+
+    async def fetch(self, hashes: Iterable[str]) -> Dict[str, object]:
+        # Fetch the given hashes without replacing the shared snapshot
+        hashes = list(hashes)
+        snapshot = {}
+        # An empty ids list means "all torrents" to Transmission, so never send one.
+        # Chunks go out concurrently; the client's concurrency limit bounds them.
+        chunks = [hashes[i:i + self.chunk_size] for i in range(0, len(hashes), self.chunk_size)]
+        results = await asyncio.gather(*(self.tsclient.get_torrents(ids=chunk, arguments=POLL_FIELDS) for chunk in chunks))
+        self.rpc_count += len(chunks)
+        for torrents in results:
+            for tor in torrents:
+                snapshot[tor.fields["hashString"]] = tor
+        for listener in self.listeners:
+            listener(snapshot)
+        return snapshot
+
+    async def poll(self, hashes: Iterable[str]) -> Dict[str, object]:
+        hashes = list(hashes)
+        start = time.monotonic()
+        snapshot = await self.fetch(hashes)
+        self.snapshot = snapshot
+        self.polled_hashes = set(hashes)
+        self.updated_at = time.monotonic()
+        self.last_duration = self.updated_at - start
+        logger.debug(f"Polled {len(snapshot)}/{len(hashes)} torrents in {self.last_duration:.3f}s")
+        return snapshot
+
+    async def get_snapshot(self, hashes: Iterable[str], max_age: float = 0) -> Dict[str, object]:
+        hashes = list(hashes)
+        async with self._lock:
+            # Reuse a recent snapshot as long as it was taken for every requested hash
+            if self.age() <= max_age and self.polled_hashes.issuperset(hashes):
+                return self.snapshot
+            return await self.poll(hashes)
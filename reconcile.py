@@ -0,0 +1,99 @@
+import logging
+import os
+import time
+from typing import Dict, Set
+
+from db import remove_torrents, update_torrent_names, list_unowned_torrents, save_unowned_torrents, delete_unowned_torrents
+
+logger = logging.getLogger("transmissionbot")
+
+# Seconds between reconciliation passes
+RECONCILE_INTERVAL = float(os.environ.get("RECONCILE_INTERVAL", "900"))
+# Only what is needed to match torrents up; id and hashString are always sent
+RECONCILE_FIELDS = ["hashString", "name"]
+
+class Reconciler:
+    """Keeps the torrents table in step with what Transmission actually holds.
+
+    Each pass is one torrent-get over all backends asking only for hash and name.
+    Rows whose torrent is missing from Transmission on two passes in a row are
+    deleted in one batch; torrents no user added are recorded in unowned_torrents
+    for an admin to /claim. The sets from the previous pass are kept, so a pass only
+    writes what changed since then.
+    """
+
+    def __init__(self, tsclient, cache):
+        self.tsclient = tsclient
+        self.cache = cache
+        # Tracked hashes missing from Transmission at the last pass
+        self.missing: Set[str] = set()
+        # hash -> row of unowned_torrents
+        self.unowned: Dict[str, dict] = {}
+        self.loaded = False
+        self.passes = 0
+        self.removed = 0
+        self.last_duration = 0.0
+
+    async def load(self):
+        self.unowned = {row["hash"]: row for row in await list_unowned_torrents()}
+        self.loaded = True
+
+    async def run(self) -> dict:
+        """Run one pass and return counts of what it changed."""
+        if not self.loaded:
+            await self.load()
+        start = time.monotonic()
+        await self.cache.ensure_loaded()
+        # Raises if any backend fails, so a partial list never deletes rows
+        torrents = await self.tsclient.get_torrents(arguments=RECONCILE_FIELDS)
+        remote = {tor.hashString: tor for tor in torrents}
+        local = self.cache.rows
+
+        # A torrent removed outside the bot; wait one more pass in case a /remove or
+        # /add is half done, then drop all of them in one write batch
+        missing = {hash for hash in local if hash not in remote}
+        orphans = sorted(missing & self.missing)
+        self.missing = missing - set(orphans)
+        if orphans:
+            await remove_torrents(orphans)
+            for hash in orphans:
+                self.cache.drop(hash)
+                self.tsclient.forget(hash)
+            logger.info(f"Reconcile removed {len(orphans)} torrents no longer in Transmission")
+
+        # Renamed in Transmission: all new names go out in one write batch
+        renames = {
+            hash: tor.name for hash, tor in remote.items()
+            if hash in local and tor.name and local[hash].get("name") != tor.name
+        }
+        if renames:
+            await update_torrent_names(renames)
+            for hash, name in renames.items():
+                self.cache.update_row(hash, name=name)
+
+        found = [
+            {"hash": hash, "name": tor.name, "backend": getattr(tor, "backend", None)}
+            for hash, tor in remote.items()
+            if hash not in local and self.unowned.get(hash, {}).get("name") != tor.name
+        ]
+        gone = [hash for hash in self.unowned if hash not in remote or hash in local]
+        await save_unowned_torrents(found)
+        await delete_unowned_torrents(gone)
+        for hash in gone:
+            self.unowned.pop(hash, None)
+        for row in found:
+            if row["hash"] not in self.unowned:
+                logger.info(f"Found unowned torrent {row['hash']} ({row['name']}) in Transmission")
+            self.unowned[row["hash"]] = row
+
+        self.passes += 1
+        self.removed += len(orphans)
+        self.last_duration = time.monotonic() - start
+        logger.debug(f"Reconcile pass over {len(remote)} torrents took {self.last_duration:.3f}s")
+        return {"orphans": len(orphans), "renamed": len(renames), "unowned": len(self.unowned)}
+
+    async def claim(self, hash: str) -> dict:
+        # Takes a torrent off the unowned list; the caller adds it to torrents
+        row = self.unowned.pop(hash, None)
+        await delete_unowned_torrents([hash])
+        return row
@@ -0,0 +1,106 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import Callable, List, Optional
+
+from metrics import POLL_CYCLE_SECONDS, POLL_INTERVAL
+
+logger = logging.getLogger("transmissionbot")
+
+# Activity levels a job reports back; the highest one in a cycle sets the next interval
+ACTIVITY_IDLE = 0
+ACTIVITY_ACTIVE = 1
+ACTIVITY_NEAR_COMPLETION = 2
+
+# Seconds between cycles: near completion, while downloading, and the idle/error ceiling
+POLL_INTERVAL_MIN = float(os.environ.get("POLL_INTERVAL_MIN", "5"))
+POLL_INTERVAL_ACTIVE = float(os.environ.get("POLL_INTERVAL_ACTIVE", "15"))
+POLL_INTERVAL_MAX = float(os.environ.get("POLL_INTERVAL_MAX", "300"))
+# Each sleep is randomized by up to this fraction so restarts don't line up polls
+POLL_JITTER = 0.1
+
+class _Job:
+    __slots__ = ("name", "func", "every", "last_run")
+
+    def __init__(self, name: str, func: Callable, every: Optional[float]):
+        self.name = name
+        self.func = func
+        self.every = every
+        self.last_run = 0.0
+
+class PollScheduler:
+    """Owns all periodic polling work and picks how long to wait between cycles.
+
+    Jobs either run every cycle or at most every ``every`` seconds. A job may return
+    one of the ACTIVITY_* levels. The interval drops to POLL_INTERVAL_MIN when something
+    is close to finishing, to POLL_INTERVAL_ACTIVE while downloads run, and doubles
+    up to POLL_INTERVAL_MAX while the swarm is idle or a job keeps failing.
+    """
+
+    def __init__(self, min_interval: float = POLL_INTERVAL_MIN, active_interval: float = POLL_INTERVAL_ACTIVE,
+                 max_interval: float = POLL_INTERVAL_MAX, jitter: float = POLL_JITTER):
+        self.min_interval = min_interval
+        self.active_interval = max(min_interval, active_interval)
+        self.max_interval = max(self.active_interval, max_interval)
+        self.jitter = jitter
+        self.interval = self.active_interval
+        self.last_cycle_duration = 0.0
+        self.last_cycle_at = 0.0
+        self.cycles = 0
+        self.consecutive_failures = 0
+        self.jobs: List[_Job] = []
+        self._wake = asyncio.Event()
+
+    def add_job(self, name: str, func: Callable, every: Optional[float] = None):
+        # func: async def func() -> Optional[activity level]
+        self.jobs.append(_Job(name, func, every))
+
+    def wake(self):
+        # Run the next cycle now and start again from the active interval, e.g. after /add
+        self.interval = self.active_interval
+        self._wake.set()
+
+    def next_interval(self, activity: int, failed: bool) -> float:
+        if failed:
+            return min(self.max_interval, self.interval * 2)
+        if activity >= ACTIVITY_NEAR_COMPLETION:
+            return self.min_interval
+        if activity >= ACTIVITY_ACTIVE:
+            return self.active_interval
+        return min(self.max_interval, max(self.active_interval, self.interval * 2))
+
+    async def run_cycle(self):
+        start = time.monotonic()
+        activity = ACTIVITY_IDLE
+        failed = False
+        for job in self.jobs:
+            if job.every and start - job.last_run < job.every:
+                continue
+            try:
+                level = await job.func()
+                job.last_run = start
+                if level is not None:
+                    activity = max(activity, level)
+            except Exception as e:
+                failed = True
+                logger.error(f"Error in scheduled job {job.name}: {e}")
+        self.cycles += 1
+        self.consecutive_failures = self.consecutive_failures + 1 if failed else 0
+        self.last_cycle_at = time.monotonic()
+        self.last_cycle_duration = self.last_cycle_at - start
+        self.interval = self.next_interval(activity, failed)
+        POLL_CYCLE_SECONDS.observe(self.last_cycle_duration)
+        POLL_INTERVAL.set(self.interval)
+        logger.debug(f"Poll cycle {self.cycles} took {self.last_cycle_duration:.3f}s, next in {self.interval:.0f}s")
+
+    async def run(self, is_closed: Callable[[], bool]):
+        while not is_closed():
+            self._wake.clear()
+            await self.run_cycle()
+            delay = self.interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
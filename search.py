@@ -0,0 +1,204 @@
+import bisect
+import itertools
+import re
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+_TOKEN_RE = re.compile(r"[^\W_]+")
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+def trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+class _Entry:
+    __slots__ = ("hash", "user_id", "display", "lower", "tokens", "grams")
+
+    def __init__(self, hash: str, user_id: Optional[int], display: str):
+        self.hash = hash
+        self.user_id = user_id
+        self.display = display
+        self.lower = display.lower()
+        self.tokens = set(tokenize(display))
+        self.grams = trigrams(self.lower)
+
+class _Postings:
+    """Sorted token list, token -> hashes and trigram -> hashes postings for one partition."""
+
+    __slots__ = ("postings", "tokens", "grams")
+
+    def __init__(self):
+        self.postings: Dict[str, Set[str]] = {}
+        self.tokens: List[str] = []
+        self.grams: Dict[str, Set[str]] = {}
+
+    def add(self, hash: str, entry: "_Entry"):
+        for token in entry.tokens:
+            postings = self.postings.get(token)
+            if postings is None:
+                postings = self.postings[token] = set()
+                bisect.insort(self.tokens, token)
+            postings.add(hash)
+        for gram in entry.grams:
+            self.grams.setdefault(gram, set()).add(hash)
+
+    def remove(self, hash: str, entry: "_Entry"):
+        for gram in entry.grams:
+            postings = self.grams.get(gram)
+            if postings is not None:
+                postings.discard(hash)
+                if not postings:
+                    del self.grams[gram]
+        for token in entry.tokens:
+            postings = self.postings.get(token)
+            if postings is None:
+                continue
+            postings.discard(hash)
+            if not postings:
+                del self.postings[token]
+                i = bisect.bisect_left(self.tokens, token)
+                if i < len(self.tokens) and self.tokens[i] == token:
+                    del self.tokens[i]
+
+    def prefix_hashes(self, prefix: str) -> Set[str]:
+        hashes = set()
+        i = bisect.bisect_left(self.tokens, prefix)
+        while i < len(self.tokens) and self.tokens[i].startswith(prefix):
+            hashes |= self.postings[self.tokens[i]]
+            i += 1
+        return hashes
+
+    def substring_candidates(self, query: str) -> Set[str]:
+        # Hashes whose name has every trigram of the query (len >= 3); a superset of the substring matches
+        sets = sorted((self.grams.get(gram, set()) for gram in trigrams(query)), key=len)
+        if not sets:
+            return set()
+        hashes = set(sets[0])
+        for postings in sets[1:]:
+            hashes &= postings
+            if not hashes:
+                break
+        return hashes
+
+# Most names the fuzzy fallback looks at per keystroke
+FUZZY_SCAN_LIMIT = 2000
+
+class NameIndex:
+    """Search index over cleaned torrent names, partitioned by owner.
+
+    Names are cleaned and tokenized once when a torrent is added or renamed, so a
+    keystroke only costs a few bisects into the sorted token list instead of
+    re-cleaning and scanning every name. Every owner has their own postings, plus
+    one partition over all torrents for admins, so a lookup never touches other
+    users' names. Results are ranked: whole-name prefix, every query word prefixing
+    a name word, then substring matches anywhere in the name, found through trigram
+    postings so they cover every name. Only when none of those match, fuzzy in-order
+    character matches are tried over at most FUZZY_SCAN_LIMIT names.
+    """
+
+    def __init__(self, clean: Callable[[str], str] = lambda name: name):
+        self.clean = clean
+        self.entries: Dict[str, _Entry] = {}
+        self.by_user: Dict[Optional[int], Dict[str, None]] = {}
+        # user_id -> postings of their torrents; every torrent is also in self.all
+        self.user_postings: Dict[Optional[int], _Postings] = {}
+        self.all = _Postings()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, hash: str, name: str, user_id: Optional[int]):
+        if hash in self.entries:
+            self.remove(hash)
+        entry = _Entry(hash, user_id, self.clean(name or hash))
+        self.entries[hash] = entry
+        self.by_user.setdefault(user_id, {})[hash] = None
+        self.all.add(hash, entry)
+        self.user_postings.setdefault(user_id, _Postings()).add(hash, entry)
+
+    def remove(self, hash: str):
+        entry = self.entries.pop(hash, None)
+        if entry is None:
+            return
+        self.by_user.get(entry.user_id, {}).pop(hash, None)
+        self.all.remove(hash, entry)
+        postings = self.user_postings.get(entry.user_id)
+        if postings is not None:
+            postings.remove(hash, entry)
+            if not postings.tokens and not postings.grams:
+                del self.user_postings[entry.user_id]
+
+    def clear(self):
+        self.entries.clear()
+        self.by_user.clear()
+        self.user_postings.clear()
+        self.all = _Postings()
+
+    def search(self, query: str, user_id: Optional[int] = None, limit: int = 25) -> List[Tuple[str, str]]:
+        """Return up to ``limit`` (hash, display name) pairs, best match first.
+
+        ``user_id=None`` searches every torrent (admins); otherwise only that user's.
+        """
+        if user_id is None:
+            partition, postings = self.entries.keys(), self.all
+        else:
+            partition, postings = self.by_user.get(user_id, {}).keys(), self.user_postings.get(user_id)
+        query = query.strip().lower()
+        if not query:
+            return [(h, self.entries[h].display) for h in itertools.islice(partition, limit)]
+
+        ranked: List[Tuple[int, int, str]] = []
+
+        # Token prefix matches via the index: every query word must prefix some name word
+        words = tokenize(query)
+        if words and postings is not None:
+            candidates = None
+            for word in words:
+                hashes = postings.prefix_hashes(word)
+                candidates = hashes if candidates is None else candidates & hashes
+                if not candidates:
+                    break
+            for h in candidates or ():
+                entry = self.entries[h]
+                rank = 0 if entry.lower.startswith(query) else 1
+                ranked.append((rank, len(entry.lower), h))
+
+        # Substring matches anywhere in the name. Names without a trigram of the query
+        # cannot contain it; queries too short for a trigram check every name.
+        if len(ranked) < limit:
+            seen = {h for _, _, h in ranked}
+            if len(query) >= 3:
+                candidates = postings.substring_candidates(query) if postings is not None else ()
+            else:
+                candidates = partition
+            for h in candidates:
+                if h in seen:
+                    continue
+                pos = self.entries[h].lower.find(query)
+                if pos >= 0:
+                    ranked.append((2, pos, h))
+
+        # Fuzzy matches only when nothing else matched, and bounded
+        if not ranked:
+            for h in itertools.islice(partition, FUZZY_SCAN_LIMIT):
+                span = _subsequence_span(query, self.entries[h].lower)
+                if span is not None:
+                    ranked.append((3, span, h))
+
+        ranked.sort()
+        return [(h, self.entries[h].display) for _, _, h in ranked[:limit]]
+
+def _subsequence_span(query: str, text: str) -> Optional[int]:
+    # Length of the text window the query characters appear in, in order; None if they don't
+    query = query.replace(" ", "")
+    if not query:
+        return None
+    start = text.find(query[0])
+    if start < 0:
+        return None
+    pos = start
+    for ch in query[1:]:
+        pos = text.find(ch, pos + 1)
+        if pos < 0:
+            return None
+    return pos - start + 1
@@ -0,0 +1,99 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, Iterable, Optional
+
+from scheduler import POLL_INTERVAL_MAX, POLL_JITTER
+
+logger = logging.getLogger("transmissionbot")
+
+# Seconds between session-stats/free-space refreshes, and how long a result is trusted
+# (0 derives it from the scheduler, see session_stats_ttl)
+SESSION_STATS_INTERVAL = float(os.environ.get("SESSION_STATS_INTERVAL", "60"))
+SESSION_STATS_TTL = float(os.environ.get("SESSION_STATS_TTL", "0"))
+# Seconds allowed on top of the longest gap between refreshes, for the rest of the cycle
+SESSION_STATS_TTL_MARGIN = 60
+
+def session_stats_ttl(max_interval: float = POLL_INTERVAL_MAX, jitter: float = POLL_JITTER,
+                      every: float = SESSION_STATS_INTERVAL) -> float:
+    # The refresh is due every ``every`` seconds but only runs when the scheduler cycles,
+    # and idle cycles can be max_interval * (1 + jitter) apart
+    return every + max_interval * (1 + jitter) + SESSION_STATS_TTL_MARGIN
+
+class SessionMonitor:
+    """Cached session-stats and free-space of every Transmission backend.
+
+    ``refresh`` runs on its own scheduler cadence and asks each backend for its
+    session statistics and the free space of each download directory. Readers get
+    the cached values without an RPC; values older than the TTL count as unknown.
+    The TTL outlasts the longest idle gap between scheduler cycles, so values only
+    expire when refreshes fail. A backend that fails keeps its last values until
+    they expire.
+    """
+
+    def __init__(self, pool, download_dirs: Iterable[str], ttl: Optional[float] = None):
+        self.pool = pool
+        self.download_dirs = list(dict.fromkeys(download_dirs))
+        self.ttl = ttl or SESSION_STATS_TTL or session_stats_ttl()
+        # backend -> SessionStats, and backend -> {download dir: free bytes}
+        self.stats: Dict[str, object] = {}
+        self.free: Dict[str, Dict[str, int]] = {}
+        self.updated_at: Dict[str, float] = {}
+
+    def fresh(self, backend: str) -> bool:
+        return time.monotonic() - self.updated_at.get(backend, float("-inf")) <= self.ttl
+
+    async def _refresh_backend(self, name: str, backend):
+        stats, *free = await asyncio.gather(
+            backend.call("session_stats"),
+            *(backend.call("free_space", path) for path in self.download_dirs),
+        )
+        self.stats[name] = stats
+        self.free[name] = {path: size for path, size in zip(self.download_dirs, free) if size is not None}
+        self.updated_at[name] = time.monotonic()
+
+    async def refresh(self):
+        names = list(self.pool.backends)
+        results = await asyncio.gather(
+            *(self._refresh_backend(name, self.pool.backends[name]) for name in names), return_exceptions=True
+        )
+        failed = [(name, r) for name, r in zip(names, results) if isinstance(r, Exception)]
+        for name, error in failed:
+            logger.error(f"Error refreshing session stats for backend {name}: {error}")
+        if failed and len(failed) == len(names):
+            raise failed[0][1]
+
+    def free_space(self, backend: str, path: str) -> Optional[int]:
+        if not self.fresh(backend):
+            return None
+        return self.free.get(backend, {}).get(path)
+
+    def max_free_space(self, path: str) -> Optional[int]:
+        # Most free bytes for ``path`` on any backend, None if no backend reported it
+        known = [self.free_space(name, path) for name in self.pool.backends]
+        known = [size for size in known if size is not None]
+        return max(known) if known else None
+
+    def active_count(self, backend: str) -> Optional[int]:
+        if not self.fresh(backend) or backend not in self.stats:
+            return None
+        return self.stats[backend].active_torrent_count
+
+    def totals(self) -> Optional[dict]:
+        """Sums over backends with fresh stats, or None if there are none."""
+        names = [name for name in self.pool.backends if name in self.stats and self.fresh(name)]
+        if not names:
+            return None
+        fresh = [self.stats[name] for name in names]
+        return {
+            "backends": len(fresh),
+            "download_speed": sum(s.download_speed for s in fresh),
+            "upload_speed": sum(s.upload_speed for s in fresh),
+            "active": sum(s.active_torrent_count for s in fresh),
+            "paused": sum(s.paused_torrent_count for s in fresh),
+            "torrents": sum(s.torrent_count for s in fresh),
+            "downloaded": sum(s.cumulative_stats.downloaded_bytes for s in fresh),
+            "uploaded": sum(s.cumulative_stats.uploaded_bytes for s in fresh),
+            "age": time.monotonic() - min(self.updated_at[name] for name in names),
+        }
@@ -0,0 +1,81 @@
+import asyncio
+import os
+from typing import Awaitable, Callable, Dict, Hashable, Optional
+
+from metrics import COALESCED_CALLS
+
+# Seconds a finished call's result is still handed to identical calls; keep it tiny
+COALESCE_WINDOW = float(os.environ.get("COALESCE_WINDOW", "0.05"))
+
+def freeze(value):
+    # Hashable form of call arguments: lists, tuples and sets become tuples, dicts sorted item tuples
+    if isinstance(value, dict):
+        return tuple(sorted((k, freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return tuple(sorted(freeze(v) for v in value))
+    return value
+
+class SingleFlight:
+    """Shares one in-flight call between concurrent callers asking for the same key.
+
+    The first caller runs the call; everyone arriving with the same key while it runs,
+    or within ``window`` seconds after it finished, gets its result (list results are
+    copied per caller) or its exception. ``forget`` drops all of that, so a write
+    can make sure no later read is served from before it.
+    """
+
+    def __init__(self, name: str, window: float = COALESCE_WINDOW):
+        self.name = name
+        self.window = window
+        self.flights: Dict[Hashable, asyncio.Future] = {}
+        self.calls = 0
+        self.deduplicated = 0
+
+    async def do(self, key: Optional[Hashable], func: Callable[[], Awaitable]):
+        self.calls += 1
+        try:
+            future = self.flights.get(key) if key is not None else None
+        except TypeError:
+            # Unhashable arguments: just run the call
+            key = future = None
+        if future is not None:
+            self.deduplicated += 1
+            COALESCED_CALLS.inc(self.name)
+            await asyncio.wait([future])
+            if future.cancelled():
+                # The caller running it was cancelled; run it for ourselves
+                return await self.do(key, func)
+            result = future.result()
+            return list(result) if isinstance(result, list) else result
+        if key is None:
+            return await func()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.flights[key] = future
+        try:
+            result = await func()
+        except asyncio.CancelledError:
+            self._drop(key, future)
+            future.cancel()
+            raise
+        except Exception as e:
+            self._drop(key, future)
+            future.set_exception(e)
+            # Marks the exception retrieved when nobody joined
+            future.exception()
+            raise
+        future.set_result(result)
+        if self.window > 0 and self.flights.get(key) is future:
+            loop.call_later(self.window, self._drop, key, future)
+        else:
+            self._drop(key, future)
+        return result
+
+    def _drop(self, key: Hashable, future: asyncio.Future):
+        if self.flights.get(key) is future:
+            del self.flights[key]
+
+    def forget(self):
+        self.flights.clear()
@@ -0,0 +1,100 @@
+import asyncio
+import time
+
+import pytest
+
+import db
+from admission import ADMISSION_RETRY_BASE, AdmissionController
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB", db.Database(str(tmp_path / "test.db")))
+    monkeypatch.setattr(db, "_last_written", {})
+    return db.DB
+
+def run(database, coro):
+    async def main():
+        try:
+            await db.init_db()
+            return await coro
+        finally:
+            await database.close()
+    return asyncio.run(main())
+
+class Recorder:
+    def __init__(self, fail=None):
+        # fail: user_id -> exception raised when starting that user's add
+        self.fail = fail or {}
+        self.started = []
+        self.notified = []
+
+    async def start(self, entry):
+        error = self.fail.get(entry["user_id"])
+        if error is not None:
+            raise error
+        self.started.append(entry["name"])
+
+    async def notify(self, entry, error):
+        self.notified.append((entry["user_id"], entry["name"], str(error)))
+
+    def controller(self):
+        return AdmissionController(self.start, self.notify, max_active=0, max_downloads=0, max_bytes=0, max_total_downloads=0)
+
+async def enqueue(controller, user_id, name):
+    await controller.enqueue(user_id, None, name, 0, "/data", magnet=f"magnet:?dn={name}")
+
+async def queued():
+    return await db.DB.fetchall("SELECT user_id, name, attempts, next_attempt FROM add_queue ORDER BY id")
+
+def test_users_with_fewer_downloads_go_first(database):
+    recorder = Recorder()
+    async def scenario():
+        controller = recorder.controller()
+        for i in range(3):
+            await db.add_torrent(f"busy{i}", f"busy{i}", 1, status="downloading")
+        await enqueue(controller, 1, "a1")
+        await enqueue(controller, 1, "a2")
+        await enqueue(controller, 2, "b1")
+        await enqueue(controller, 3, "c1")
+        return await controller.run_queue(), controller.queued
+    started, left = run(database, scenario())
+    # User 1 queued first but already has downloads running; one entry per user per round
+    assert recorder.started == ["b1", "c1", "a1", "a2"]
+    assert (started, left) == (4, 0)
+
+def test_unreachable_transmission_keeps_entry_with_backoff(database):
+    recorder = Recorder(fail={1: ConnectionError("refused")})
+    async def scenario():
+        controller = recorder.controller()
+        await enqueue(controller, 1, "a1")
+        first = await controller.run_queue()
+        after_first = await queued()
+        # Not due yet, so the next cycle does not touch it
+        second = await controller.run_queue()
+        await db.DB.execute("UPDATE add_queue SET next_attempt = 0")
+        third = await controller.run_queue()
+        return first, after_first, second, third, await queued(), controller.queued
+    now = time.time()
+    first, after_first, second, third, after_third, left = run(database, scenario())
+    assert (first, second, third) == (0, 0, 0)
+    assert after_first[0][2] == 1
+    assert now + ADMISSION_RETRY_BASE - 1 <= after_first[0][3] <= time.time() + ADMISSION_RETRY_BASE + 1
+    # The second failure waits twice as long
+    assert after_third[0][2] == 2
+    assert after_third[0][3] >= now + 2 * ADMISSION_RETRY_BASE - 1
+    assert left == 1
+    assert recorder.notified == []
+
+def test_permanent_failure_notifies_owner_and_is_not_counted(database):
+    recorder = Recorder(fail={1: ValueError("invalid torrent")})
+    async def scenario():
+        controller = recorder.controller()
+        await enqueue(controller, 1, "bad")
+        await enqueue(controller, 2, "good")
+        started = await controller.run_queue()
+        return started, controller.started, controller.failed, controller.queued, await queued()
+    started, total, failed, left, rows = run(database, scenario())
+    assert (started, total, failed, left) == (1, 1, 1, 0)
+    assert recorder.started == ["good"]
+    assert recorder.notified == [(1, "bad", "invalid torrent")]
+    assert rows == []
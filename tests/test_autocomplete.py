@@ -0,0 +1,69 @@
+import pytest
+
+from benchmarks import baseline
+from benchmarks.autocomplete import REMOVE, build_index, keystrokes, library, time_queries
+from benchmarks.report import percentile
+from names import NameCleaner
+from search import FUZZY_SCAN_LIMIT, NameIndex
+
+@pytest.fixture(scope="module")
+def rows():
+    return library(10000)
+
+@pytest.fixture(scope="module")
+def index(rows):
+    return build_index(rows, NameCleaner(remove=REMOVE))
+
+def test_user_only_sees_own_torrents(rows, index):
+    user_id = rows[3]["user_id"]
+    own = {r["hash"] for r in rows if r["user_id"] == user_id}
+    for query in keystrokes(rows, names=5) + ["", "a"]:
+        assert {h for h, _ in index.search(query, user_id=user_id)} <= own
+
+def test_prefix_match_ranks_first(rows, index):
+    row = rows[42]
+    display = index.entries[row["hash"]].display
+    results = index.search(display.lower(), user_id=row["user_id"])
+    assert results[0][0] == row["hash"]
+
+def test_fuzzy_fallback_for_typos(rows, index):
+    results = index.search("stelar odysey")
+    assert results
+    assert all("s" in name.lower() and "y" in name.lower() for _, name in results)
+
+def best_p99(search, queries, rounds=3):
+    # Lowest p99 over a few rounds, so one slow round on a busy machine does not count
+    return min(percentile(time_queries(search, queries), 99) for _ in range(rounds))
+
+def test_p99_at_10k_torrents(rows, index):
+    queries = keystrokes(rows)[::20]
+    user_id = rows[0]["user_id"]
+    own = [r for r in rows if r["user_id"] == user_id]
+    admin = best_p99(lambda q: index.search(q), queries)
+    user = best_p99(lambda q: index.search(q, user_id=user_id), queries)
+    # The original cleaned and scanned every row per keystroke; only one round is needed
+    # since a slow round only makes it look worse
+    scan_admin = best_p99(lambda q: baseline.autocomplete(rows, q), queries, rounds=1)
+    scan_user = best_p99(lambda q: baseline.autocomplete(own, q), queries, rounds=1)
+    assert admin * 4 < scan_admin
+    assert user * 4 < scan_user
+    # A user's lookups only touch their own partition
+    assert user < admin
+
+def test_substring_covers_names_past_fuzzy_limit():
+    index = NameIndex()
+    for i in range(FUZZY_SCAN_LIMIT + 1000):
+        index.add(f"h{i}", f"Filler.Game.{i}", i % 7)
+    index.add("target", "TheWitcher3.Complete", 3)
+    assert index.search("witcher") == [("target", "TheWitcher3.Complete")]
+    assert index.search("witcher", user_id=3) == [("target", "TheWitcher3.Complete")]
+    assert index.search("witcher", user_id=4) == []
+    index.remove("target")
+    assert index.search("witcher") == []
+
+def test_substring_hits_follow_token_hits():
+    index = NameIndex()
+    index.add("token", "Witcher.2", 1)
+    index.add("inner", "TheWitcher3", 1)
+    assert [h for h, _ in index.search("witcher")] == ["token", "inner"]
+    assert [h for h, _ in index.search("it")] == ["token", "inner"]
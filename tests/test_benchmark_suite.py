@@ -0,0 +1,63 @@
+import json
+import subprocess
+import sys
+
+import pytest
+import transmission_rpc
+
+from benchmarks.fakes import make_torrent
+from benchmarks.harness import REPO_ROOT
+from benchmarks.mock_transmission import MockTransmission, torrent_hash
+
+@pytest.fixture
+def mock():
+    server = MockTransmission("t", torrents=30).start()
+    yield server
+    server.stop()
+
+def client(mock):
+    return transmission_rpc.Client(host="127.0.0.1", port=mock.port, username="bench", password="bench")
+
+def test_mock_serves_requested_fields(mock):
+    hashes = [torrent_hash("t", i) for i in range(3)]
+    torrents = client(mock).get_torrents(ids=hashes, arguments=["name", "percentDone"])
+    assert sorted(t.fields["hashString"] for t in torrents) == sorted(hashes)
+    assert set(torrents[0].fields) == {"id", "hashString", "name", "percentDone"}
+    assert mock.rpc_count("torrent-get") == 1
+
+def test_mock_recently_active_and_removed(mock):
+    c = client(mock)
+    active, removed = c.get_recently_active_torrents()
+    assert active == [] and removed == []
+    mock.step(changes=5, completions=2)
+    mock.remove_external([torrent_hash("t", 0)])
+    active, removed = c.get_recently_active_torrents(arguments=["hashString", "status", "doneDate"])
+    assert 0 < len(active) <= 5
+    assert sum(t.fields["doneDate"] > 0 and t.status == "seeding" for t in active) >= 1
+    assert removed == [1]
+
+def test_mock_add_and_duplicate(mock):
+    c = client(mock)
+    data = make_torrent("Some.Game-GROUP", size=123)
+    added = c.add_torrent(data)
+    assert added.name == "Some.Game-GROUP"
+    again = c.add_torrent(data)
+    assert again.fields["hashString"] == added.fields["hashString"]
+    assert len(mock.torrents) == 31
+
+def test_scenario_reports_every_operation():
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.scenario", "--torrents", "60", "--rounds", "2"],
+        cwd=REPO_ROOT, check=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, timeout=120,
+    ).stdout
+    report = json.loads(output)
+    results = report["results"]
+    for name in ("poll events (full)", "/list user (cold)", "autocomplete user", "/add magnet", "/add file"):
+        assert {"p50_ms", "p99_ms", "rpc", "db_commits", "db_rows"} <= set(results[name])
+    # One torrent-get covers a small library; warm /list and autocomplete never reach Transmission
+    assert results["poll events (full)"]["rpc_by_method"] == {"torrent-get": 1.0}
+    assert results["/list user (warm)"]["rpc"] == 0
+    assert results["autocomplete admin"]["rpc"] == 0
+    # Each /add is one torrent-add and one committed row
+    assert results["/add magnet"]["rpc_by_method"] == {"torrent-add": 1.0}
+    assert results["/add file"]["db_rows"] == 1
@@ -0,0 +1,172 @@
+import asyncio
+
+import aiosqlite
+import pytest
+
+import db
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    # Module functions use db.DB, so each test gets its own file behind it
+    monkeypatch.setattr(db, "DB", db.Database(str(tmp_path / "test.db")))
+    monkeypatch.setattr(db, "_last_written", {})
+    return db.DB
+
+def run(database, coro):
+    async def main():
+        try:
+            await db.init_db()
+            return await coro
+        finally:
+            await database.close()
+    return asyncio.run(main())
+
+async def hashes():
+    return {row[0] for row in await db.DB.fetchall("SELECT hash FROM torrents")}
+
+def test_concurrent_writes_share_one_commit(database):
+    async def scenario():
+        before = database.commit_count
+        await asyncio.gather(*(db.add_torrent(f"h{i}", f"name{i}", 1) for i in range(50)))
+        return database.commit_count - before, await hashes()
+    commits, stored = run(database, scenario())
+    assert commits == 1
+    assert stored == {f"h{i}" for i in range(50)}
+
+def test_bad_statement_only_fails_its_own_write(database):
+    async def scenario():
+        results = await asyncio.gather(
+            db.add_torrent("good1", "a", 1),
+            database.execute("INSERT INTO missing_table VALUES (1)"),
+            db.add_torrent("good2", "b", 1),
+            return_exceptions=True,
+        )
+        return results, await hashes()
+    results, stored = run(database, scenario())
+    assert results[0] is None and results[2] is None
+    assert isinstance(results[1], Exception)
+    assert stored == {"good1", "good2"}
+
+def test_unchanged_rows_are_not_rewritten(database):
+    row = {"hash": "h1", "name": "a", "status": "downloading", "total_size": 10}
+    async def scenario():
+        await db.add_torrent("h1", "a", 1)
+        first = await db.bulk_update_torrents([row])
+        before = database.commit_count
+        second = await db.bulk_update_torrents([dict(row)])
+        changed = await db.bulk_update_torrents([{**row, "status": "seeding"}])
+        return first, second, database.commit_count - before, changed
+    first, second, commits, changed = run(database, scenario())
+    assert (first, second, changed) == (1, 0, 1)
+    # Only the changed row caused a commit
+    assert commits == 1
+
+def test_renames_are_one_write(database):
+    async def scenario():
+        await asyncio.gather(*(db.add_torrent(f"h{i}", f"old{i}", 1) for i in range(50)))
+        before = database.commit_count
+        await db.update_torrent_names({f"h{i}": f"new{i}" for i in range(50)})
+        rows = await database.fetchall("SELECT hash, name FROM torrents")
+        return database.commit_count - before, dict(rows)
+    commits, names = run(database, scenario())
+    assert commits == 1
+    assert names == {f"h{i}": f"new{i}" for i in range(50)}
+
+def test_read_after_write_sees_it(database):
+    async def scenario():
+        database.reads.window = 10
+        await db.add_torrent("a", "a", 1)
+        first = await hashes()
+        # Within the coalescing window, but the commit dropped the shared result
+        await db.add_torrent("b", "b", 1)
+        return first, await hashes()
+    first, second = run(database, scenario())
+    assert first == {"a"}
+    assert second == {"a", "b"}
+
+def test_reads_never_see_an_open_write_batch(database):
+    async def scenario():
+        await db.add_torrent("committed", "a", 1)
+        # What the writer does mid-batch: a transaction that is not committed yet
+        await database.conn.execute("BEGIN")
+        await database.conn.execute("INSERT INTO torrents (hash, name, user_id) VALUES ('pending', 'b', 1)")
+        during = await hashes()
+        await database.conn.execute("ROLLBACK")
+        return during, await hashes()
+    during, after = run(database, scenario())
+    assert during == {"committed"}
+    assert after == {"committed"}
+
+# The torrents table as the first release created it, before any migration existed
+BASELINE_SCHEMA = """
+CREATE TABLE torrents (
+    hash TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    user_id INTEGER NOT NULL,
+    status TEXT,
+    added_at TEXT
+);
+INSERT INTO torrents VALUES ('old', 'Old.Game', 7, 'seeding', '2024-01-01T00:00:00');
+"""
+
+async def schema(conn):
+    async with conn.execute("PRAGMA user_version") as cursor:
+        version = (await cursor.fetchone())[0]
+    async with conn.execute("SELECT type, name, sql FROM sqlite_master ORDER BY type, name") as cursor:
+        objects = await cursor.fetchall()
+    columns = {}
+    for type, name, _ in objects:
+        if type == "table":
+            async with conn.execute(f"PRAGMA table_info({name})") as cursor:
+                columns[name] = [row[1] for row in await cursor.fetchall()]
+    return version, objects, columns
+
+def migrate_file(path, *, before=None, versions=None):
+    # Runs before(conn) on a plain connection, then migrate() once per entry of versions
+    async def main():
+        conn = await aiosqlite.connect(path, isolation_level=None)
+        try:
+            if before is not None:
+                await before(conn)
+            applied = []
+            for version in versions or [db.SCHEMA_VERSION]:
+                migrations = db.MIGRATIONS[:version]
+                saved = db.MIGRATIONS, db.SCHEMA_VERSION
+                db.MIGRATIONS, db.SCHEMA_VERSION = migrations, len(migrations)
+                try:
+                    applied.append(await db.migrate(conn))
+                finally:
+                    db.MIGRATIONS, db.SCHEMA_VERSION = saved
+            return applied, await schema(conn)
+        finally:
+            await conn.close()
+    return asyncio.run(main())
+
+def test_baseline_database_is_upgraded(tmp_path, database):
+    fresh = migrate_file(str(tmp_path / "fresh.db"))[1]
+    async def baseline(conn):
+        await conn.executescript(BASELINE_SCHEMA)
+    applied, upgraded = migrate_file(database.path, before=baseline)
+    assert applied == [db.SCHEMA_VERSION]
+    assert upgraded[0] == db.SCHEMA_VERSION
+    # Same tables and columns as a new database; only column order in torrents may differ
+    assert {name: sorted(cols) for name, cols in upgraded[2].items()} == {name: sorted(cols) for name, cols in fresh[2].items()}
+    stored = run(database, database.fetchall("SELECT hash, name, user_id, status, total_size, backend FROM torrents"))
+    assert stored == [("old", "Old.Game", 7, "seeding", 0, None)]
+
+@pytest.mark.parametrize("partial", range(len(db.MIGRATIONS)))
+def test_upgrade_from_every_partial_version(tmp_path, partial):
+    fresh = migrate_file(str(tmp_path / "fresh.db"))[1]
+    applied, upgraded = migrate_file(str(tmp_path / "partial.db"), versions=[partial, db.SCHEMA_VERSION])
+    assert applied == [partial, db.SCHEMA_VERSION - partial]
+    assert upgraded == fresh
+
+def test_migrations_can_be_rerun(tmp_path):
+    # A crash after a step's DDL but before user_version was bumped replays the step
+    path = str(tmp_path / "rerun.db")
+    fresh = migrate_file(path)[1]
+    async def reset(conn):
+        await conn.execute("PRAGMA user_version = 0")
+    applied, rerun = migrate_file(path, before=reset)
+    assert applied == [db.SCHEMA_VERSION]
+    assert rerun == fresh
@@ -0,0 +1,27 @@
+import json
+import subprocess
+import sys
+
+from benchmarks.harness import REPO_ROOT
+
+LATENCY = 0.3
+CALLS = 50
+USERS = 10
+
+def test_concurrent_list_against_slow_transmission():
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.list_latency", "--json", "--calls", str(CALLS), "--users", str(USERS),
+         "--latency", str(LATENCY), "--torrents", "300"],
+        cwd=REPO_ROOT, check=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, timeout=120,
+    ).stdout
+    result = json.loads(output)
+    assert result["answered"] == CALLS
+    # Every call is acknowledged before any of them has waited on Transmission
+    assert result["first_response"]["max_ms"] < result["completed"]["min_ms"]
+    # The slow RPCs never block the event loop; one blocking call would stall it for LATENCY
+    assert result["max_loop_lag_ms"] < LATENCY * 1000 / 2
+    # Calls overlap: one user's concurrent pages share a torrent-get, and the RPCs do not
+    # run one after another (which would take rpcs * LATENCY)
+    rpcs = result["rpc_by_method"]["torrent-get"]
+    assert rpcs <= USERS
+    assert result["wall_ms"] < rpcs * LATENCY * 1000 * 2 / 3
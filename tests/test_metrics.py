@@ -0,0 +1,9 @@
+from metrics import Counter, Registry
+
+def test_callback_counter_renders_as_counter():
+    total = [3]
+    registry = Registry()
+    registry.register(Counter("x_sent_total", "Sent", func=lambda: total[0]))
+    assert "# TYPE x_sent_total counter\nx_sent_total 3\n" in registry.render()
+    total[0] = 5
+    assert "x_sent_total 5\n" in registry.render()
@@ -0,0 +1,42 @@
+import pytest
+
+from benchmarks import baseline
+from benchmarks.names import REMOVE, REPLACE, raw_names
+from names import DEFAULT_REPLACE, NameCleaner
+
+RULES = [
+    (DEFAULT_REPLACE, ""),
+    (REPLACE, REMOVE),
+    # Multi-character keys go through the alternation regex
+    ("%20: ,++:+", "codex"),
+    # A replacement producing another rule's key is applied in order
+    ("_:.,.: ", "PLAZA"),
+    # A later key that starts inside an earlier one
+    ("b:Y,ab:X", ""),
+    # A replacement completing a later key with the text after it
+    ("a:b,bc:X", ""),
+    # The first rule for a repeated key wins, unless a value brings the key back
+    ("x:1,x:2", ""),
+    ("x:xy,x:2", ""),
+    # Removing one word joins the text around it into a later one
+    ("", "B,AC,ab,ab"),
+    ("", "CODEX,PLAZA"),
+]
+NAMES = raw_names(2000) + [
+    "", "   ", "a  b\t c", "CODEXcodex", "x%20%20y", "[FitGirl Repack]",
+    "ab", "ac", "abc", "x", "xx", "aabb", "PLACODEXZA",
+]
+
+@pytest.mark.parametrize("replace,remove", RULES)
+def test_same_output_as_original(monkeypatch, replace, remove):
+    monkeypatch.setenv("NAME_CLEANUP_REPLACE", replace)
+    monkeypatch.setenv("NAME_CLEANUP_REMOVE", remove)
+    cleaner = NameCleaner(replace, remove)
+    for name in NAMES:
+        assert cleaner.clean(name) == baseline.clean_torrent_name(name), name
+
+def test_reload_drops_memoized_names():
+    cleaner = NameCleaner("+: ", "")
+    assert cleaner.clean("A+B") == "A B"
+    cleaner.load("+:-", "")
+    assert cleaner.clean("A+B") == "A-B"
@@ -0,0 +1,171 @@
+import asyncio
+import time
+import types
+
+import pytest
+
+import db
+import notify
+from events import TorrentEvent, event_id
+from notify import MESSAGE_LIMIT, NotificationDispatcher
+
+class FakeChannel:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, text):
+        self.sent.append(text)
+
+class FlakyChannel(FakeChannel):
+    def __init__(self, fail_on: int):
+        super().__init__()
+        self.fail_on = fail_on
+        self.calls = 0
+
+    async def send(self, text):
+        self.calls += 1
+        if self.calls == self.fail_on:
+            raise ConnectionError("connection reset")
+        await super().send(text)
+
+class FakeClient:
+    def __init__(self, channel=None):
+        self.channel = channel or FakeChannel()
+
+    def get_channel(self, id):
+        return self.channel
+
+class FakeTorrent:
+    def __init__(self, **fields):
+        self.fields = fields
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB", db.Database(str(tmp_path / "test.db")))
+    return db.DB
+
+def run(database, coro):
+    async def main():
+        try:
+            await db.init_db()
+            return await coro
+        finally:
+            await database.close()
+    return asyncio.run(main())
+
+def dispatcher(client):
+    return NotificationDispatcher(client, mode="channel", channel_id=1, workers=1, coalesce_window=0)
+
+async def drain(notifier, client, count):
+    notifier.start()
+    try:
+        for _ in range(200):
+            if len(client.channel.sent) >= count and not notifier.in_memory:
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        for task in notifier.tasks:
+            task.cancel()
+        await asyncio.gather(*notifier.tasks, return_exceptions=True)
+
+async def rows():
+    return await db.DB.fetchall("SELECT id, sent_at FROM notification_queue")
+
+def test_same_id_is_queued_once(database):
+    async def scenario():
+        first = await db.queue_notification("e1", 1, "done")
+        again = await asyncio.gather(*(db.queue_notification("e1", 1, "done") for _ in range(5)))
+        return first, again, await rows()
+    first, again, stored = run(database, scenario())
+    assert first is True
+    assert again == [False] * 5
+    assert len(stored) == 1
+
+def test_sent_notifications_leave_a_marker(database):
+    client = FakeClient()
+    async def scenario():
+        notifier = dispatcher(client)
+        await notifier.submit(1, "done", id="e1")
+        await drain(notifier, client, 1)
+        marker = await rows()
+        due = await db.load_due_notifications(2 ** 40)
+        replayed = await db.queue_notification("e1", 1, "done")
+        await db.prune_notifications(marker[0][1] + 1)
+        return marker, due, replayed, await rows()
+    marker, due, replayed, pruned = run(database, scenario())
+    assert client.channel.sent == ["done"]
+    assert marker[0][0] == "e1" and marker[0][1] is not None
+    assert due == []
+    assert replayed is False
+    assert pruned == []
+
+def test_unsent_notification_is_delivered_after_restart(database):
+    client = FakeClient()
+    async def scenario():
+        # Stored, then the process dies before any worker ran
+        await dispatcher(client).submit(1, "done", id="e1")
+        await drain(dispatcher(client), client, 1)
+        return await rows()
+    stored = run(database, scenario())
+    assert client.channel.sent == ["done"]
+    assert stored[0][1] is not None
+
+def test_event_replayed_after_restart_is_not_sent_again(database):
+    # StateTracker persists state only after its subscribers ran; a crash in between
+    # replays the same transition, which must map to the same notification id
+    client = FakeClient()
+    event = TorrentEvent("completed", "abc", None, ("seeding", 0, True), FakeTorrent(doneDate=1700000000))
+    replay = TorrentEvent("completed", "abc", None, ("seeding", 0, True), FakeTorrent(doneDate=1700000000))
+    async def scenario():
+        before = dispatcher(client)
+        await before.submit(1, "abc finished", id=event_id(event))
+        await drain(before, client, 1)
+        after = dispatcher(client)
+        await after.submit(1, "abc finished", id=event_id(replay))
+        await drain(after, client, 1)
+        return after.depth()
+    assert event_id(event) == event_id(replay)
+    assert run(database, scenario()) == 0
+    assert client.channel.sent == ["abc finished"]
+
+def test_worker_waits_from_first_message_not_from_dequeue(database, monkeypatch):
+    # A fake clock that only moves when the worker sleeps, so the waits are exact
+    now = [0.0]
+    waits = []
+    real_sleep = asyncio.sleep
+    async def sleep(delay):
+        waits.append(delay)
+        now[0] += delay
+        await real_sleep(0)
+    monkeypatch.setattr(notify, "time", types.SimpleNamespace(monotonic=lambda: now[0], time=time.time))
+    client = FakeClient()
+    async def scenario():
+        notifier = NotificationDispatcher(client, mode="channel", channel_id=1, workers=1, coalesce_window=2)
+        for user_id in range(5):
+            await notifier.submit(user_id, f"hello {user_id}")
+        monkeypatch.setattr(asyncio, "sleep", sleep)
+        worker = asyncio.create_task(notifier._worker())
+        while len(client.channel.sent) < 5:
+            await real_sleep(0.01)
+        worker.cancel()
+        await asyncio.gather(worker, return_exceptions=True)
+    run(database, scenario())
+    # All five users queued at once share one window instead of waiting 2s each in turn
+    assert waits == [2]
+    assert now[0] == 2
+
+def test_failed_chunk_only_retries_unsent_messages(database):
+    client = FakeClient(FlakyChannel(fail_on=2))
+    # Each message fills most of a Discord message, so each goes out as its own chunk
+    items = [(f"e{i}", str(i) * (MESSAGE_LIMIT - 100), 0) for i in range(3)]
+    async def scenario():
+        notifier = dispatcher(client)
+        for id, message, _ in items:
+            await db.queue_notification(id, 1, message)
+        await notifier._deliver(1, items)
+        stored = await db.DB.fetchall("SELECT id, sent_at IS NOT NULL, attempts FROM notification_queue ORDER BY id")
+        return notifier.sent, stored
+    sent, stored = run(database, scenario())
+    assert client.channel.sent == [items[0][1]]
+    assert sent == 1
+    assert stored == [("e0", 1, 0), ("e1", 0, 1), ("e2", 0, 1)]
@@ -0,0 +1,32 @@
+import asyncio
+
+import pytest
+
+from benchmarks.harness import connect_pool
+from benchmarks.mock_transmission import MockTransmission
+from poller import POLL_FIELDS, TorrentPoller
+
+@pytest.fixture
+def mock():
+    server = MockTransmission("poll", torrents=1201).start()
+    yield server
+    server.stop()
+
+def test_one_torrent_get_per_chunk(mock):
+    poller = TorrentPoller(connect_pool([mock]), chunk_size=500)
+    snapshot = asyncio.run(poller.poll(mock.hashes))
+    assert len(snapshot) == 1201
+    assert mock.calls == {"session-get": 1, "torrent-get": 3}
+    assert poller.rpc_count == 3
+
+def test_poll_asks_only_for_used_fields(mock):
+    poller = TorrentPoller(connect_pool([mock]))
+    snapshot = asyncio.run(poller.poll(mock.hashes[:5]))
+    for tor in snapshot.values():
+        assert set(tor.fields) == set(POLL_FIELDS)
+
+def test_empty_poll_sends_nothing(mock):
+    # An empty ids list would mean "every torrent" to Transmission
+    poller = TorrentPoller(connect_pool([mock]))
+    assert asyncio.run(poller.poll([])) == {}
+    assert mock.rpc_count("torrent-get") == 0
@@ -0,0 +1,29 @@
+import types
+
+import sessionstats
+from scheduler import PollScheduler
+from sessionstats import SessionMonitor, session_stats_ttl
+
+def monitor(ttl, updated_at):
+    pool = types.SimpleNamespace(backends={"b0": None})
+    session = SessionMonitor(pool, ["/data"], ttl=ttl)
+    session.free = {"b0": {"/data": 1000}}
+    session.updated_at = {"b0": updated_at}
+    return session
+
+def test_ttl_outlasts_the_longest_idle_gap(monkeypatch):
+    scheduler = PollScheduler(max_interval=300, jitter=0.1)
+    every = 60
+    ttl = session_stats_ttl(scheduler.max_interval, scheduler.jitter, every)
+    # Refreshed just after a cycle started; the job is next due `every` later, but the
+    # scheduler may sleep its longest jittered interval first and run other jobs before it
+    worst_gap = every + scheduler.max_interval * (1 + scheduler.jitter) + 30
+    monkeypatch.setattr(sessionstats, "time", types.SimpleNamespace(monotonic=lambda: 1000.0 + worst_gap))
+    assert monitor(ttl, 1000.0).free_space("b0", "/data") == 1000
+
+def test_values_expire_when_refreshes_stop(monkeypatch):
+    ttl = session_stats_ttl(300, 0.1, 60)
+    monkeypatch.setattr(sessionstats, "time", types.SimpleNamespace(monotonic=lambda: 1000.0 + 2 * ttl))
+    session = monitor(ttl, 1000.0)
+    assert session.free_space("b0", "/data") is None
+    assert session.max_free_space("/data") is None
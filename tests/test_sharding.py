@@ -0,0 +1,11 @@
+import asyncio
+
+from benchmarks.sharding import measure
+
+def test_poll_time_follows_largest_backend():
+    # 3 + 1 + 1 chunks, each taking the daemon about 0.1s; times are medians of 3 rounds
+    result = asyncio.run(measure([600, 200, 200], latency=0.002, per_torrent_latency=0.0005, chunk_size=200, rounds=3))
+    assert result["rpc"] == 5
+    # Backends are polled at once: the pool is nearer the largest backend alone than the sum
+    assert result["largest"] < result["sum"]
+    assert result["pool"] - result["largest"] < result["sum"] - result["pool"]
@@ -0,0 +1,40 @@
+import asyncio
+
+from singleflight import SingleFlight
+
+def test_concurrent_calls_share_one_flight():
+    async def scenario():
+        flights = SingleFlight("test", window=0)
+        calls = []
+        async def read():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return ["row"]
+        results = await asyncio.gather(*(flights.do("k", read) for _ in range(5)))
+        return calls, results
+    calls, results = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert results == [["row"]] * 5
+
+def test_read_after_write_does_not_join_stale_flight():
+    async def scenario():
+        flights = SingleFlight("test", window=10)
+        value = ["old"]
+        release = asyncio.Event()
+        async def read():
+            seen = value[0]
+            await release.wait()
+            return seen
+        before = asyncio.create_task(flights.do("k", read))
+        await asyncio.sleep(0)
+        # A write lands while the first read is still running
+        value[0] = "new"
+        flights.forget()
+        after = asyncio.create_task(flights.do("k", read))
+        await asyncio.sleep(0)
+        release.set()
+        stale, fresh = await asyncio.gather(before, after)
+        # Nor is the finished stale result kept for the window
+        again = await flights.do("k", read)
+        return stale, fresh, again
+    assert asyncio.run(scenario()) == ("old", "new", "new")
@@ -0,0 +1,73 @@
+import base64
+import hashlib
+
+import pytest
+
+from torrentfile import magnet_info_hash, parse_torrent
+
+def bencode(value) -> bytes:
+    # Keeps dict insertion order, so tests can build non-canonical files too
+    if isinstance(value, int):
+        return b"i%de" % value
+    if isinstance(value, str):
+        value = value.encode()
+    if isinstance(value, bytes):
+        return b"%d:%s" % (len(value), value)
+    if isinstance(value, list):
+        return b"l" + b"".join(bencode(v) for v in value) + b"e"
+    return b"d" + b"".join(bencode(k) + bencode(v) for k, v in value.items()) + b"e"
+
+SINGLE = {"name": "ubuntu.iso", "piece length": 262144, "pieces": b"\x00" * 20, "length": 123456}
+MULTI = {
+    "files": [{"length": 100, "path": ["a", "1.bin"]}, {"length": 250, "path": ["b.bin"]}],
+    "name": "Some.Game",
+    "piece length": 16384,
+    "pieces": b"\x01" * 20,
+}
+
+def torrent(info, **extra) -> bytes:
+    return bencode({"announce": "http://tracker/announce", "info": info, **extra})
+
+def test_single_file():
+    info = parse_torrent(torrent(SINGLE))
+    assert info == {"hash": hashlib.sha1(bencode(SINGLE)).hexdigest(), "name": "ubuntu.iso", "total_size": 123456}
+
+def test_multi_file():
+    info = parse_torrent(torrent(MULTI, **{"created by": "test"}))
+    assert info["name"] == "Some.Game"
+    assert info["total_size"] == 350
+    assert info["hash"] == hashlib.sha1(bencode(MULTI)).hexdigest()
+
+def test_hash_covers_the_raw_info_bytes():
+    # Keys out of order must not be re-sorted before hashing
+    unsorted = {"pieces": b"\x02" * 20, "name": "x", "length": 1, "piece length": 16384}
+    assert parse_torrent(torrent(unsorted))["hash"] == hashlib.sha1(bencode(unsorted)).hexdigest()
+
+@pytest.mark.parametrize("data", [
+    b"",
+    b"not bencode",
+    torrent(SINGLE)[:-10],
+    bencode({"announce": "x"}),
+    bencode({"info": "not a dict"}),
+    bencode({"info": {"name": "x", "length": "big"}}),
+    b"d4:info" + b"l" * 5000,
+    b"d4:infod4:name" + b"l" * 5000,
+], ids=["empty", "garbage", "truncated", "no-info", "info-not-dict", "bad-length", "deep-list", "deep-in-info"])
+def test_invalid_input_raises_value_error(data):
+    with pytest.raises(ValueError):
+        parse_torrent(data)
+
+HEX = "c12fe1c06bba254a9dc9f519b335aa7c1367a88a"
+
+@pytest.mark.parametrize("magnet", [
+    f"magnet:?xt=urn:btih:{HEX}",
+    f"magnet:?xt=urn:btih:{HEX.upper()}&dn=Some+Game+%28x64%29&tr=udp%3A%2F%2Ftracker%3A80",
+    f"magnet:?dn=Some.Game&xt=urn:btih:{HEX}",
+    "magnet:?xt=urn:btih:" + base64.b32encode(bytes.fromhex(HEX)).decode() + "&dn=x",
+])
+def test_magnet_info_hash(magnet):
+    assert magnet_info_hash(magnet) == HEX
+
+@pytest.mark.parametrize("magnet", ["magnet:?dn=only-a-name", "http://example.com/x.torrent", f"magnet:?xt=urn:btmh:{HEX}"])
+def test_magnet_without_v1_hash(magnet):
+    assert magnet_info_hash(magnet) is None
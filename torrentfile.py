@@ -0,0 +1,93 @@
+import base64
+import hashlib
+import re
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+
+_BTIH_RE = re.compile(r"^urn:btih:([0-9a-fA-F]{40}|[A-Za-z2-7]{32})$")
+
+# Deepest list/dict nesting accepted; real .torrent files need about five levels
+MAX_DEPTH = 64
+
+def _decode(data: bytes, i: int, depth: int = 0):
+    # Decodes one bencoded value starting at offset i; returns (value, next offset)
+    if depth > MAX_DEPTH:
+        raise ValueError("nested too deeply")
+    c = data[i]
+    if c == 0x69:  # i<int>e
+        end = data.index(b"e", i)
+        return int(data[i + 1:end]), end + 1
+    if c == 0x6C:  # l<items>e
+        i += 1
+        items = []
+        while data[i] != 0x65:
+            value, i = _decode(data, i, depth + 1)
+            items.append(value)
+        return items, i + 1
+    if c == 0x64:  # d<key><value>...e
+        i += 1
+        items = {}
+        while data[i] != 0x65:
+            key, i = _decode(data, i, depth + 1)
+            value, i = _decode(data, i, depth + 1)
+            items[key] = value
+        return items, i + 1
+    if 0x30 <= c <= 0x39:  # <len>:<bytes>
+        colon = data.index(b":", i)
+        start = colon + 1
+        end = start + int(data[i:colon])
+        if end > len(data):
+            raise ValueError("truncated string")
+        return data[start:end], end
+    raise ValueError(f"unexpected byte at offset {i}")
+
+def parse_torrent(data: bytes) -> dict:
+    """Read the info-hash, name and total size from .torrent bytes without any RPC.
+
+    The info-hash is the SHA-1 of the raw bencoded ``info`` dict, the same value
+    Transmission reports as hashString. Raises ValueError for anything that is not a
+    valid .torrent file.
+    """
+    try:
+        if data[:1] != b"d":
+            raise ValueError("not a bencoded dictionary")
+        i = 1
+        info = None
+        info_bytes = b""
+        while data[i] != 0x65:
+            key, i = _decode(data, i, 1)
+            start = i
+            value, i = _decode(data, i, 1)
+            if key == b"info":
+                info = value
+                info_bytes = data[start:i]
+    except (IndexError, ValueError, TypeError) as e:
+        raise ValueError(f"Invalid .torrent file: {e}")
+    if not isinstance(info, dict):
+        raise ValueError("Invalid .torrent file: missing info dictionary")
+    if b"length" in info:
+        lengths = [info[b"length"]]
+    else:
+        files = info.get(b"files", [])
+        lengths = [f.get(b"length", 0) for f in files if isinstance(f, dict)] if isinstance(files, list) else []
+    name = info.get(b"name", b"")
+    if not all(isinstance(n, int) for n in lengths) or not isinstance(name, bytes):
+        raise ValueError("Invalid .torrent file: malformed info dictionary")
+    return {
+        "hash": hashlib.sha1(info_bytes).hexdigest(),
+        "name": name.decode("utf-8", "replace"),
+        "total_size": sum(lengths),
+    }
+
+def magnet_info_hash(magnet: str) -> Optional[str]:
+    # Lowercase hex v1 info-hash of a magnet link, or None if it has none
+    if not magnet.startswith("magnet:"):
+        return None
+    for xt in parse_qs(urlparse(magnet).query).get("xt", []):
+        match = _BTIH_RE.match(xt)
+        if match:
+            value = match.group(1)
+            if len(value) == 32:
+                return base64.b32decode(value.upper()).hex()
+            return value.lower()
+    return None
@@ -0,0 +1,93 @@
+import asyncio
+import functools
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import transmission_rpc
+from transmission_rpc.error import TransmissionTimeoutError
+
+from metrics import RPC_SECONDS, RPC_ERRORS
+from singleflight import SingleFlight, freeze
+
+logger = logging.getLogger("transmissionbot")
+
+# Per-call timeout (seconds) and the maximum number of RPCs in flight at once
+TRANSMISSION_TIMEOUT = float(os.environ.get("TRANSMISSION_TIMEOUT", "30"))
+TRANSMISSION_MAX_CONCURRENCY = int(os.environ.get("TRANSMISSION_MAX_CONCURRENCY", "4"))
+# Read-only methods whose identical concurrent calls share one RPC
+COALESCED_METHODS = {"get_torrent", "get_torrents", "get_recently_active_torrents", "session_stats", "get_session", "free_space"}
+
+class AsyncTransmission:
+    """Async front for transmission_rpc.Client.
+
+    Every call runs on a small dedicated thread pool, so a slow Transmission daemon
+    only delays the command that is waiting on it instead of the whole event loop.
+    The wrapped client keeps doing its own X-Transmission-Session-Id (409)
+    renegotiation inside the worker thread. Identical concurrent reads share one RPC;
+    any other call drops shared results so later reads see its effect.
+    """
+
+    def __init__(self, client: transmission_rpc.Client, timeout: float = TRANSMISSION_TIMEOUT,
+                 max_concurrency: int = TRANSMISSION_MAX_CONCURRENCY):
+        self.client = client
+        self.timeout = timeout
+        self.max_concurrency = max(1, max_concurrency)
+        self.rpc_count = 0
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="transmission-rpc")
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.flights = SingleFlight("rpc")
+
+    async def call(self, method: str, *args, timeout: float = None, **kwargs):
+        if method in COALESCED_METHODS:
+            key = (method, freeze(args), timeout, freeze(kwargs))
+            return await self.flights.do(key, lambda: self._call(method, *args, timeout=timeout, **kwargs))
+        try:
+            return await self._call(method, *args, timeout=timeout, **kwargs)
+        finally:
+            self.flights.forget()
+
+    async def _call(self, method: str, *args, timeout: float = None, **kwargs):
+        timeout = timeout or self.timeout
+        func = functools.partial(getattr(self.client, method), *args, timeout=timeout, **kwargs)
+        async with self._semaphore:
+            self.rpc_count += 1
+            loop = asyncio.get_running_loop()
+            try:
+                with RPC_SECONDS.time(method):
+                    # The HTTP timeout is applied per request and a 409 retry makes a second
+                    # one, so the overall deadline allows for both.
+                    return await asyncio.wait_for(loop.run_in_executor(self._executor, func), timeout * 2)
+            except asyncio.TimeoutError:
+                RPC_ERRORS.inc(method)
+                raise TransmissionTimeoutError(f"{method} timed out after {timeout * 2:.0f}s")
+            except Exception:
+                RPC_ERRORS.inc(method)
+                raise
+
+    async def get_torrent(self, torrent_id, arguments=None, **kwargs):
+        return await self.call("get_torrent", torrent_id, arguments=arguments, **kwargs)
+
+    async def get_torrents(self, ids=None, arguments=None, **kwargs):
+        return await self.call("get_torrents", ids=ids, arguments=arguments, **kwargs)
+
+    async def get_recently_active_torrents(self, arguments=None, **kwargs):
+        return await self.call("get_recently_active_torrents", arguments=arguments, **kwargs)
+
+    async def add_torrent(self, torrent, **kwargs):
+        return await self.call("add_torrent", torrent, **kwargs)
+
+    async def start_torrent(self, ids, **kwargs):
+        return await self.call("start_torrent", ids, **kwargs)
+
+    async def stop_torrent(self, ids, **kwargs):
+        return await self.call("stop_torrent", ids, **kwargs)
+
+    async def remove_torrent(self, ids, delete_data: bool = False, **kwargs):
+        return await self.call("remove_torrent", ids, delete_data=delete_data, **kwargs)
+
+    async def change_torrent(self, ids, **kwargs):
+        return await self.call("change_torrent", ids, **kwargs)
+
+    def close(self):
+        self._executor.shutdown(wait=False)